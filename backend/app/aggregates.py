@@ -0,0 +1,58 @@
+"""
+Per-book rating aggregates stored on the books table.
+
+books.rating_sum / rating_count / read_count mirror SUM(rating), COUNT(rating)
+and COUNT(*) over user_books, so an average rating is rating_sum / rating_count
+instead of an aggregate over every interaction. The interaction event consumer
+(app/event_log.py) recomputes them for the books each batch of events touched;
+rebuild_rating_aggregates() recomputes every book (backfill after migrating,
+or repair after drift).
+"""
+from sqlalchemy import inspect, text, update, select, func
+from app.models import Book, UserBook
+
+AGGREGATE_COLUMNS = {
+    "rating_sum": "FLOAT",
+    "rating_count": "INTEGER",
+    "read_count": "INTEGER",
+}
+
+
+def aggregate_values():
+    """UPDATE ... SET values recomputing a book's aggregates from user_books"""
+    return dict(
+        rating_sum=select(func.coalesce(func.sum(UserBook.rating), 0.0))
+        .where(UserBook.book_id == Book.id).scalar_subquery(),
+        rating_count=select(func.count(UserBook.rating))
+        .where(UserBook.book_id == Book.id).scalar_subquery(),
+        read_count=select(func.count(UserBook.id))
+        .where(UserBook.book_id == Book.id).scalar_subquery(),
+    )
+
+
+def recompute_rating_aggregates(db, book_ids):
+    """Recompute the aggregates of the given books in the caller's transaction (idempotent)"""
+    book_ids = sorted(book_ids)
+    for start in range(0, len(book_ids), 500):
+        db.execute(update(Book).where(Book.id.in_(book_ids[start:start + 500])).values(**aggregate_values()))
+
+
+def rebuild_rating_aggregates(db, batch_size=10000):
+    """Recompute the aggregates of every book from user_books, one id range per transaction"""
+    max_id = db.query(func.max(Book.id)).scalar() or 0
+    for start in range(0, max_id + 1, batch_size):
+        db.execute(update(Book).where(Book.id >= start, Book.id < start + batch_size).values(**aggregate_values()))
+        db.commit()
+        print(f"Rebuilt rating aggregates for book ids {start}-{min(start + batch_size, max_id + 1) - 1}")
+
+
+def add_missing_aggregate_columns(engine):
+    """Add the aggregate columns to an existing books table. Returns the names of the columns added."""
+    existing = {column["name"] for column in inspect(engine).get_columns("books")}
+    added = []
+    with engine.begin() as connection:
+        for name, sql_type in AGGREGATE_COLUMNS.items():
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE books ADD COLUMN {name} {sql_type} NOT NULL DEFAULT 0"))
+                added.append(name)
+    return added
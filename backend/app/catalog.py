@@ -0,0 +1,253 @@
+"""
+In-process snapshot of the book catalog shared by the read endpoints.
+
+Books are held column-wise in arrays sorted by id, next to their rating
+aggregates (rating sum, rating count, interaction count; see app/aggregates.py),
+so listings and average ratings are served from memory. Each book's genre
+names (from book_genres) are indexed as flat (row, genre code) pairs, so genre
+filters are equality matches on codes.
+
+The snapshot is loaded once at startup and then kept current by hooks on book
+add/delete and /activity/update. Every change swaps in a new immutable snapshot
+with a higher `version`, so readers never see a half-applied update and
+consumers can compare versions to tell when their derived caches are stale.
+The snapshot is per process; reload() rebuilds it from the database.
+"""
+import threading
+from collections import namedtuple
+import numpy as np
+from app.models import Book
+from app.normalize import book_genre_names
+
+CatalogBook = namedtuple(
+    "CatalogBook", ["id", "title", "author", "genre", "description", "cover_image", "genre_names"], defaults=[()]
+)
+
+CatalogSnapshot = namedtuple("CatalogSnapshot", [
+    "version", "ids", "titles", "authors", "genres", "descriptions", "covers", "genre_lists",
+    "genre_values", "genre_codes", "genre_rows", "rating_sum", "rating_count", "read_count",
+])
+
+# Per-book columns, in CatalogBook field order
+TEXT_COLUMNS = ("titles", "authors", "genres", "descriptions", "covers", "genre_lists")
+
+SORT_ORDERS = ("id", "title", "rating")
+
+
+def catalog_book(book, genre_names=()):
+    """CatalogBook copy of a Book row (safe to keep after the session closes)"""
+    return CatalogBook(book.id, book.title, book.author, book.genre, book.description, book.cover_image,
+                       tuple(genre_names))
+
+
+def _object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _make_snapshot(version, ids, texts, rating_sum, rating_count, read_count):
+    genre_lists = texts["genre_lists"]
+    lengths = np.fromiter((len(names) for names in genre_lists), dtype=np.int64, count=len(genre_lists))
+    flat = np.array([name for names in genre_lists for name in names], dtype=str)
+    genre_values, genre_codes = np.unique(flat, return_inverse=True)
+    genre_rows = np.repeat(np.arange(len(genre_lists)), lengths)
+    return CatalogSnapshot(version, ids, *(texts[name] for name in TEXT_COLUMNS),
+                           genre_values, genre_codes.ravel(), genre_rows, rating_sum, rating_count, read_count)
+
+
+def rows_with_genres(snapshot, genre_codes):
+    """Rows of the books that have any of the given genre codes, in id order"""
+    return np.unique(snapshot.genre_rows[np.isin(snapshot.genre_codes, genre_codes)])
+
+
+def genres_of_rows(snapshot, rows):
+    """Distinct genre codes of the books at the given rows"""
+    return np.unique(snapshot.genre_codes[np.isin(snapshot.genre_rows, rows)])
+
+
+def rows_for(snapshot, book_ids):
+    """Snapshot rows of the given ids, in the given order; unknown ids are dropped"""
+    book_ids = np.asarray(list(book_ids), dtype=np.int64)
+    if not len(snapshot.ids) or not len(book_ids):
+        return np.empty(0, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(snapshot.ids, book_ids), len(snapshot.ids) - 1)
+    return positions[snapshot.ids[positions] == book_ids]
+
+
+def average_ratings(snapshot, rows, default=0.0):
+    """Mean rating per row; `default` for books nobody has rated"""
+    counts = snapshot.rating_count[rows]
+    return np.where(counts > 0, snapshot.rating_sum[rows] / np.maximum(counts, 1), default)
+
+
+def book_at(snapshot, row):
+    return CatalogBook(int(snapshot.ids[row]), snapshot.titles[row], snapshot.authors[row],
+                       snapshot.genres[row], snapshot.descriptions[row], snapshot.covers[row],
+                       snapshot.genre_lists[row])
+
+
+def books_with_ratings(snapshot, rows, default=0.0):
+    """(CatalogBook, average rating) pairs for the given rows, in order"""
+    return [(book_at(snapshot, row), avg) for row, avg in zip(rows.tolist(), average_ratings(snapshot, rows, default).tolist())]
+
+
+def seek(sorted_keys, sorted_ids, key, book_id):
+    """Position of the first entry after (key, book_id) in an index sorted by (key, id)"""
+    lo = int(np.searchsorted(sorted_keys, key, "left"))
+    hi = int(np.searchsorted(sorted_keys, key, "right"))
+    return lo + int(np.searchsorted(sorted_ids[lo:hi], book_id, "right"))
+
+
+def _sort_source(snapshot, sort):
+    """The column a sort order is derived from; the order is rebuilt when this array is replaced"""
+    return snapshot.titles if sort == "title" else snapshot.rating_sum
+
+
+def _sort_keys(snapshot, sort):
+    if sort == "title":
+        return _object_array([(title or "").casefold() for title in snapshot.titles])
+    # Best rated first: ascending order of the negated average
+    return -average_ratings(snapshot, np.arange(len(snapshot.ids)))
+
+
+class Catalog:
+    """Holds the current CatalogSnapshot and applies incremental updates to it"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._sort_indexes = {}
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return 0 if snapshot is None else snapshot.version
+
+    def snapshot(self, db=None):
+        """Current snapshot; loaded from `db` on first use if startup didn't load it"""
+        if self._snapshot is None and db is not None:
+            self.reload(db)
+        return self._snapshot
+
+    def sort_index(self, snapshot, sort):
+        """
+        (rows, sorted_keys, sorted_ids) of the snapshot ordered by `sort`, ties broken by id.
+        Title and rating orders are built on first use and reused until their column changes.
+        """
+        if sort == "id":
+            return np.arange(len(snapshot.ids)), snapshot.ids, snapshot.ids
+
+        source = _sort_source(snapshot, sort)
+        cached = self._sort_indexes.get(sort)
+        if cached is not None and cached[0] is source:
+            return cached[1]
+
+        keys = _sort_keys(snapshot, sort)
+        # Rows are in id order, so a stable sort on the key alone breaks ties by id
+        rows = np.argsort(keys, kind="stable")
+        index = (rows, keys[rows], snapshot.ids[rows])
+        self._sort_indexes[sort] = (source, index)
+        return index
+
+    def reload(self, db):
+        """Rebuild the whole snapshot from the books table, its rating aggregate columns and book_genres"""
+        books = db.query(
+            Book.id, Book.title, Book.author, Book.genre, Book.description, Book.cover_image,
+            Book.rating_sum, Book.rating_count, Book.read_count
+        ).order_by(Book.id).all()
+        genre_names = book_genre_names(db)
+
+        ids = np.array([book.id for book in books], dtype=np.int64)
+        texts = {name: _object_array([book[i + 1] for book in books]) for i, name in enumerate(TEXT_COLUMNS[:-1])}
+        texts["genre_lists"] = _object_array([tuple(genre_names.get(book.id, ())) for book in books])
+        rating_sum = np.array([book.rating_sum or 0.0 for book in books], dtype=np.float64)
+        rating_count = np.array([book.rating_count or 0 for book in books], dtype=np.int64)
+        read_count = np.array([book.read_count or 0 for book in books], dtype=np.int64)
+
+        with self._lock:
+            self._snapshot = _make_snapshot(self.version + 1, ids, texts, rating_sum, rating_count, read_count)
+        return self._snapshot
+
+    def upsert_books(self, books):
+        """Add new books or replace the text fields of existing ones (aggregates are kept)"""
+        by_id = {book.id: book if isinstance(book, CatalogBook) else catalog_book(book) for book in books}
+        if not by_id:
+            return
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            ids = snapshot.ids
+            texts = {name: getattr(snapshot, name).copy() for name in TEXT_COLUMNS}
+            aggregates = [snapshot.rating_sum, snapshot.rating_count, snapshot.read_count]
+
+            existing_rows = rows_for(snapshot, list(by_id))
+            for row in existing_rows.tolist():
+                book = by_id.pop(int(ids[row]))
+                for name, value in zip(TEXT_COLUMNS, book[1:]):
+                    texts[name][row] = value
+
+            if by_id:
+                # Inserting in id order keeps the columns sorted by id
+                new_books = [by_id[book_id] for book_id in sorted(by_id)]
+                new_ids = np.array([book.id for book in new_books], dtype=np.int64)
+                positions = np.searchsorted(ids, new_ids)
+                ids = np.insert(ids, positions, new_ids)
+                for i, name in enumerate(TEXT_COLUMNS):
+                    texts[name] = np.insert(texts[name], positions, _object_array([book[i + 1] for book in new_books]))
+                aggregates = [np.insert(values, positions, 0) for values in aggregates]
+
+            self._snapshot = _make_snapshot(snapshot.version + 1, ids, texts, *aggregates)
+
+    def update_covers(self, covers):
+        """Set cover_image for {book_id: url}"""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            rows = rows_for(snapshot, list(covers))
+            if not len(rows):
+                return
+            updated = snapshot.covers.copy()
+            for row in rows.tolist():
+                updated[row] = covers[int(snapshot.ids[row])]
+            self._snapshot = snapshot._replace(version=snapshot.version + 1, covers=updated)
+
+    def remove_books(self, book_ids):
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            rows = rows_for(snapshot, book_ids)
+            if not len(rows):
+                return
+            keep = np.ones(len(snapshot.ids), dtype=bool)
+            keep[rows] = False
+            self._snapshot = _make_snapshot(
+                snapshot.version + 1, snapshot.ids[keep],
+                {name: getattr(snapshot, name)[keep] for name in TEXT_COLUMNS},
+                snapshot.rating_sum[keep], snapshot.rating_count[keep], snapshot.read_count[keep]
+            )
+
+    def set_aggregates(self, aggregates):
+        """Set the rating aggregates of {book_id: (rating_sum, rating_count, read_count)}"""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            rows = rows_for(snapshot, list(aggregates))
+            if not len(rows):
+                return
+            rating_sum = snapshot.rating_sum.copy()
+            rating_count = snapshot.rating_count.copy()
+            read_count = snapshot.read_count.copy()
+            for row in rows.tolist():
+                rating_sum[row], rating_count[row], read_count[row] = aggregates[int(snapshot.ids[row])]
+            self._snapshot = snapshot._replace(
+                version=snapshot.version + 1, rating_sum=rating_sum,
+                rating_count=rating_count, read_count=read_count
+            )
+
+
+catalog = Catalog()
@@ -0,0 +1,274 @@
+"""
+Background resolution of book cover images.
+
+Request handlers never wait on Open Library or Google Books. They call
+cover_resolver.request(), which queues a lookup on an asyncio loop running
+in a background thread and returns a status right away. The loop shares one
+pooled httpx.AsyncClient and keeps at most COVER_CONCURRENCY lookups in flight.
+A book is only looked up once at a time. Books without a cover anywhere go
+into a negative cache for COVER_NEGATIVE_TTL seconds; failed lookups are
+retried sooner. Both caches drop expired entries as new ones are added and hold
+at most COVER_BACKOFF_MAX. Found covers are written to books.cover_image and the catalog,
+and when the local thumbnail store is enabled the image itself is downloaded
+into it on the same loop (see app/thumbnails.py).
+
+Upstream base URLs come from the environment, so tests can point them at a
+local stub server (see tests/fake_openlibrary.py).
+"""
+import os
+import html
+import time
+import asyncio
+import threading
+import urllib.parse
+import httpx
+from sqlalchemy import update
+from app.database import SessionLocal
+from app.models import Book
+from app.catalog import catalog
+from app.thumbnails import thumbnail_store
+
+OPENLIBRARY_URL = os.getenv("OPENLIBRARY_URL", "https://openlibrary.org")
+OPENLIBRARY_COVERS_URL = os.getenv("OPENLIBRARY_COVERS_URL", "https://covers.openlibrary.org")
+GOOGLE_BOOKS_URL = os.getenv("GOOGLE_BOOKS_URL", "https://www.googleapis.com")
+COVER_CONCURRENCY = int(os.getenv("COVER_CONCURRENCY", "4"))
+COVER_TIMEOUT = float(os.getenv("COVER_TIMEOUT", "5"))
+COVER_NEGATIVE_TTL = float(os.getenv("COVER_NEGATIVE_TTL", "3600"))
+COVER_RETRY_AFTER = float(os.getenv("COVER_RETRY_AFTER", "60"))
+# Most books/images remembered as not found or failed; the oldest are forgotten first
+COVER_BACKOFF_MAX = int(os.getenv("COVER_BACKOFF_MAX", "100000"))
+
+
+def placeholder_cover(title):
+    text = urllib.parse.quote((title or "")[:20]) or "Book+Cover"
+    return f"https://via.placeholder.com/300x450/374151/9CA3AF?text={text}"
+
+
+def placeholder_svg(title):
+    """The same placeholder as an inline SVG, so it renders without network access"""
+    text = html.escape((title or "")[:20] or "Book Cover")
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="300" height="450" viewBox="0 0 300 450">'
+        '<rect width="300" height="450" fill="#374151"/>'
+        '<text x="150" y="225" fill="#9CA3AF" font-family="sans-serif" font-size="20" '
+        f'text-anchor="middle" dominant-baseline="middle">{text}</text></svg>'
+    )
+
+
+class UpstreamError(Exception):
+    """Every upstream lookup failed, so "no cover" isn't known for sure"""
+
+
+async def lookup_cover(client, title, author, openlibrary_url=None, covers_url=None, google_books_url=None):
+    """
+    Cover URL from Open Library, else an Amazon image for the ISBN Google Books
+    knows. Returns None when neither has one; raises UpstreamError if both failed.
+    """
+    openlibrary_url = openlibrary_url or OPENLIBRARY_URL
+    covers_url = covers_url or OPENLIBRARY_COVERS_URL
+    google_books_url = google_books_url or GOOGLE_BOOKS_URL
+    errors = 0
+
+    try:
+        response = await client.get(f"{openlibrary_url}/search.json",
+                                    params={"title": title, "author": author, "limit": 1})
+        response.raise_for_status()
+        docs = response.json().get("docs") or []
+        if docs:
+            book = docs[0]
+            if "cover_i" in book:
+                return f"{covers_url}/b/id/{book['cover_i']}-L.jpg"
+            if book.get("isbn"):
+                return f"{covers_url}/b/isbn/{book['isbn'][0]}-L.jpg"
+    except (httpx.HTTPError, ValueError):
+        errors += 1
+
+    try:
+        response = await client.get(f"{google_books_url}/books/v1/volumes",
+                                    params={"q": f"{title} {author}".strip(), "maxResults": 1})
+        response.raise_for_status()
+        for item in (response.json().get("items") or [])[:1]:
+            for identifier in item.get("volumeInfo", {}).get("industryIdentifiers", []):
+                if identifier.get("type") in ("ISBN_13", "ISBN_10"):
+                    return f"https://images-na.ssl-images-amazon.com/images/P/{identifier['identifier']}.01.L.jpg"
+    except (httpx.HTTPError, ValueError):
+        errors += 1
+
+    if errors == 2:
+        raise UpstreamError(f"cover lookup failed for {title!r}")
+    return None
+
+
+def store_covers(covers):
+    """Persist {book_id: cover_url} in one bulk UPDATE and publish them to the catalog"""
+    if not covers:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(update(Book), [{"id": book_id, "cover_image": url} for book_id, url in covers.items()])
+        db.commit()
+    finally:
+        db.close()
+    catalog.update_covers(covers)
+
+
+class RetryTimes:
+    """
+    Keys not to retry before a monotonic deadline, in insertion order. Each
+    block() drops expired entries from the oldest end and keeps at most
+    max_entries, so the map stays bounded however many books are requested.
+    Not locked: CoverResolver calls it under its own lock.
+    """
+
+    def __init__(self, max_entries=COVER_BACKOFF_MAX):
+        self.max_entries = max_entries
+        self._until = {}  # key -> monotonic time after which to try again, oldest first
+
+    def __len__(self):
+        return len(self._until)
+
+    def blocked(self, key, now=None):
+        until = self._until.get(key)
+        return until is not None and until > (time.monotonic() if now is None else now)
+
+    def block(self, key, until, now=None):
+        now = time.monotonic() if now is None else now
+        self._until.pop(key, None)
+        self._until[key] = until
+        while self._until:
+            oldest = next(iter(self._until))
+            if self._until[oldest] > now and len(self._until) <= self.max_entries:
+                break
+            del self._until[oldest]
+
+    def discard(self, key):
+        self._until.pop(key, None)
+
+
+class CoverResolver:
+    """Deduplicating, concurrency-limited cover lookup queue on a background event loop"""
+
+    def __init__(self, concurrency=COVER_CONCURRENCY, timeout=COVER_TIMEOUT, negative_ttl=COVER_NEGATIVE_TTL,
+                 retry_after=COVER_RETRY_AFTER, store=store_covers, thumbnails=thumbnail_store,
+                 max_backoff_entries=COVER_BACKOFF_MAX, **upstream_urls):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.retry_after = retry_after
+        self.store = store
+        self.thumbnails = thumbnails
+        self.upstream_urls = upstream_urls
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._pending = {}   # book id -> future of the running lookup
+        self._negative = RetryTimes(max_backoff_entries)  # book ids not to look up again yet
+        self._downloads = {}  # image url -> future of the running download
+        self._failed_downloads = RetryTimes(max_backoff_entries)  # image urls not to fetch again yet
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._loop is not None:
+            return
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="cover-resolver", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+        self._loop = loop
+
+    async def _open(self):
+        # Created on the resolver loop so they're bound to it
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            follow_redirects=True,
+        )
+
+    def status(self, book_id):
+        """"pending" while a lookup runs, "not_found" while negatively cached, else None"""
+        with self._lock:
+            if book_id in self._pending:
+                return "pending"
+            if self._negative.blocked(book_id):
+                return "not_found"
+        return None
+
+    def request(self, book_id, title, author):
+        """Queue a lookup unless one is already running or the book is negatively cached. Returns the status."""
+        with self._lock:
+            if book_id in self._pending:
+                return "pending"
+            if self._negative.blocked(book_id):
+                return "not_found"
+            self._ensure_started()
+            self._pending[book_id] = asyncio.run_coroutine_threadsafe(
+                self._resolve(book_id, title, author), self._loop
+            )
+        return "pending"
+
+    def wait(self, book_id, timeout=None):
+        """Block until the running lookup for a book (if any) finishes; returns its cover URL or None"""
+        with self._lock:
+            future = self._pending.get(book_id)
+        return future.result(timeout) if future is not None else None
+
+    def request_image(self, url):
+        """Queue a download of a cover image into the thumbnail store. Returns False if there's nothing to fetch."""
+        if not url or not self.thumbnails.enabled or self.thumbnails.manifest(url) is not None:
+            return False
+        with self._lock:
+            if url in self._downloads:
+                return True
+            if self._failed_downloads.blocked(url):
+                return False
+            self._ensure_started()
+            self._downloads[url] = asyncio.run_coroutine_threadsafe(self._download(url), self._loop)
+        return True
+
+    def wait_image(self, url, timeout=None):
+        """Block until the running download of an image (if any) finishes"""
+        with self._lock:
+            future = self._downloads.get(url)
+        if future is not None:
+            future.result(timeout)
+
+    async def _download(self, url):
+        try:
+            async with self._semaphore:
+                response = await self._client.get(url)
+                response.raise_for_status()
+            await asyncio.get_running_loop().run_in_executor(None, self.thumbnails.put, url, response.content)
+            with self._lock:
+                self._failed_downloads.discard(url)
+        except Exception as e:
+            print(f"Cover image download from {url} failed:", e)
+            with self._lock:
+                self._failed_downloads.block(url, time.monotonic() + self.retry_after)
+        finally:
+            with self._lock:
+                self._downloads.pop(url, None)
+
+    async def _resolve(self, book_id, title, author):
+        url = None
+        try:
+            async with self._semaphore:
+                url = await lookup_cover(self._client, title, author, **self.upstream_urls)
+            if url:
+                await asyncio.get_running_loop().run_in_executor(None, self.store, {book_id: url})
+                self.request_image(url)
+            with self._lock:
+                if url:
+                    self._negative.discard(book_id)
+                else:
+                    self._negative.block(book_id, time.monotonic() + self.negative_ttl)
+        except Exception as e:
+            print(f"Cover lookup for book {book_id} failed:", e)
+            with self._lock:
+                self._negative.block(book_id, time.monotonic() + self.retry_after)
+        finally:
+            with self._lock:
+                self._pending.pop(book_id, None)
+        return url
+
+
+cover_resolver = CoverResolver()
@@ -0,0 +1,233 @@
+"""
+Write-behind processing of the interaction event log.
+
+/activity/update and /activity/bulk only write user_books and append to
+interaction_events, in one transaction. interaction_events is the log and its
+ids are the offsets. EventConsumer tails it in a background thread and brings
+the derived state up to date for each batch of events:
+
+  * books.rating_sum / rating_count / read_count of the books in the batch,
+    recomputed from user_books,
+  * the catalog's copy of those aggregates, the trending counters and the
+    reader leaderboard counts of the users in the batch,
+  * those users' cached recommendations (their profiles are built from their
+    ratings) and the leaderboard refresher's activity count.
+
+The database effects and the consumer's offset in event_offsets are committed
+together, and a restarted consumer resumes after that offset. Delivery is at
+least once, so every step sets values rather than adding deltas; trending
+counters, the one additive step, skip events that were already in the log
+when they were loaded.
+
+In-memory state belongs to each process. Every process follows the log with
+its own in-memory offset, and whichever gets to a batch first commits its
+database effects.
+
+Ids can become visible out of order (a transaction that took an id earlier
+commits later), so the consumer stops at a gap in the ids. It waits
+EVENT_GAP_TIMEOUT seconds before treating the gap as a rolled-back insert.
+
+replay() moves the stored offset back, to 0 for the whole history, and the
+consumer then recomputes everything derived from the replayed events.
+"""
+import os
+import threading
+import time
+from sqlalchemy import func, update
+from app.database import SessionLocal
+from app.models import Book, UserBook, InteractionEvent, EventOffset
+from app.aggregates import recompute_rating_aggregates
+from app.catalog import catalog
+from app.trending import trending
+from app.user_stats import read_leaderboard, READ
+from app.leaderboards import leaderboard_refresher
+from app.recommender.cache import recommendation_cache
+
+CONSUMER = "interactions"
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "1000"))
+# Seconds between polls when the consumer isn't woken by a write
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", "1"))
+EVENT_GAP_TIMEOUT = float(os.getenv("EVENT_GAP_TIMEOUT", "5"))
+
+
+def stored_offset(db, consumer=CONSUMER):
+    offset = db.query(EventOffset.last_event_id).filter(EventOffset.consumer == consumer).scalar()
+    return offset or 0
+
+
+def set_offset(db, offset, consumer=CONSUMER):
+    """Store a consumer's offset (caller commits)"""
+    row = db.get(EventOffset, consumer)
+    if row is None:
+        db.add(EventOffset(consumer=consumer, last_event_id=offset))
+    else:
+        row.last_event_id = offset
+
+
+def advance_offset(db, offset, consumer=CONSUMER):
+    """Move the stored offset forward to `offset`, never back (caller commits)"""
+    db.execute(
+        update(EventOffset).where(
+            EventOffset.consumer == consumer, EventOffset.last_event_id < offset
+        ).values(last_event_id=offset, updated_at=func.now())
+    )
+
+
+class EventConsumer:
+    """Tails interaction_events and updates the aggregates, in-memory state and caches derived from them"""
+
+    def __init__(self, consumer=CONSUMER, batch_size=EVENT_BATCH_SIZE, poll_interval=EVENT_POLL_INTERVAL,
+                 gap_timeout=EVENT_GAP_TIMEOUT, session_factory=SessionLocal, clock=time.monotonic):
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.gap_timeout = gap_timeout
+        self.session_factory = session_factory
+        self.clock = clock
+        self.memory_offset = None   # last event applied to this process's in-memory state
+        self.trending_after = 0     # events up to here were counted by trending.rebuild()
+        self.processed = 0
+        self._gaps = {}             # missing event id -> when it was first noticed
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def load(self, db):
+        """Pick up the stored offset (creating it at the end of the log the first time). Returns the offset."""
+        offset = db.query(EventOffset.last_event_id).filter(EventOffset.consumer == self.consumer).scalar()
+        last_event = db.query(func.max(InteractionEvent.id)).scalar() or 0
+        if offset is None:
+            # Aggregates of a database that predates the log consumer are already current
+            offset = last_event
+            set_offset(db, offset, self.consumer)
+            db.commit()
+        self.memory_offset = offset
+        self.trending_after = last_event
+        return offset
+
+    def start(self):
+        """Start the consumer thread (no-op when already running)"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self._run, name="event-consumer", daemon=True)
+            self._thread.start()
+            return True
+
+    def notify(self):
+        """Wake the consumer after appending events"""
+        self._wake.set()
+
+    def replay(self, db, offset=0):
+        """Move the stored and in-memory offsets back so events after `offset` are processed again"""
+        set_offset(db, offset, self.consumer)
+        db.commit()
+        # Trending already counted everything applied so far
+        self.trending_after = max(self.trending_after, self.memory_offset or 0)
+        self.memory_offset = offset
+        self.notify()
+
+    def _ready(self, events, after):
+        """The leading events without a gap in their ids"""
+        now = self.clock()
+        expected = after + 1
+        ready = []
+        for event in events:
+            if event.id != expected:
+                # Rolled back, or committed later by a transaction that's still open
+                first_seen = self._gaps.setdefault(expected, now)
+                if now - first_seen < self.gap_timeout:
+                    break
+            ready.append(event)
+            expected = event.id + 1
+        self._gaps = {event_id: seen for event_id, seen in self._gaps.items() if event_id >= expected}
+        return ready
+
+    def process_batch(self):
+        """Process the next batch of events. Returns the number of events looked at."""
+        db = self.session_factory()
+        try:
+            if self.memory_offset is None:
+                self.load(db)
+            stored = stored_offset(db, self.consumer)
+            start = min(stored, self.memory_offset)
+            events = self._ready(
+                db.query(
+                    InteractionEvent.id, InteractionEvent.user_id, InteractionEvent.book_id, InteractionEvent.created_at
+                ).filter(InteractionEvent.id > start).order_by(InteractionEvent.id).limit(self.batch_size).all(),
+                start
+            )
+            if not events:
+                return 0
+
+            # Database: aggregates and offset in one transaction
+            pending = [event for event in events if event.id > stored]
+            if pending:
+                recompute_rating_aggregates(db, {event.book_id for event in pending})
+                advance_offset(db, pending[-1].id, self.consumer)
+                db.commit()
+
+            fresh = [event for event in events if event.id > self.memory_offset]
+            if fresh:
+                self._apply_in_memory(db, fresh)
+                self.memory_offset = fresh[-1].id
+            self.processed += len(events)
+            return len(events)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _apply_in_memory(self, db, events):
+        book_ids = {event.book_id for event in events}
+        user_ids = {event.user_id for event in events}
+
+        catalog.set_aggregates({
+            book_id: (rating_sum or 0.0, rating_count or 0, read_count or 0)
+            for book_id, rating_sum, rating_count, read_count in db.query(
+                Book.id, Book.rating_sum, Book.rating_count, Book.read_count
+            ).filter(Book.id.in_(book_ids))
+        })
+
+        counts = dict.fromkeys(user_ids, 0)
+        counts.update(
+            db.query(UserBook.user_id, func.count(UserBook.id)).filter(
+                UserBook.user_id.in_(user_ids), UserBook.status == READ
+            ).group_by(UserBook.user_id).all()
+        )
+        read_leaderboard.set_counts(counts)
+
+        for event in events:
+            if event.id > self.trending_after:
+                trending.record(event.book_id, event.created_at)
+        for user_id in user_ids:
+            recommendation_cache.invalidate_user(user_id)
+        leaderboard_refresher.record_activity(len(events))
+
+    def catch_up(self):
+        """Process batches until the log is drained (or stops at a gap). Returns the number of events."""
+        total = 0
+        while True:
+            count = self.process_batch()
+            if not count:
+                return total
+            total += count
+
+    def lag(self, db):
+        """Events in the log not yet applied in this process"""
+        return db.query(func.count(InteractionEvent.id)).filter(
+            InteractionEvent.id > (self.memory_offset or 0)
+        ).scalar()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.catch_up()
+            except Exception as e:
+                print("Interaction event processing failed:", e)
+
+
+event_consumer = EventConsumer()
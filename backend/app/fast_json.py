@@ -0,0 +1,43 @@
+"""
+JSON encoding for large read-only responses.
+
+Returning a FastJSONResponse (or the bytes from encode_json) skips FastAPI's
+jsonable_encoder pass over every item; the content is encoded once, with
+orjson when it is installed and the stdlib json module otherwise. Both produce
+the same compact UTF-8 output as FastAPI's JSONResponse, and both accept numpy
+arrays and scalars, so catalog columns can be passed without converting them.
+"""
+import json
+import numpy as np
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODER = "orjson" if orjson is not None else "json"
+
+
+def _default(value):
+    # numpy values orjson can't take natively (object arrays) and everything numpy for the stdlib
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(content, encoder=None):
+    """Compact UTF-8 JSON bytes; `encoder` ("orjson" or "json") overrides the default"""
+    if (encoder or ENCODER) == "orjson":
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return encode_json(content)
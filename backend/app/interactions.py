@@ -0,0 +1,166 @@
+"""
+Applying many user_books changes at once (POST /activity/bulk).
+
+The batch's existing rows are read in one query, each item is checked against
+them, and the items that change something are written with a single
+INSERT ... ON CONFLICT (user_id, book_id) DO UPDATE on SQLite and Postgres
+(other databases fall back to ORM writes). An interaction event per applied
+item goes into the log in the same transaction; the caller commits, and the
+log consumer (app/event_log.py) updates everything derived from it.
+
+A book's read_at is set to the time of the change that moves it to 'read' and
+kept while it stays read, so re-rating a book read long ago doesn't count it as
+read again.
+
+Items carry the client's time of the change (`ts`), stored as changed_at. One
+older than the row's changed_at is reported as stale and not applied, so an
+offline session synced late doesn't overwrite newer edits. updated_at stays
+the server's write time, which /user/{id}/ratings?since= relies on.
+"""
+from collections import namedtuple
+from datetime import timezone
+from sqlalchemy import and_, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import Book, UserBook, InteractionEvent
+from app.timeutil import utc_now
+from app.user_stats import READ
+
+UNIQUE_INDEX = "uq_user_books_user_id_book_id"
+
+UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+# An applied item
+Change = namedtuple("Change", "book_id rating status ts")
+
+
+def utc_naive(when, now):
+    """A client timestamp as naive UTC, no later than now (default: now)"""
+    if when is None:
+        return now
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(when, now)
+
+
+def read_at_after(old_status, old_read_at, status, changed_at):
+    """read_at of a row going from old_status to status by a change made at changed_at"""
+    if status != READ:
+        return None
+    if old_status == READ and old_read_at is not None:
+        return old_read_at
+    return changed_at
+
+
+def user_book_row(user_id, book_id, rating, status, now, changed_at=None, read_at=None):
+    """A user_books row for upsert_user_books(), written at `now` for a change made at `changed_at`"""
+    return {
+        "user_id": user_id, "book_id": book_id, "rating": rating, "status": status,
+        "created_at": now, "updated_at": now, "changed_at": changed_at or now, "read_at": read_at
+    }
+
+
+def upsert_user_books(db, rows):
+    """Insert or update user_books rows by (user_id, book_id) in one statement where the dialect allows"""
+    if not rows:
+        return
+    insert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(UserBook).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[UserBook.user_id, UserBook.book_id],
+            set_={
+                "rating": statement.excluded.rating,
+                "status": statement.excluded.status,
+                "updated_at": statement.excluded.updated_at,
+                "changed_at": statement.excluded.changed_at,
+                "read_at": statement.excluded.read_at,
+            }
+        ))
+        return
+
+    existing = {
+        user_book.book_id: user_book
+        for user_book in db.query(UserBook).filter(
+            UserBook.user_id == rows[0]["user_id"],
+            UserBook.book_id.in_([row["book_id"] for row in rows])
+        )
+    }
+    for row in rows:
+        user_book = existing.get(row["book_id"])
+        if user_book is None:
+            db.add(UserBook(**row))
+        else:
+            for name in ("rating", "status", "updated_at", "changed_at", "read_at"):
+                setattr(user_book, name, row[name])
+
+
+def apply_interactions(db, user_id, items):
+    """
+    Write a batch of {book_id, rating, status, ts} items for one user (caller commits).
+    Returns (a result per item in input order, [Change] for the applied ones).
+    """
+    now = utc_now()
+    times = [utc_naive(item.ts, now) for item in items]
+
+    # The last change per book wins; earlier ones in the same batch are superseded
+    latest = {}
+    for index, item in sorted(enumerate(items), key=lambda entry: times[entry[0]]):
+        latest[item.book_id] = index
+
+    current = {
+        book_id: (rating, status, changed_at, read_at, user_book_id)
+        for book_id, rating, status, changed_at, read_at, user_book_id in db.query(
+            Book.id, UserBook.rating, UserBook.status, UserBook.changed_at, UserBook.read_at, UserBook.id
+        ).outerjoin(
+            UserBook, and_(UserBook.book_id == Book.id, UserBook.user_id == user_id)
+        ).filter(Book.id.in_(list(latest)))
+    }
+
+    results = []
+    changes = []
+    rows = []
+    for index, item in enumerate(items):
+        ts = times[index]
+        if latest[item.book_id] != index:
+            outcome = "superseded"
+        elif item.book_id not in current:
+            outcome = "unknown_book"
+        else:
+            old_rating, old_status, changed_at, read_at, user_book_id = current[item.book_id]
+            created = user_book_id is None
+            if not created and changed_at is not None and changed_at > ts:
+                outcome = "stale"
+            elif not created and old_rating == item.rating and old_status == item.status:
+                outcome = "unchanged"
+            else:
+                outcome = "created" if created else "updated"
+                changes.append(Change(item.book_id, item.rating, item.status, ts))
+                rows.append(user_book_row(
+                    user_id, item.book_id, item.rating, item.status, now, ts,
+                    read_at_after(old_status, read_at, item.status, ts)
+                ))
+        results.append({"book_id": item.book_id, "result": outcome})
+
+    upsert_user_books(db, rows)
+    if changes:
+        db.bulk_insert_mappings(InteractionEvent, [
+            {"user_id": user_id, "book_id": change.book_id, "rating": change.rating,
+             "status": change.status, "created_at": change.ts}
+            for change in changes
+        ])
+    return results, changes
+
+
+def deduplicate_user_books(engine):
+    """
+    Before the unique (user_id, book_id) index exists, keep only the newest row
+    (highest id) of each duplicated pair. Returns the number of rows deleted.
+    """
+    if UNIQUE_INDEX in {index["name"] for index in inspect(engine).get_indexes("user_books")}:
+        return 0
+    with engine.begin() as connection:
+        result = connection.execute(text(
+            "DELETE FROM user_books WHERE id NOT IN "
+            "(SELECT MAX(id) FROM user_books GROUP BY user_id, book_id)"
+        ))
+    return result.rowcount
@@ -0,0 +1,160 @@
+"""
+Materialized reader leaderboards.
+
+Books read per user is a GROUP BY over all of user_books, so the boards are
+computed in the background and stored in leaderboard_entries, which
+/leaderboard pages through by position:
+
+  * overall: books read, all time,
+  * genre:   books read per genre (key: genre name),
+  * month:   books read per UTC month of their read_at (key: "YYYY-MM"), recent months only.
+
+Each board keeps its top LEADERBOARD_SIZE readers. LeaderboardRefresher
+recomputes every board every LEADERBOARD_REFRESH seconds, or sooner once
+LEADERBOARD_ACTIVITY_THRESHOLD interactions have come in since the last run,
+and swaps the rows in one transaction so readers never see a partial board.
+"""
+import os
+import threading
+import time
+from sqlalchemy import extract, func
+from app.database import SessionLocal
+from app.models import UserBook, BookGenre, Genre, LeaderboardEntry
+from app.timeutil import utc_now
+from app.user_stats import READ, month_start
+
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+LEADERBOARD_MONTHS = int(os.getenv("LEADERBOARD_MONTHS", "12"))
+# Seconds between refreshes (0 disables the background refresher)
+LEADERBOARD_REFRESH = float(os.getenv("LEADERBOARD_REFRESH", "600"))
+LEADERBOARD_ACTIVITY_THRESHOLD = int(os.getenv("LEADERBOARD_ACTIVITY_THRESHOLD", "200"))
+
+BOARDS = ("overall", "genre", "month")
+
+
+def month_key(year, month):
+    return f"{int(year):04d}-{int(month):02d}"
+
+
+def first_month(now, months):
+    """Start of the oldest month kept, `months` months back including the current one"""
+    index = now.year * 12 + now.month - months
+    return month_start(now).replace(year=index // 12, month=index % 12 + 1)
+
+
+def ranked(counts, size=LEADERBOARD_SIZE):
+    """[(position, rank, user id, books read)] for [(user id, books read)], best first; ties share a rank"""
+    ordered = sorted(counts, key=lambda item: (-item[1], item[0]))[:size]
+    rows = []
+    rank, previous = 0, None
+    for position, (user_id, count) in enumerate(ordered, 1):
+        if count != previous:
+            rank, previous = position, count
+        rows.append((position, rank, user_id, count))
+    return rows
+
+
+def compute_leaderboards(db, now=None, size=LEADERBOARD_SIZE, months=LEADERBOARD_MONTHS):
+    """{(board, key): ranked rows}, one GROUP BY per board"""
+    now = now or utc_now()
+    read = UserBook.status == READ
+    groups = {}
+
+    overall = db.query(UserBook.user_id, func.count(UserBook.id)).filter(read).group_by(UserBook.user_id)
+    groups[("overall", "")] = overall.all()
+
+    by_genre = db.query(Genre.name, UserBook.user_id, func.count(UserBook.id)).join(
+        BookGenre, BookGenre.book_id == UserBook.book_id
+    ).join(
+        Genre, Genre.id == BookGenre.genre_id
+    ).filter(read).group_by(Genre.id, Genre.name, UserBook.user_id)
+    for name, user_id, count in by_genre:
+        groups.setdefault(("genre", name), []).append((user_id, count))
+
+    # By the month each book went to 'read', not the last edit
+    year, month = extract("year", UserBook.read_at), extract("month", UserBook.read_at)
+    by_month = db.query(year, month, UserBook.user_id, func.count(UserBook.id)).filter(
+        read, UserBook.read_at >= first_month(now, months)
+    ).group_by(year, month, UserBook.user_id)
+    for entry_year, entry_month, user_id, count in by_month:
+        groups.setdefault(("month", month_key(entry_year, entry_month)), []).append((user_id, count))
+
+    return {board: ranked(counts, size) for board, counts in groups.items()}
+
+
+def refresh_leaderboards(db, now=None):
+    """Recompute and replace every board. Returns the number of boards written."""
+    now = now or utc_now()
+    boards = compute_leaderboards(db, now)
+    rows = [
+        {"board": board, "key": key, "position": position, "rank": rank,
+         "user_id": user_id, "books_read": count, "refreshed_at": now}
+        for (board, key), entries in boards.items()
+        for position, rank, user_id, count in entries
+    ]
+    db.query(LeaderboardEntry).delete(synchronize_session=False)
+    if rows:
+        db.bulk_insert_mappings(LeaderboardEntry, rows)
+    db.commit()
+    return len(boards)
+
+
+class LeaderboardRefresher:
+    """Background thread refreshing the leaderboards on an interval or after enough activity"""
+
+    def __init__(self, interval=LEADERBOARD_REFRESH, activity_threshold=LEADERBOARD_ACTIVITY_THRESHOLD,
+                 session_factory=SessionLocal):
+        self.interval = interval
+        self.activity_threshold = activity_threshold
+        self.session_factory = session_factory
+        self.refreshed_at = None
+        self.last_duration = None
+        self._pending = 0
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the refresher thread (no-op when disabled or already running)"""
+        with self._lock:
+            if self.interval <= 0 or self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self._run, name="leaderboard-refresher", daemon=True)
+            self._thread.start()
+            return True
+
+    def record_activity(self, count=1):
+        """Count interactions since the last refresh; wakes the refresher at the threshold"""
+        with self._lock:
+            self._pending += count
+            if self._pending >= self.activity_threshold:
+                self._wake.set()
+
+    def refresh(self):
+        """Refresh now, in the calling thread. Returns the number of boards written."""
+        with self._lock:
+            self._pending = 0
+            self._wake.clear()
+        start = time.perf_counter()
+        db = self.session_factory()
+        try:
+            boards = refresh_leaderboards(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.refreshed_at = utc_now()
+        self.last_duration = time.perf_counter() - start
+        return boards
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print("Leaderboard refresh failed:", e)
+            self._wake.wait(self.interval)
+
+
+leaderboard_refresher = LeaderboardRefresher()
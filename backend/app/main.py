@@ -2,7 +2,17 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from app.database import Base, engine, SessionLocal
-from app.models import Book
+from app.models import Book, UserBook
+from app.recommender.model_store import model_store
+from app.catalog import catalog
+from app.search import search_index
+from app.aggregates import add_missing_aggregate_columns, rebuild_rating_aggregates
+from app.trending import trending, add_missing_timestamp_columns
+from app.normalize import add_missing_name_columns, migrate_book_names
+from app.interactions import deduplicate_user_books
+from app.user_stats import read_leaderboard, backfill_read_at
+from app.leaderboards import leaderboard_refresher
+from app.event_log import event_consumer
 from app.routes.auth import router as auth_router
 from app.routes.books import router as books_router
 from app.routes.activity import router as activity_router
@@ -11,6 +21,7 @@ from app.routes.admin import router as admin_router
 from app.routes.user import router as user_router
 from app.routes.library import router as library_router
 from app.routes.chatbot import router as chatbot_router
+from app.routes.leaderboard import router as leaderboard_router
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -20,6 +31,78 @@ except Exception as e:
     print("Database not ready yet:", e)
 
 
+def migrate_rating_aggregates():
+    """Databases created before the books aggregate columns get them added and backfilled once"""
+    try:
+        added = add_missing_aggregate_columns(engine)
+        if added:
+            print(f"Added books columns {', '.join(added)}, backfilling...")
+            db: Session = SessionLocal()
+            try:
+                rebuild_rating_aggregates(db)
+            finally:
+                db.close()
+    except Exception as e:
+        print("Failed to migrate rating aggregates:", e)
+
+
+migrate_rating_aggregates()
+
+
+def migrate_book_name_columns():
+    """Databases created before books.names_normalized get it, set for the books already linked"""
+    try:
+        added = add_missing_name_columns(engine)
+        if added:
+            print(f"Added books columns {', '.join(added)}.")
+    except Exception as e:
+        print("Failed to migrate book name columns:", e)
+
+
+migrate_book_name_columns()
+
+
+def migrate_unique_interactions():
+    """Duplicate (user_id, book_id) rows from before the unique index are reduced to the newest one"""
+    try:
+        removed = deduplicate_user_books(engine)
+        if removed:
+            print(f"Removed {removed} duplicate user_books rows, rebuilding aggregates...")
+            db: Session = SessionLocal()
+            try:
+                rebuild_rating_aggregates(db)
+            finally:
+                db.close()
+    except Exception as e:
+        print("Failed to deduplicate user_books:", e)
+
+
+migrate_unique_interactions()
+
+
+def migrate_interaction_timestamps():
+    """user_books created before interactions were timestamped get the (empty) columns"""
+    try:
+        added = add_missing_timestamp_columns(engine)
+        if added:
+            print(f"Added user_books columns {', '.join(added)}.")
+        if "read_at" in added:
+            db: Session = SessionLocal()
+            try:
+                print(f"Backfilled read_at of {backfill_read_at(db)} read books.")
+                db.commit()
+            finally:
+                db.close()
+        # create_all skips existing tables, so indexes added to user_books later are created here
+        for index in UserBook.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+    except Exception as e:
+        print("Failed to migrate user_books timestamps:", e)
+
+
+migrate_interaction_timestamps()
+
+
 def seed_default_books():
     db: Session = SessionLocal()
     try:
@@ -47,6 +130,115 @@ def seed_default_books():
 seed_default_books()
 
 
+def migrate_author_genre_names():
+    db: Session = SessionLocal()
+    try:
+        count = migrate_book_names(db)
+        if count:
+            print(f"Normalized authors and genres of {count} books.")
+    except Exception as e:
+        db.rollback()
+        print("Failed to normalize authors and genres:", e)
+    finally:
+        db.close()
+
+
+migrate_author_genre_names()
+
+
+def load_recommender_model():
+    db: Session = SessionLocal()
+    try:
+        model_store.load_or_fit(db)
+        print("Recommender model ready.")
+    except Exception as e:
+        print("Failed to load recommender model:", e)
+    finally:
+        db.close()
+
+
+load_recommender_model()
+
+
+def load_catalog():
+    db: Session = SessionLocal()
+    try:
+        snapshot = catalog.reload(db)
+        print(f"Catalog loaded: {len(snapshot.ids)} books.")
+    except Exception as e:
+        print("Failed to load catalog:", e)
+    finally:
+        db.close()
+
+
+load_catalog()
+
+
+def load_search_index():
+    db: Session = SessionLocal()
+    try:
+        count = search_index.build(db)
+        print(f"Search index ({search_index.kind}) ready: {count} books.")
+    except Exception as e:
+        print("Failed to build search index:", e)
+    finally:
+        db.close()
+
+
+load_search_index()
+
+
+def load_trending():
+    db: Session = SessionLocal()
+    try:
+        events = trending.rebuild(db)
+        print(f"Trending counters loaded: {events} recent events.")
+    except Exception as e:
+        print("Failed to load trending counters:", e)
+    finally:
+        db.close()
+
+
+load_trending()
+
+
+def load_leaderboard():
+    db: Session = SessionLocal()
+    try:
+        readers = read_leaderboard.rebuild(db)
+        print(f"Reader leaderboard loaded: {readers} readers.")
+    except Exception as e:
+        print("Failed to load reader leaderboard:", e)
+    finally:
+        db.close()
+
+
+load_leaderboard()
+
+
+def start_leaderboard_refresher():
+    if leaderboard_refresher.start():
+        print(f"Leaderboard refresher started (every {leaderboard_refresher.interval:g}s).")
+
+
+start_leaderboard_refresher()
+
+
+def start_event_consumer():
+    db: Session = SessionLocal()
+    try:
+        offset = event_consumer.load(db)
+        event_consumer.start()
+        print(f"Interaction event consumer started at event {offset}.")
+    except Exception as e:
+        print("Failed to start interaction event consumer:", e)
+    finally:
+        db.close()
+
+
+start_event_consumer()
+
+
 app = FastAPI(title="Library Recommendation System")
 
 app.add_middleware(
@@ -58,6 +250,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Sync-Time"],
 )
 
 
@@ -67,6 +260,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Sync-Time"],
 )
 
 app.include_router(auth_router)
@@ -77,3 +271,4 @@ app.include_router(admin_router)
 app.include_router(user_router)
 app.include_router(library_router)
 app.include_router(chatbot_router)
+app.include_router(leaderboard_router)
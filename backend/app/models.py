@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean, JSON
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+from app.timeutil import utc_now
 
 
 class User(Base):
@@ -27,15 +29,110 @@ class Book(Base):
     genre = Column(String)
     description = Column(String)
     cover_image = Column(String)  # URL to book cover image
+    # Aggregates over user_books, kept in step by /activity/update (see app/aggregates.py)
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    read_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # author/genre are in display form and linked (see app/normalize.py)
+    names_normalized = Column(Boolean, nullable=False, default=False, server_default="0")
+
+class Author(Base):
+    __tablename__ = "authors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+
+class Genre(Base):
+    __tablename__ = "genres"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+
+# Book <-> author/genre links; books.author and books.genre hold the names joined for display
+class BookAuthor(Base):
+    __tablename__ = "book_authors"
+
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("authors.id"), primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0)
+
+class BookGenre(Base):
+    __tablename__ = "book_genres"
+
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    genre_id = Column(Integer, ForeignKey("genres.id"), primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0)
+
+def default_read_at(context):
+    """Rows inserted as read without a read_at were read when they were written"""
+    params = context.get_current_parameters()
+    if params.get("status") != "read":
+        return None
+    updated_at = params.get("updated_at")
+    return updated_at if isinstance(updated_at, datetime) else utc_now()
 
 class UserBook(Base):
     __tablename__ = "user_books"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    book_id = Column(Integer, ForeignKey("books.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    book_id = Column(Integer, ForeignKey("books.id"), index=True)
     rating = Column(Float)
     status = Column(String)  # reading, completed, want_to_read
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # When the change was made on the client (/activity/bulk `ts`); updated_at is when the server wrote it
+    changed_at = Column(DateTime)
+    # When the book last went to 'read' (re-rating a read book leaves it); the monthly stats count by it
+    read_at = Column(DateTime, default=default_read_at)
+
+    __table_args__ = (
+        # One shelf entry per user and book: the conflict target of /activity/bulk upserts
+        Index("uq_user_books_user_id_book_id", "user_id", "book_id", unique=True),
+        # /user/{id}/ratings?since= deltas
+        Index("ix_user_books_user_id_updated_at", "user_id", "updated_at"),
+    )
+
+class InteractionEvent(Base):
+    """One rating/status change, appended by /activity (the interaction log, see app/event_log.py)"""
+    __tablename__ = "interaction_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    book_id = Column(Integer, ForeignKey("books.id"), index=True)
+    rating = Column(Float)
+    status = Column(String)
+    created_at = Column(DateTime, default=func.now(), index=True)
+
+class EventOffset(Base):
+    """Last interaction_events id whose effects a consumer has committed (see app/event_log.py)"""
+    __tablename__ = "event_offsets"
+
+    consumer = Column(String, primary_key=True)
+    last_event_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class LeaderboardEntry(Base):
+    """One row of a materialized reader leaderboard (see app/leaderboards.py)"""
+    __tablename__ = "leaderboard_entries"
+
+    board = Column(String, primary_key=True)      # overall, genre, month
+    key = Column(String, primary_key=True)        # "" / genre name / "YYYY-MM"
+    position = Column(Integer, primary_key=True)  # 1-based place on the board
+    rank = Column(Integer, nullable=False)        # shared by tied readers
+    user_id = Column(Integer, ForeignKey("users.id"))
+    books_read = Column(Integer, nullable=False)
+    refreshed_at = Column(DateTime)
+
+class RecommendationResult(Base):
+    __tablename__ = "recommendation_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    rank = Column(Integer, nullable=False)
+    book_id = Column(Integer, ForeignKey("books.id"))
+    score = Column(Float)
+    computed_at = Column(DateTime, default=func.now())
 
 class BookRequest(Base):
     __tablename__ = "book_requests"
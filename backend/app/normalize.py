@@ -0,0 +1,141 @@
+"""
+Author and genre normalization, done once when books are written.
+
+Imported data stores authors and genres as Python list literals
+("['Alex Goldfarb', 'Marina Litvinenko']", "['Fiction']"). At ingest the names
+are parsed out, linked to the authors/genres tables through book_authors and
+book_genres, and books.author / books.genre are rewritten to their display form
+("Alex Goldfarb, Marina Litvinenko", "Fiction"), so reads use them as they are
+and genre filters are equality joins on genre ids.
+
+books.names_normalized marks the books in that shape. migrate_book_names()
+brings the others (written before this, or inserted raw by scripts) into it,
+one id range per transaction. Display-form values are never parsed again:
+"Fiction, Mystery" would read as a single genre.
+"""
+import ast
+from sqlalchemy import insert, inspect, select, text
+from app.models import Book, Author, Genre, BookAuthor, BookGenre
+
+# Stay under SQLite's bound parameter limit in IN (...) lookups
+LOOKUP_CHUNK = 500
+
+
+def parse_names(value):
+    """Names in a raw author/genre value: a list literal, or a single plain name"""
+    value = (value or "").strip()
+    if value.startswith("[") and value.endswith("]"):
+        try:
+            parsed = ast.literal_eval(value)
+            names = parsed if isinstance(parsed, (list, tuple)) else [parsed]
+        except (ValueError, SyntaxError):
+            names = [name.strip().strip("'\"") for name in value[1:-1].split(",")]
+    else:
+        names = [value]
+    # Order kept, duplicates and blanks dropped
+    return list(dict.fromkeys(str(name).strip() for name in names if str(name).strip()))
+
+
+def display_names(names):
+    return ", ".join(names)
+
+
+def normalize_book(book):
+    """Rewrite a Book's author/genre to display form. Returns (author names, genre names) for link_books()."""
+    authors = parse_names(book.author)
+    genres = parse_names(book.genre)
+    book.author = display_names(authors)
+    book.genre = display_names(genres) or None
+    book.names_normalized = True
+    return authors, genres
+
+
+def _name_ids(db, model, names):
+    """{name: id} for the given names, inserting the ones that don't exist yet"""
+    names = list(dict.fromkeys(names))
+    ids = {}
+    for start in range(0, len(names), LOOKUP_CHUNK):
+        chunk = names[start:start + LOOKUP_CHUNK]
+        ids.update(db.execute(select(model.name, model.id).where(model.name.in_(chunk))).all())
+    missing = [name for name in names if name not in ids]
+    if missing:
+        db.execute(insert(model), [{"name": name} for name in missing])
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            chunk = missing[start:start + LOOKUP_CHUNK]
+            ids.update(db.execute(select(model.name, model.id).where(model.name.in_(chunk))).all())
+    return ids
+
+
+def unlink_books(db, book_ids):
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), LOOKUP_CHUNK):
+        chunk = book_ids[start:start + LOOKUP_CHUNK]
+        db.query(BookAuthor).filter(BookAuthor.book_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(BookGenre).filter(BookGenre.book_id.in_(chunk)).delete(synchronize_session=False)
+
+
+def link_books(db, names_by_book):
+    """Replace the author/genre links of {book_id: (author names, genre names)} (caller commits)"""
+    if not names_by_book:
+        return
+    author_ids = _name_ids(db, Author, [name for authors, _ in names_by_book.values() for name in authors])
+    genre_ids = _name_ids(db, Genre, [name for _, genres in names_by_book.values() for name in genres])
+    unlink_books(db, names_by_book)
+
+    author_links = [
+        {"book_id": book_id, "author_id": author_ids[name], "position": position}
+        for book_id, (authors, _) in names_by_book.items() for position, name in enumerate(authors)
+    ]
+    genre_links = [
+        {"book_id": book_id, "genre_id": genre_ids[name], "position": position}
+        for book_id, (_, genres) in names_by_book.items() for position, name in enumerate(genres)
+    ]
+    if author_links:
+        db.execute(insert(BookAuthor), author_links)
+    if genre_links:
+        db.execute(insert(BookGenre), genre_links)
+
+
+def book_genre_names(db, book_ids=None):
+    """{book_id: [genre names in order]}, for all books or the given ones"""
+    query = db.query(BookGenre.book_id, Genre.name).join(Genre, Genre.id == BookGenre.genre_id)
+    if book_ids is not None:
+        query = query.filter(BookGenre.book_id.in_(list(book_ids)))
+    names = {}
+    for book_id, name in query.order_by(BookGenre.book_id, BookGenre.position):
+        names.setdefault(book_id, []).append(name)
+    return names
+
+
+def add_missing_name_columns(engine):
+    """
+    Add books.names_normalized to an existing table. Books linked before the
+    flag existed are already in display form and are marked normalized.
+    Returns the names of the columns added.
+    """
+    if "names_normalized" in {column["name"] for column in inspect(engine).get_columns("books")}:
+        return []
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE books ADD COLUMN names_normalized BOOLEAN NOT NULL DEFAULT FALSE"))
+        connection.execute(text(
+            "UPDATE books SET names_normalized = TRUE WHERE id IN (SELECT book_id FROM book_authors) "
+            "OR id IN (SELECT book_id FROM book_genres)"
+        ))
+    return ["names_normalized"]
+
+
+def migrate_book_names(db, batch_size=1000):
+    """Normalize and link every book not normalized yet. Returns the number of books processed."""
+    processed = 0
+    last_id = 0
+    while True:
+        books = db.query(Book).filter(
+            Book.id > last_id, Book.names_normalized.is_(False)
+        ).order_by(Book.id).limit(batch_size).all()
+        if not books:
+            break
+        link_books(db, {book.id: normalize_book(book) for book in books})
+        db.commit()
+        last_id = books[-1].id
+        processed += len(books)
+    return processed
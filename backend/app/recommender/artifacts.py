@@ -0,0 +1,82 @@
+import os
+import time
+import shutil
+import threading
+from datetime import datetime, timezone
+
+
+def publish(base_dir, write, keep=2):
+    """
+    Write a new version of an offline artifact and make it current.
+
+    `write(directory)` fills a fresh version directory; the CURRENT pointer is
+    only switched once it is complete, so a running API keeps reading the
+    previous version until then. Older versions beyond `keep` are removed.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    tmp_dir = os.path.join(base_dir, version + ".tmp")
+    os.makedirs(tmp_dir)
+    write(tmp_dir)
+    os.replace(tmp_dir, os.path.join(base_dir, version))
+
+    pointer = os.path.join(base_dir, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    versions = sorted(name for name in os.listdir(base_dir)
+                      if os.path.isdir(os.path.join(base_dir, name)) and not name.endswith(".tmp"))
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(base_dir, old), ignore_errors=True)
+    return version
+
+
+def current_version(base_dir):
+    try:
+        with open(os.path.join(base_dir, "CURRENT")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class ArtifactWatcher:
+    """
+    Serves the current version of a published artifact, reloading it when a
+    new version is published. The pointer file is checked at most once every
+    `check_interval` seconds so request paths don't hit the filesystem each time.
+    `on_change(version)` is called after each version is loaded.
+    """
+
+    def __init__(self, base_dir, loader, check_interval=30.0, on_change=None):
+        self.base_dir = base_dir
+        self.loader = loader
+        self.check_interval = check_interval
+        self.on_change = on_change
+        self.version = None
+        self._value = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    self._reload_if_changed()
+        return self._value
+
+    def _reload_if_changed(self):
+        version = current_version(self.base_dir)
+        if version is None or version == self.version:
+            return
+        try:
+            self._value = self.loader(os.path.join(self.base_dir, version))
+            self.version = version
+            print(f"Loaded {os.path.basename(self.base_dir)} version {version}")
+        except Exception as e:
+            print(f"Failed to load {self.base_dir} version {version}:", e)
+            return
+        if self.on_change is not None:
+            self.on_change(version)
@@ -0,0 +1,50 @@
+import os
+import numpy as np
+
+BLEND_WEIGHTS = {
+    "content": float(os.getenv("BLEND_CONTENT_WEIGHT", "0.5")),
+    "collaborative": float(os.getenv("BLEND_COLLABORATIVE_WEIGHT", "0.3")),
+    "popularity": float(os.getenv("BLEND_POPULARITY_WEIGHT", "0.2")),
+}
+
+
+def _min_max(scores):
+    scores = np.asarray(scores, dtype=np.float64)
+    if not len(scores):
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def popularity_score(avg_rating, rating_count):
+    """Average rating damped by how many people rated the book"""
+    return avg_rating * np.log1p(rating_count)
+
+
+def blend(components, k, weights=None):
+    """
+    Weighted sum of per-component scores.
+
+    `components` maps a component name to (book_ids, scores). Each component is
+    min-max normalised over its own candidates first, so weights are comparable;
+    a book missing from a component contributes 0 for it.
+    Returns (book ids, blended scores) of the top k, best first.
+    """
+    weights = weights or BLEND_WEIGHTS
+    totals = {}
+    for name, (book_ids, scores) in components.items():
+        weight = weights.get(name, 0.0)
+        if not weight or not len(book_ids):
+            continue
+        for book_id, score in zip(np.asarray(book_ids).tolist(), _min_max(scores)):
+            totals[book_id] = totals.get(book_id, 0.0) + weight * score
+
+    if not totals:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    book_ids = np.fromiter(totals.keys(), dtype=np.int64, count=len(totals))
+    scores = np.fromiter(totals.values(), dtype=np.float64, count=len(totals))
+    best = np.argsort(-scores, kind="stable")[:k]
+    return book_ids[best], scores[best]
@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "600"))
+
+
+class RecommendationCache:
+    """
+    Per-user LRU cache of recommendation results with a TTL.
+
+    Every user has a generation counter, bumped when their activity changes;
+    clear() bumps a global one for catalog changes and new MF model or
+    neighbour table versions. Writers take a token before
+    computing and put() drops the result if either generation moved meanwhile,
+    so a slow request can't re-cache results that were invalidated under it.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._user_generation = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def token(self, user_id):
+        with self._lock:
+            return self._generation, self._user_generation.get(user_id, 0)
+
+    def get(self, user_id, key):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._discard((user_id, key))
+                self.misses += 1
+                return None
+            self._entries.move_to_end((user_id, key))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, key, value, token):
+        with self._lock:
+            if token != (self._generation, self._user_generation.get(user_id, 0)):
+                return
+            self._entries[(user_id, key)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((user_id, key))
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, cache_key):
+        del self._entries[cache_key]
+        user_id, key = cache_key
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._user_generation[user_id] = self._user_generation.get(user_id, 0) + 1
+            for key in self._keys_by_user.pop(user_id, ()):
+                del self._entries[(user_id, key)]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def on_artifact_change(self, version):
+        """ArtifactWatcher callback: results from the previous version are stale"""
+        self.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+recommendation_cache = RecommendationCache()
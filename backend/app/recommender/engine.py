@@ -1,56 +1,185 @@
-import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+from .model_store import TfidfModelStore, model_store, book_content
+from .vector_index import top_k
+from .neighbors import neighbor_tables
 
+# The engine functions below are re-entrant: they only read the immutable model
+# snapshot and their array arguments, and allocate O(k + rated books + vocabulary)
+# besides the one score vector, so they are safe to call from concurrent threads.
 
-def hybrid_recommendation(user_id, users_df, books_df, interactions_df):
+
+def hybrid_recommendation(user_id, users_df, books_df, interactions_df, model=None):
     """
     Hybrid recommender: Content-based + Collaborative
+
+    DataFrame adapter over recommend_for_user(); the input frames are never modified.
+    Returns the top 10 rows of books_df with a "score" column.
     """
-    
+    model = model or model_store
+
     # Check if user has interactions
-    user_interactions = interactions_df[interactions_df["user_id"] == user_id]
-    
-    if len(user_interactions) == 0:
+    user_mask = interactions_df["user_id"].to_numpy() == user_id
+    if not user_mask.any():
         # Return top 10 books by ID if no interactions
         return books_df.head(10)
-    
-    # Content-based filtering
-    books_df["content"] = (
-        books_df["author"].fillna("") + " " +
-        books_df["genre"].fillna("") + " " +
-        books_df["description"].fillna("")
-    )
-    
-    tfidf = TfidfVectorizer(stop_words="english", max_features=1000)
-    tfidf_matrix = tfidf.fit_transform(books_df["content"])
-    
-    # Get user's read books with ratings
-    user_book_ratings = {}
-    for _, row in user_interactions.iterrows():
-        user_book_ratings[row['book_id']] = row['rating']
-    
-    user_book_ids = list(user_book_ratings.keys())
-    user_book_indices = books_df[books_df["id"].isin(user_book_ids)].index
-    
-    if len(user_book_indices) == 0:
+
+    # Content-based filtering uses the persisted TF-IDF model instead of refitting per call.
+    # Without one, fit a throwaway in-memory model on these frames; the shared model
+    # is only ever fitted from the whole catalog.
+    if not model.is_ready:
+        model = TfidfModelStore(model_dir=None)
+        model.fit(books_df["id"].tolist(), [
+            book_content(author, genre, description) for author, genre, description
+            in zip(books_df["author"].fillna(""), books_df["genre"].fillna(""), books_df["description"].fillna(""))
+        ])
+    snapshot = model.snapshot()
+
+    rated_book_ids = interactions_df["book_id"].to_numpy()[user_mask]
+    ratings = interactions_df["rating"].to_numpy(dtype=np.float64, na_value=0.0)[user_mask]
+
+    # Only score the precomputed neighbours of the user's books when the tables exist
+    table = neighbor_tables.get()
+    candidate_ids = table.candidates(rated_book_ids.tolist()) if table is not None else None
+    if candidate_ids is not None and not len(candidate_ids):
+        candidate_ids = None
+
+    book_ids, scores = recommend_for_user(snapshot, rated_book_ids, ratings, 10, candidate_ids)
+    if not len(book_ids):
         return books_df.head(10)
-    
+
+    # Return top 10 recommendations, best first
+    positions = books_df.index[books_df["id"].isin(book_ids)]
+    recommendations = books_df.loc[positions].assign(
+        score=books_df.loc[positions, "id"].map(dict(zip(book_ids.tolist(), scores.tolist())))
+    )
+    return recommendations.sort_values("score", ascending=False, kind="stable")
+
+
+def rows_for(snapshot, book_ids):
+    """
+    Model rows of the given book ids, looked up in the snapshot's sorted id index.
+    Returns (rows, found) where found marks which ids are in the model.
+    """
+    book_ids = np.asarray(book_ids, dtype=np.int64)
+    if not len(snapshot.sorted_ids) or not len(book_ids):
+        return np.empty(0, dtype=np.int64), np.zeros(len(book_ids), dtype=bool)
+
+    positions = np.minimum(np.searchsorted(snapshot.sorted_ids, book_ids), len(snapshot.sorted_ids) - 1)
+    found = snapshot.sorted_ids[positions] == book_ids
+    return snapshot.sorted_rows[positions[found]], found
+
+
+def rating_weights(ratings):
+    """
+    Profile weight of each rated book: rating / 5, unrated counting as 0. If no
+    book has a positive weight they all count equally. Shared by the single-user
+    and batch paths so both build the same profile.
+    """
+    weights = np.nan_to_num(np.asarray(ratings, dtype=np.float64)) / 5.0
+    if weights.sum() == 0:
+        weights = np.ones_like(weights)
+    return weights
+
+
+def user_profile(snapshot, rated_book_ids, ratings):
+    """
+    Unit-length, rating-weighted average of the TF-IDF rows of the user's books.
+    Returns (profile, rated_rows); profile is None if no rated book is in the model.
+    """
+    rows, found = rows_for(snapshot, rated_book_ids)
+    if not len(rows):
+        return None, rows
+
     # Weight by user ratings (higher rated books get more influence)
-    user_ratings = [user_book_ratings[books_df.loc[idx, 'id']] for idx in user_book_indices]
-    rating_weights = np.array(user_ratings) / 5.0  # Normalize to 0-1
-    
-    # Calculate weighted content similarity
-    user_profiles = tfidf_matrix[user_book_indices]
-    weighted_profile = np.average(user_profiles.toarray(), axis=0, weights=rating_weights)
-    content_scores = cosine_similarity([weighted_profile], tfidf_matrix).flatten()
-    
-    # Add scores to dataframe
-    books_df["score"] = content_scores
-    
-    # Filter out already read books
-    recommendations = books_df[~books_df["id"].isin(user_book_ids)]
-    
-    # Return top 10 recommendations
-    return recommendations.nlargest(10, "score")
+    weights = rating_weights(np.asarray(ratings, dtype=np.float64)[found])
+
+    # Sparse (rated rows)^T x weights; scale doesn't matter for cosine, so normalise
+    profile = snapshot.matrix[rows].T @ weights
+    norm = np.linalg.norm(profile)
+    if norm == 0:
+        return None, rows
+    return profile / norm, rows
+
+
+def score_candidates(snapshot, profile, candidate_ids, k, exclude_ids=()):
+    """Rank only the given candidate books against a unit profile: (ids, scores), best first"""
+    rows, _ = rows_for(snapshot, candidate_ids)
+    if len(exclude_ids):
+        exclude_rows, _ = rows_for(snapshot, list(exclude_ids))
+        rows = rows[~np.isin(rows, exclude_rows)]
+    if not len(rows):
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    scores = snapshot.matrix[rows] @ profile
+    best = top_k(scores, k, in_place=True)
+    return snapshot.book_ids[rows[best]], scores[best]
+
+
+def recommend_for_user(snapshot, rated_book_ids, ratings, k, candidate_ids=None):
+    """
+    Content top-k for one user from array inputs: the books they rated and the ratings.
+
+    Scores either the whole catalog or only `candidate_ids`, never returns a
+    book the user rated, and selects the top k with argpartition.
+    Returns (book ids, scores), best first.
+    """
+    profile, rated_rows = user_profile(snapshot, rated_book_ids, ratings)
+    if profile is None:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    if candidate_ids is not None:
+        return score_candidates(snapshot, profile, candidate_ids, k, rated_book_ids)
+
+    scores = snapshot.matrix @ profile
+    best = top_k(scores, k, rated_rows, in_place=True)
+    return snapshot.book_ids[best], scores[best]
+
+
+def batch_content_recommendations(snapshot, user_ratings, k, chunk_size=256):
+    """
+    Content recommendations for many users at once.
+
+    `user_ratings` is a list of (user_id, [(book_id, rating), ...]). Profiles for a
+    chunk of users are built as one sparse weights x TF-IDF product and scored
+    against the catalog with one matrix-matrix product. Ratings are weighted by
+    rating_weights() as in user_profile(), so each user gets the same profile as
+    from recommend_for_user(). Yields (user_id, book_ids, scores) per user with a
+    profile, best first.
+    """
+    book_ids, row_of, matrix = snapshot.book_ids, snapshot.row_of, snapshot.matrix
+
+    for start in range(0, len(user_ratings), chunk_size):
+        chunk = user_ratings[start:start + chunk_size]
+        rows, cols, weights = [], [], []
+        for i, (_, ratings) in enumerate(chunk):
+            known = [(row_of[book_id], np.nan if rating is None else rating)
+                     for book_id, rating in ratings if book_id in row_of]
+            if known:
+                rows += [i] * len(known)
+                cols += [row for row, _ in known]
+                weights += rating_weights([rating for _, rating in known]).tolist()
+        # Zero weights stay stored, so every rated book is in the user's row
+        user_weights = sp.csr_matrix((weights, (rows, cols)), shape=(len(chunk), len(book_ids)))
+
+        profiles = normalize(user_weights @ matrix).toarray()
+        scores = np.ascontiguousarray((matrix @ profiles.T).T)
+
+        # Never recommend a book the user already has
+        scores[np.repeat(np.arange(len(chunk)), np.diff(user_weights.indptr)), user_weights.indices] = -np.inf
+
+        width = min(k, scores.shape[1])
+        if width <= 0:
+            continue
+        best = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        for i, (user_id, _) in enumerate(chunk):
+            if user_weights.indptr[i] == user_weights.indptr[i + 1]:
+                continue
+            valid = np.isfinite(best_scores[i]) & (best_scores[i] > 0)
+            yield user_id, book_ids[best[i][valid]], best_scores[i][valid]
@@ -0,0 +1,136 @@
+import os
+import json
+import numpy as np
+import scipy.sparse as sp
+from .artifacts import publish, ArtifactWatcher
+from .cache import recommendation_cache
+from .model_store import MODEL_DIR
+from .vector_index import top_k
+
+MF_DIR = os.path.join(MODEL_DIR, "mf")
+
+
+def ratings_matrix(interactions):
+    """User x item CSR of ratings plus the user/item ids of its rows/columns"""
+    interactions = [(user_id, book_id, rating) for user_id, book_id, rating in interactions if rating]
+    if not interactions:
+        empty = np.empty(0, dtype=np.int64)
+        return sp.csr_matrix((0, 0), dtype=np.float32), empty, empty
+
+    user_ids, book_ids, ratings = (np.array(column) for column in zip(*interactions))
+    users, user_rows = np.unique(user_ids, return_inverse=True)
+    items, item_cols = np.unique(book_ids, return_inverse=True)
+    matrix = sp.csr_matrix(
+        (ratings.astype(np.float32), (user_rows, item_cols)),
+        shape=(len(users), len(items))
+    )
+    matrix.sum_duplicates()
+    return matrix, users.astype(np.int64), items.astype(np.int64)
+
+
+def _solve_side(ratings, fixed, reg, row_chunk=4096, col_chunk=4096):
+    """
+    One ALS half-step: for every row u solve (Y_u^T Y_u + reg*I) x_u = Y_u^T r_u,
+    where Y_u are the `fixed` factors of the columns u has rated.
+
+    The per-row Gram matrices are built for a block of rows at once as a sparse
+    indicator matrix times the flattened outer products y_i y_i^T, then solved
+    with one batched np.linalg.solve.
+    """
+    n_rows = ratings.shape[0]
+    k = fixed.shape[1]
+    solved = np.zeros((n_rows, k), dtype=np.float32)
+    ridge = reg * np.eye(k, dtype=np.float32)
+
+    for start in range(0, n_rows, row_chunk):
+        block = ratings[start:start + row_chunk]
+        indicator = block.copy()
+        indicator.data[:] = 1.0
+        indicator = indicator.tocsc()
+
+        gram = np.zeros((block.shape[0], k * k), dtype=np.float32)
+        for col in range(0, fixed.shape[0], col_chunk):
+            y = fixed[col:col + col_chunk]
+            outer = (y[:, :, None] * y[:, None, :]).reshape(len(y), k * k)
+            gram += indicator[:, col:col + col_chunk] @ outer
+
+        rhs = block @ fixed
+        gram = gram.reshape(-1, k, k) + ridge
+        solved[start:start + block.shape[0]] = np.linalg.solve(gram, rhs[:, :, None])[:, :, 0]
+
+    return solved
+
+
+def train_als(ratings, factors=32, iterations=10, reg=0.1, seed=0):
+    """
+    Explicit-feedback ALS on a user x item rating matrix.
+    Ratings are centred on the global mean; returns (user_factors, item_factors, global_mean).
+    """
+    ratings = sp.csr_matrix(ratings, dtype=np.float32)
+    global_mean = float(ratings.data.mean()) if ratings.nnz else 0.0
+    centred = ratings.copy()
+    centred.data -= global_mean
+    centred_t = centred.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    item_factors = rng.normal(0, 0.1, size=(ratings.shape[1], factors)).astype(np.float32)
+    user_factors = np.zeros((ratings.shape[0], factors), dtype=np.float32)
+
+    for _ in range(iterations):
+        user_factors = _solve_side(centred, item_factors, reg)
+        item_factors = _solve_side(centred_t, user_factors, reg)
+
+    return user_factors, item_factors, global_mean
+
+
+def rmse(ratings, user_factors, item_factors, global_mean):
+    """Training error over the observed ratings"""
+    coo = ratings.tocoo()
+    predicted = global_mean + np.einsum("ij,ij->i", user_factors[coo.row], item_factors[coo.col])
+    return float(np.sqrt(np.mean((predicted - coo.data) ** 2))) if coo.nnz else 0.0
+
+
+def publish_mf_model(user_ids, item_ids, user_factors, item_factors, meta, base_dir=MF_DIR):
+    def write(directory):
+        np.save(os.path.join(directory, "user_ids.npy"), user_ids)
+        np.save(os.path.join(directory, "item_ids.npy"), item_ids)
+        np.save(os.path.join(directory, "user_factors.npy"), user_factors)
+        np.save(os.path.join(directory, "item_factors.npy"), item_factors)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    return publish(base_dir, write)
+
+
+class MFModel:
+    """Trained user/item factors, read-only once loaded"""
+
+    def __init__(self, directory):
+        self.user_ids = np.load(os.path.join(directory, "user_ids.npy"))
+        self.item_ids = np.load(os.path.join(directory, "item_ids.npy"))
+        self.user_factors = np.load(os.path.join(directory, "user_factors.npy"))
+        self.item_factors = np.load(os.path.join(directory, "item_factors.npy"))
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.user_row = {int(user_id): row for row, user_id in enumerate(self.user_ids)}
+        self.item_row = {int(book_id): row for row, book_id in enumerate(self.item_ids)}
+
+    def scores(self, user_id):
+        """Predicted rating offset for every item (aligned with item_ids), or None for unknown users"""
+        row = self.user_row.get(user_id)
+        if row is None:
+            return None
+        return self.item_factors @ self.user_factors[row]
+
+    def recommend(self, user_id, k, exclude_ids=()):
+        """(book ids, scores) of the user's top-k unrated items"""
+        scores = self.scores(user_id)
+        if scores is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        exclude_rows = [self.item_row[book_id] for book_id in exclude_ids if book_id in self.item_row]
+        best = top_k(scores, k, exclude_rows)
+        return self.item_ids[best], scores[best]
+
+
+# Cached recommendations were ranked with the previous version
+mf_models = ArtifactWatcher(MF_DIR, MFModel, on_change=recommendation_cache.on_artifact_change)
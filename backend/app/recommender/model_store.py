@@ -0,0 +1,249 @@
+import os
+import json
+import atexit
+import threading
+from collections import namedtuple
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from sklearn.preprocessing import normalize
+from .vector_index import make_index, INDEX_KIND
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODEL_DIR = os.getenv("RECOMMENDER_MODEL_DIR", os.path.join(BACKEND_DIR, "models"))
+MAX_FEATURES = int(os.getenv("RECOMMENDER_MAX_FEATURES", "1000"))
+# Seconds an incremental change waits before the model is written to disk; 0 writes every change
+SAVE_DELAY = float(os.getenv("RECOMMENDER_SAVE_DELAY", "5"))
+
+# Immutable view of the fitted model. Updates build a new snapshot and swap it in,
+# so readers never see a half-applied change. sorted_ids/sorted_rows are an
+# array-backed id -> row index for vectorised lookups (np.searchsorted).
+TfidfSnapshot = namedtuple("TfidfSnapshot", ["book_ids", "row_of", "matrix", "sorted_ids", "sorted_rows"])
+
+
+def make_snapshot(book_ids, matrix):
+    book_ids = np.asarray(book_ids, dtype=np.int64)
+    order = np.argsort(book_ids, kind="stable")
+    sorted_ids = book_ids[order]
+    for array in (book_ids, sorted_ids, order):
+        array.flags.writeable = False
+    row_of = {int(book_id): row for row, book_id in enumerate(book_ids)}
+    return TfidfSnapshot(book_ids, row_of, sp.csr_matrix(matrix), sorted_ids, order)
+
+
+def book_content(author, genre, description):
+    """Text the content model is fitted on (same fields the engine always used)"""
+    return f"{author or ''} {genre or ''} {description or ''}"
+
+
+class TfidfModelStore:
+    """
+    TF-IDF model over the book catalog, fitted once and persisted to disk.
+
+    New or edited books are folded in with the existing vocabulary and IDF weights;
+    a full refit (new vocabulary, fresh IDF) only happens when explicitly requested.
+    The top-k similarity index over the book vectors is kept in step with the matrix.
+    With model_dir=None the model lives in memory only.
+
+    Full fits are saved right away. Incremental changes only schedule a save
+    save_delay seconds later, so a burst of book writes rewrites the matrix and
+    index files once instead of once per write; flush() saves what's pending.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, max_features=MAX_FEATURES, index_kind=None, save_delay=SAVE_DELAY):
+        self.model_dir = model_dir
+        self.max_features = max_features
+        self.index_kind = index_kind
+        self.save_delay = save_delay
+        self.index = None
+        self.vocabulary = None
+        self.idf = None
+        self._counter = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+
+    @property
+    def is_ready(self):
+        return self._snapshot is not None
+
+    def snapshot(self):
+        """Current TfidfSnapshot, or None if nothing is fitted"""
+        return self._snapshot
+
+    def _transform(self, contents):
+        counts = self._counter.transform(contents).astype(np.float64)
+        return normalize(sp.csr_matrix(counts @ sp.diags(self.idf)), norm="l2")
+
+    def fit(self, book_ids, contents):
+        """Fit a fresh vocabulary and book matrix over the whole catalog"""
+        tfidf = TfidfVectorizer(stop_words="english", max_features=self.max_features)
+        tfidf.fit(contents)
+
+        with self._lock:
+            self.vocabulary = {term: int(idx) for term, idx in tfidf.vocabulary_.items()}
+            self.idf = tfidf.idf_.astype(np.float64)
+            self._counter = CountVectorizer(stop_words="english", vocabulary=self.vocabulary)
+            self._snapshot = make_snapshot(book_ids, self._transform(contents))
+            self.index = self._new_index()
+            self.index.build(self._snapshot.book_ids, self._snapshot.matrix)
+        self.save()
+
+    def _new_index(self):
+        return make_index(self.index_kind or INDEX_KIND)
+
+    def fit_books(self, books):
+        """Fit from Book rows (or any objects with id/author/genre/description)"""
+        books = list(books)
+        self.fit(
+            [book.id for book in books],
+            [book_content(book.author, book.genre, book.description) for book in books]
+        )
+
+    def upsert_books(self, books):
+        """Fold new or changed books into the existing model without refitting"""
+        books = list(books)
+        if not books or not self.is_ready:
+            return
+
+        vectors = self._transform(
+            [book_content(book.author, book.genre, book.description) for book in books]
+        )
+
+        with self._lock:
+            book_ids, row_of, matrix = self._snapshot[:3]
+            row_of = dict(row_of)
+            matrix = matrix.tolil() if any(book.id in row_of for book in books) else matrix
+
+            new_ids = []
+            new_rows = []
+            for i, book in enumerate(books):
+                if book.id in row_of:
+                    matrix[row_of[book.id]] = vectors[i]
+                else:
+                    row_of[book.id] = len(book_ids) + len(new_ids)
+                    new_ids.append(book.id)
+                    new_rows.append(i)
+
+            matrix = sp.csr_matrix(matrix)
+            if new_ids:
+                matrix = sp.vstack([matrix, vectors[new_rows]], format="csr")
+                book_ids = np.concatenate([book_ids, np.asarray(new_ids, dtype=np.int64)])
+
+            self._snapshot = make_snapshot(book_ids, matrix)
+            self.index.add([book.id for book in books], vectors)
+        self.schedule_save()
+
+    def remove_books(self, removed_ids):
+        """Drop deleted books from the model"""
+        if not self.is_ready:
+            return
+
+        with self._lock:
+            book_ids, _, matrix = self._snapshot[:3]
+            keep = ~np.isin(book_ids, np.asarray(list(removed_ids), dtype=np.int64))
+            if keep.all():
+                return
+            self._snapshot = make_snapshot(book_ids[keep], matrix[np.flatnonzero(keep)])
+            self.index.remove(removed_ids)
+        self.schedule_save()
+
+    def schedule_save(self):
+        """Save after save_delay seconds; changes made in the meantime go out with that save"""
+        if self.save_delay <= 0 or self.model_dir is None:
+            self.save()
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Save now if a save is scheduled"""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+    def save(self):
+        """Persist vocabulary, IDF weights, book ids and the sparse matrix"""
+        if self._snapshot is None or self.model_dir is None:
+            return
+
+        with self._save_lock:
+            # Taken under the lock, so a save that waited for another writes the newer state
+            snapshot = self._snapshot
+            os.makedirs(self.model_dir, exist_ok=True)
+            self._atomic_write("vocabulary.json", lambda f: f.write(json.dumps(self.vocabulary).encode("utf-8")))
+            self._atomic_write("idf.npy", lambda f: np.save(f, self.idf))
+            self._atomic_write("book_ids.npy", lambda f: np.save(f, snapshot.book_ids))
+            self._atomic_write("tfidf_matrix.npz", lambda f: sp.save_npz(f, snapshot.matrix))
+            if self.index is not None:
+                self.index.save(self.model_dir)
+
+    def _atomic_write(self, name, write):
+        path = os.path.join(self.model_dir, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def load(self):
+        """Load a previously saved model. Returns False if none exists on disk."""
+        try:
+            with open(os.path.join(self.model_dir, "vocabulary.json"), encoding="utf-8") as f:
+                vocabulary = json.load(f)
+            idf = np.load(os.path.join(self.model_dir, "idf.npy"))
+            book_ids = np.load(os.path.join(self.model_dir, "book_ids.npy"))
+            matrix = sp.load_npz(os.path.join(self.model_dir, "tfidf_matrix.npz")).tocsr()
+        except (OSError, ValueError):
+            return False
+
+        with self._lock:
+            self.vocabulary = vocabulary
+            self.idf = idf
+            self._counter = CountVectorizer(stop_words="english", vocabulary=vocabulary)
+            self._snapshot = make_snapshot(book_ids, matrix)
+            self.index = self._new_index()
+            if not self.index.load(self.model_dir):
+                # No saved index (or a different RECOMMENDER_INDEX kind): rebuild from the matrix
+                self.index.build(book_ids, matrix)
+        return True
+
+    def refit_from_db(self, db):
+        """Full refit over every book currently in the database"""
+        from app.models import Book
+
+        books = db.query(Book.id, Book.author, Book.genre, Book.description).all()
+        if books:
+            self.fit_books(books)
+        return len(books)
+
+    def load_or_fit(self, db):
+        """Startup path: reuse the saved model, fitting one only if none exists"""
+        from app.models import Book
+
+        if not self.load():
+            self.refit_from_db(db)
+            return
+
+        # Catch up with books added or deleted while the server was down
+        db_ids = {book_id for (book_id,) in db.query(Book.id).all()}
+        model_ids = set(self._snapshot.row_of)
+        missing = db_ids - model_ids
+        if missing:
+            self.upsert_books(
+                db.query(Book.id, Book.author, Book.genre, Book.description)
+                .filter(Book.id.in_(missing)).all()
+            )
+        if model_ids - db_ids:
+            self.remove_books(model_ids - db_ids)
+
+
+model_store = TfidfModelStore()
+# Write out a scheduled save on a clean shutdown
+atexit.register(model_store.flush)
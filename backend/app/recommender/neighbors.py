@@ -0,0 +1,132 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+from .artifacts import publish, ArtifactWatcher
+from .cache import recommendation_cache
+from .model_store import MODEL_DIR
+
+NEIGHBORS_DIR = os.path.join(MODEL_DIR, "neighbors")
+NEIGHBOR_KINDS = ("content", "collaborative")
+
+# Shared with pool workers through the initializer, so each worker receives the matrix once
+_worker_matrix = None
+_worker_top_n = None
+
+
+def _init_worker(matrix, top_n):
+    global _worker_matrix, _worker_top_n
+    _worker_matrix = matrix
+    _worker_top_n = top_n
+
+
+def _top_n_chunk(bounds):
+    """Top-N most similar rows (by dot product) for rows start..end, excluding each row itself"""
+    start, end = bounds
+    matrix, top_n = _worker_matrix, _worker_top_n
+
+    sims = np.asarray(matrix @ matrix[start:end].toarray().T, dtype=np.float32).T
+    sims[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+    top_n = min(top_n, sims.shape[1] - 1)
+    if top_n <= 0:
+        return start, np.empty((end - start, 0), dtype=np.int64), np.empty((end - start, 0), dtype=np.float32)
+
+    rows = np.argpartition(-sims, top_n - 1, axis=1)[:, :top_n]
+    scores = np.take_along_axis(sims, rows, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return start, np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def compute_neighbors(matrix, top_n=50, chunk_size=128, processes=None):
+    """
+    Top-N neighbours of every row of an L2-normalised matrix (cosine similarity).
+
+    Rows are processed in chunks across a process pool. Returns (rows, scores)
+    arrays of shape (n, top_n); slots without a positive-similarity neighbour
+    have row -1 and score 0.
+    """
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    n = matrix.shape[0]
+    width = max(0, min(top_n, n - 1))
+    rows = np.full((n, top_n), -1, dtype=np.int64)
+    scores = np.zeros((n, top_n), dtype=np.float32)
+
+    chunks = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+    with Pool(processes, initializer=_init_worker, initargs=(matrix, top_n)) as pool:
+        for start, chunk_rows, chunk_scores in pool.imap_unordered(_top_n_chunk, chunks):
+            end = start + len(chunk_rows)
+            positive = chunk_scores > 0
+            rows[start:end, :width] = np.where(positive, chunk_rows, -1)
+            scores[start:end, :width] = np.where(positive, chunk_scores, 0)
+
+    return rows, scores
+
+
+def rating_matrix(book_ids, interactions):
+    """Item x user matrix of ratings, rows aligned with book_ids, rows L2-normalised"""
+    row_of = {int(book_id): row for row, book_id in enumerate(book_ids)}
+    entries = [(row_of[book_id], user_id, rating) for user_id, book_id, rating in interactions
+               if book_id in row_of and rating]
+    if not entries:
+        return sp.csr_matrix((len(book_ids), 1), dtype=np.float32)
+
+    item_rows, user_ids, ratings = (np.array(column) for column in zip(*entries))
+    users, user_cols = np.unique(user_ids, return_inverse=True)
+    matrix = sp.csr_matrix(
+        (ratings.astype(np.float32), (item_rows, user_cols)),
+        shape=(len(book_ids), len(users))
+    )
+    return normalize(matrix)
+
+
+def write_neighbor_tables(directory, book_ids, tables):
+    """Write book ids plus one (neighbour ids, scores) pair of .npy files per kind"""
+    book_ids = np.asarray(book_ids, dtype=np.int64)
+    np.save(os.path.join(directory, "book_ids.npy"), book_ids)
+    for kind, (rows, scores) in tables.items():
+        neighbor_ids = np.where(rows >= 0, book_ids[np.maximum(rows, 0)], -1)
+        np.save(os.path.join(directory, f"{kind}_ids.npy"), neighbor_ids)
+        np.save(os.path.join(directory, f"{kind}_scores.npy"), scores)
+
+
+def publish_neighbor_tables(book_ids, tables, base_dir=NEIGHBORS_DIR):
+    return publish(base_dir, lambda directory: write_neighbor_tables(directory, book_ids, tables))
+
+
+class NeighborTable:
+    """Precomputed item-item neighbours, memory-mapped from disk"""
+
+    def __init__(self, directory):
+        self.book_ids = np.load(os.path.join(directory, "book_ids.npy"))
+        self.row_of = {int(book_id): row for row, book_id in enumerate(self.book_ids)}
+        self.tables = {}
+        for kind in NEIGHBOR_KINDS:
+            path = os.path.join(directory, f"{kind}_ids.npy")
+            if os.path.exists(path):
+                self.tables[kind] = (
+                    np.load(path, mmap_mode="r"),
+                    np.load(os.path.join(directory, f"{kind}_scores.npy"), mmap_mode="r"),
+                )
+
+    def neighbors(self, book_id, kind="content"):
+        """(neighbour ids, similarity scores) of one book, best first"""
+        row = self.row_of.get(book_id)
+        if row is None or kind not in self.tables:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, scores = self.tables[kind]
+        valid = ids[row] >= 0
+        return np.asarray(ids[row][valid]), np.asarray(scores[row][valid])
+
+    def candidates(self, book_ids):
+        """Union of all neighbour lists of the given books"""
+        rows = [self.row_of[book_id] for book_id in book_ids if book_id in self.row_of]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        merged = np.concatenate([np.asarray(ids[rows]).ravel() for ids, _ in self.tables.values()])
+        return np.unique(merged[merged >= 0])
+
+
+# Cached recommendations were ranked with the previous version
+neighbor_tables = ArtifactWatcher(NEIGHBORS_DIR, NeighborTable, on_change=recommendation_cache.on_artifact_change)
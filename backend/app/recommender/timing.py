@@ -0,0 +1,57 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+
+class StageTimer:
+    """Wall-clock timings for the named stages of a single request"""
+
+    def __init__(self):
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def server_timing(self):
+        """Render as a Server-Timing header value (durations in ms)"""
+        parts = [f"{name};dur={ms:.2f}" for name, ms in self.stages.items()]
+        parts.append(f"total;dur={self.total_ms:.2f}")
+        return ", ".join(parts)
+
+
+class LatencyRecorder:
+    """Rolling window of request latencies per key, for p50/p99 comparisons"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, ms):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(ms)
+
+    def summary(self):
+        with self._lock:
+            samples = {key: np.array(values) for key, values in self._samples.items()}
+
+        return {
+            key: {
+                "count": int(len(values)),
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p99_ms": round(float(np.percentile(values, 99)), 3),
+            }
+            for key, values in samples.items() if len(values)
+        }
@@ -0,0 +1,67 @@
+"""
+Model training runs started from the admin API.
+
+A TrainingJob runs one training command at a time in a child process, so the
+serving process keeps answering with the current model. A waiter thread reaps
+the child when it exits (no zombies) and records its exit code; a start while
+a run is active is refused.
+"""
+import subprocess
+import sys
+import threading
+from app.timeutil import utc_now
+from .model_store import BACKEND_DIR
+
+
+class TrainingJob:
+    """At most one training process at a time, with the status of the latest run"""
+
+    def __init__(self, module, cwd=BACKEND_DIR):
+        self.module = module
+        self.cwd = cwd
+        self.process = None
+        self.args = None
+        self.started_at = None
+        self.finished_at = None
+        self.returncode = None
+        self._lock = threading.Lock()
+
+    def start(self, args=()):
+        """Start a run with extra command line `args`. Returns the pid, or None if a run is active."""
+        with self._lock:
+            if self.process is not None and self.returncode is None:
+                return None
+            process = subprocess.Popen([sys.executable, "-m", self.module, *args], cwd=self.cwd)
+            self.process = process
+            self.args = list(args)
+            self.started_at, self.finished_at, self.returncode = utc_now(), None, None
+        threading.Thread(target=self._wait, args=(process,), name="training-waiter", daemon=True).start()
+        return process.pid
+
+    def _wait(self, process):
+        returncode = process.wait()
+        with self._lock:
+            if process is self.process:
+                self.returncode = returncode
+                self.finished_at = utc_now()
+
+    def status(self):
+        """idle / running / succeeded / failed, with the latest run's details"""
+        with self._lock:
+            if self.process is None:
+                return {"state": "idle"}
+            if self.returncode is None:
+                state = "running"
+            else:
+                state = "succeeded" if self.returncode == 0 else "failed"
+            return {
+                "state": state,
+                "pid": self.process.pid,
+                "args": self.args,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "returncode": self.returncode
+            }
+
+
+mf_training = TrainingJob("scripts.train_mf")
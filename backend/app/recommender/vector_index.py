@@ -0,0 +1,263 @@
+"""
+Top-k similarity indexes over L2-normalised book vectors.
+
+ExactIndex scores every book; IVFIndex clusters the vectors with spherical
+k-means and only scores the books in the `nprobe` clusters closest to the
+query, trading recall for latency. Both support build, incremental add/remove,
+search and save/load, and are interchangeable behind make_index().
+"""
+import os
+import threading
+from collections import namedtuple
+import numpy as np
+import scipy.sparse as sp
+
+INDEX_KIND = os.getenv("RECOMMENDER_INDEX", "exact")
+IVF_NLIST = int(os.getenv("RECOMMENDER_IVF_NLIST", "0"))  # 0 = sqrt(catalog size)
+IVF_NPROBE = int(os.getenv("RECOMMENDER_IVF_NPROBE", "16"))
+
+# Compact tombstoned rows away once they make up this share of the index
+COMPACT_RATIO = 0.2
+
+IndexState = namedtuple("IndexState", ["ids", "row_of", "deleted", "vectors", "assignments", "order", "offsets"])
+
+
+def top_k(scores, k, exclude_rows=None, in_place=False):
+    """
+    Row indices of the k highest scores, best first, skipping exclude_rows.
+    With in_place=True excluded entries are overwritten in `scores` instead of copying it.
+    """
+    if exclude_rows is not None and len(exclude_rows):
+        if not in_place:
+            scores = scores.copy()
+        scores[exclude_rows] = -np.inf
+
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return ranked[np.isfinite(scores[ranked])]
+
+
+def _inverted_lists(assignments, nlist):
+    """Group row numbers by cluster: rows of cluster c are order[offsets[c]:offsets[c + 1]]"""
+    order = np.argsort(assignments, kind="stable")
+    offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+    return order, offsets
+
+
+class ExactIndex:
+    """Brute-force cosine search over every vector"""
+
+    kind = "exact"
+
+    def __init__(self):
+        self._state = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        state = self._state
+        return 0 if state is None else int(len(state.ids) - state.deleted.sum())
+
+    def build(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = sp.csr_matrix(vectors)
+        with self._lock:
+            self._state = self._make_state(ids, np.zeros(len(ids), dtype=bool), vectors, self._assign(vectors))
+
+    def add(self, ids, vectors):
+        """Insert vectors; an id that is already indexed is replaced"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        vectors = sp.csr_matrix(vectors)
+        assignments = self._assign(vectors)
+
+        with self._lock:
+            state = self._state
+            deleted = state.deleted.copy()
+            deleted[[state.row_of[book_id] for book_id in ids.tolist() if book_id in state.row_of]] = True
+            self._state = self._make_state(
+                np.concatenate([state.ids, ids]),
+                np.concatenate([deleted, np.zeros(len(ids), dtype=bool)]),
+                sp.vstack([state.vectors, vectors], format="csr"),
+                np.concatenate([state.assignments, assignments])
+            )
+            self._maybe_compact()
+
+    def remove(self, ids):
+        with self._lock:
+            state = self._state
+            if state is None:
+                return
+            rows = [state.row_of[book_id] for book_id in ids if book_id in state.row_of]
+            if not rows:
+                return
+            deleted = state.deleted.copy()
+            deleted[rows] = True
+            self._state = state._replace(deleted=deleted)
+            self._maybe_compact()
+
+    def search(self, query, k, exclude_ids=(), nprobe=None):
+        """(ids, scores) of the k vectors most similar to the dense unit query"""
+        state = self._state
+        query = np.asarray(query, dtype=state.vectors.dtype)
+        skip = [state.row_of[book_id] for book_id in exclude_ids if book_id in state.row_of]
+        rows = self._candidates(state, query, nprobe)
+
+        if rows is None:
+            scores = state.vectors @ query
+            exclude = state.deleted.copy()
+            exclude[skip] = True
+            best = top_k(scores, k, np.flatnonzero(exclude))
+            return state.ids[best], scores[best]
+
+        scores = state.vectors[rows] @ query
+        exclude = state.deleted[rows] | np.isin(rows, skip)
+        best = top_k(scores, k, np.flatnonzero(exclude))
+        return state.ids[rows[best]], scores[best]
+
+    def _candidates(self, state, query, nprobe):
+        """Rows worth scoring for this query (None = all of them)"""
+        return None
+
+    def _assign(self, vectors):
+        return np.zeros(vectors.shape[0], dtype=np.int32)
+
+    def _make_state(self, ids, deleted, vectors, assignments):
+        order, offsets = _inverted_lists(assignments, self._nlist())
+        row_of = {int(book_id): row for row, book_id in enumerate(ids) if not deleted[row]}
+        return IndexState(ids, row_of, deleted, vectors, assignments, order, offsets)
+
+    def _nlist(self):
+        return 1
+
+    def _maybe_compact(self):
+        state = self._state
+        if state.deleted.sum() <= COMPACT_RATIO * len(state.ids):
+            return
+        keep = np.flatnonzero(~state.deleted)
+        self._state = self._make_state(
+            state.ids[keep], np.zeros(len(keep), dtype=bool), state.vectors[keep], state.assignments[keep]
+        )
+
+    def save(self, directory):
+        state = self._state
+        if state is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "vector_index.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, kind=self.kind, ids=state.ids, deleted=state.deleted,
+                     assignments=state.assignments, **self._extra_arrays())
+        os.replace(path + ".tmp", path)
+        path = os.path.join(directory, "vector_index_vectors.npz")
+        with open(path + ".tmp", "wb") as f:
+            sp.save_npz(f, state.vectors)
+        os.replace(path + ".tmp", path)
+
+    def load(self, directory):
+        """Load a saved index of the same kind. Returns False if there isn't one."""
+        try:
+            arrays = np.load(os.path.join(directory, "vector_index.npz"))
+            vectors = sp.load_npz(os.path.join(directory, "vector_index_vectors.npz")).tocsr()
+        except (OSError, ValueError):
+            return False
+        if str(arrays["kind"]) != self.kind:
+            return False
+
+        with self._lock:
+            self._load_extra_arrays(arrays)
+            self._state = self._make_state(arrays["ids"], arrays["deleted"], vectors, arrays["assignments"])
+        return True
+
+    def _extra_arrays(self):
+        return {}
+
+    def _load_extra_arrays(self, arrays):
+        pass
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file index: spherical k-means centroids, one posting list per centroid.
+
+    `nlist` sets the number of clusters (default sqrt(n)); `nprobe` sets how many of
+    the closest clusters are scored per query. Higher nprobe = better recall, slower.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, nlist=IVF_NLIST, nprobe=IVF_NPROBE, n_iter=10, sample_size=50000,
+                 chunk_size=20000, seed=0):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.centroids = None
+
+    def build(self, ids, vectors):
+        vectors = sp.csr_matrix(vectors, dtype=np.float32)
+        self.centroids = self._train(vectors)
+        super().build(ids, vectors)
+
+    def add(self, ids, vectors):
+        super().add(ids, sp.csr_matrix(vectors, dtype=np.float32))
+
+    def _candidates(self, state, query, nprobe):
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([state.order[state.offsets[c]:state.offsets[c + 1]] for c in probe])
+
+    def _train(self, vectors):
+        """Spherical k-means on a sample of the rows"""
+        rng = np.random.default_rng(self.seed)
+        n = vectors.shape[0]
+        nlist = max(1, min(self.nlist or int(np.sqrt(n)), n))
+
+        sample = vectors[rng.choice(n, min(n, self.sample_size), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].toarray()
+
+        for _ in range(self.n_iter):
+            assignments = np.asarray((sample @ centroids.T).argmax(axis=1)).ravel()
+            members = sp.csr_matrix(
+                (np.ones(len(assignments), dtype=np.float32), (assignments, np.arange(len(assignments)))),
+                shape=(nlist, sample.shape[0])
+            )
+            sums = (members @ sample).toarray()
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms == 0
+            sums[empty] = centroids[empty]  # keep the old centroid for empty clusters
+            norms[empty] = np.linalg.norm(centroids[empty], axis=1)
+            centroids = sums / np.maximum(norms, 1e-12)[:, None]
+
+        return centroids.astype(np.float32)
+
+    def _assign(self, vectors):
+        assignments = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], self.chunk_size):
+            chunk = vectors[start:start + self.chunk_size]
+            assignments[start:start + chunk.shape[0]] = np.asarray((chunk @ self.centroids.T).argmax(axis=1)).ravel()
+        return assignments
+
+    def _nlist(self):
+        return len(self.centroids)
+
+    def _extra_arrays(self):
+        return {"centroids": self.centroids}
+
+    def _load_extra_arrays(self, arrays):
+        self.centroids = arrays["centroids"]
+
+
+def make_index(kind=INDEX_KIND):
+    """Index implementation selected by RECOMMENDER_INDEX (exact | ivf)"""
+    if kind == "ivf":
+        return IVFIndex()
+    return ExactIndex()
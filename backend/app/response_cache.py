@@ -0,0 +1,132 @@
+"""
+Cache of serialized JSON responses for read endpoints that change rarely.
+
+Entries are keyed on the route and its parameters plus the version of the data
+behind them (catalog.version, a user's recommendation cache token, ...), so a
+data change makes every older entry unreachable instead of having to find and
+delete it. The ETag is derived from the same key and version: a request whose
+If-None-Match still matches gets a 304 before anything is looked up, and a hit
+returns the stored bytes without loading or encoding anything.
+
+Storage is pluggable: anything with get(key), set(key, value) and clear() can
+replace the in-process LRU (e.g. a shared store, or a stand-in in tests).
+Versions are per-process counters, so keys and ETags carry an instance id.
+"""
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from fastapi import Response
+from app.fast_json import encode_json
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Clients may keep responses but must revalidate them (cheap: usually a 304)
+CACHE_CONTROL = "no-cache"
+
+INSTANCE = uuid.uuid4().hex[:8]
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check (weak comparison, as the header calls for)"""
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+class MemoryBackend:
+    """In-process LRU bounded by entry count and total body size"""
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_size or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class ResponseCache:
+    """Versioned, pre-serialized JSON responses with ETag / If-None-Match support"""
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _key(self, key, version):
+        return f"{INSTANCE}:{key}@{version}"
+
+    def etag(self, key, version):
+        return '"' + hashlib.sha1(self._key(key, version).encode()).hexdigest()[:20] + '"'
+
+    def lookup(self, key, version, if_none_match=None):
+        """A 304 or the cached 200 for this key and version; None on a miss"""
+        etag = self.etag(key, version)
+        if if_none_match and etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        entry = self.backend.get(self._key(key, version))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        body, headers = entry
+        return self._response(body, etag, headers, "hit")
+
+    def store(self, key, version, content, headers=None):
+        """Serialize content once, cache the bytes and return them as a response"""
+        body = encode_json(content)
+        headers = dict(headers or {})
+        self.backend.set(self._key(key, version), (body, headers))
+        return self._response(body, self.etag(key, version), headers, "miss")
+
+    def _response(self, body, etag, headers, status):
+        return Response(content=body, media_type="application/json", headers={
+            **headers, "ETag": etag, "Cache-Control": CACHE_CONTROL, "X-Cache": status
+        })
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        stats = {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+        if hasattr(self.backend, "stats"):
+            stats.update(self.backend.stats())
+        return stats
+
+
+response_cache = ResponseCache()
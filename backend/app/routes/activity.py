@@ -1,10 +1,24 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import UserBook
+from app.models import UserBook, InteractionEvent
+from app.timeutil import utc_now
+from app.interactions import apply_interactions, upsert_user_books, user_book_row, read_at_after
+from app.event_log import event_consumer
 
 router = APIRouter(prefix="/activity", tags=["User Activity"])
 
+MAX_BULK_ACTIVITY = 500
+
+class ActivityItem(BaseModel):
+    book_id: int
+    rating: Optional[float] = None
+    status: str
+    ts: Optional[datetime] = None  # when the change was made on the client (default: now)
+
 @router.post("/update")
 def update_activity(
     user_id: int,
@@ -13,23 +27,38 @@ def update_activity(
     status: str,
     db: Session = Depends(get_db)
 ):
-    activity = db.query(UserBook).filter(
+    current = db.query(UserBook.rating, UserBook.status, UserBook.read_at).filter(
         UserBook.user_id == user_id,
         UserBook.book_id == book_id
     ).first()
+    changed = current is None or (current.rating, current.status) != (rating, status)
 
-    if activity:
-        activity.rating = rating
-        activity.status = status
-    else:
-        activity = UserBook(
-            user_id=user_id,
-            book_id=book_id,
-            rating=rating,
-            status=status
-        )
-        db.add(activity)
+    # An upsert, so concurrent first writes for the same book don't collide on the unique index.
+    # The event goes into the log in the same transaction as the interaction;
+    # aggregates, trending, leaderboards and caches follow from the log (app/event_log.py)
+    if changed:
+        now = utc_now()
+        old_status, old_read_at = (current.status, current.read_at) if current else (None, None)
+        read_at = read_at_after(old_status, old_read_at, status, now)
+        upsert_user_books(db, [user_book_row(user_id, book_id, rating, status, now, read_at=read_at)])
+        db.add(InteractionEvent(user_id=user_id, book_id=book_id, rating=rating, status=status, created_at=now))
+        db.commit()
+        event_consumer.notify()
 
+    return db.query(UserBook).filter(
+        UserBook.user_id == user_id,
+        UserBook.book_id == book_id
+    ).one()
+
+@router.post("/bulk")
+def bulk_update_activity(user_id: int, items: list[ActivityItem], db: Session = Depends(get_db)):
+    """Apply many rating/status changes (e.g. an offline reading session) in one transaction"""
+    if len(items) > MAX_BULK_ACTIVITY:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ACTIVITY} items per request")
+
+    results, changes = apply_interactions(db, user_id, items)
     db.commit()
-    db.refresh(activity)
-    return activity
\ No newline at end of file
+
+    if changes:
+        event_consumer.notify()
+    return {"applied": len(changes), "results": results}
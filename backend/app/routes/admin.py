@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Book
+from app.recommender.model_store import model_store
+from app.recommender.cache import recommendation_cache
+from app.recommender.training import mf_training
+from app.catalog import catalog, catalog_book
+from app.normalize import parse_names, display_names, normalize_book, link_books
+from app.search import search_index
+from app.event_log import event_consumer, stored_offset
 import pandas as pd
 import json
 from io import StringIO
@@ -32,11 +39,13 @@ async def bulk_import_books(
         df = df.fillna('')
         
         books_added = 0
+        new_books = []
+        names = {}
         for _, row in df.iterrows():
-            # Check if book exists
+            # Check if book exists (stored authors are in display form)
             existing = db.query(Book).filter(
                 Book.title == row['title'],
-                Book.author == row['author']
+                Book.author == display_names(parse_names(row['author']))
             ).first()
             
             if not existing:
@@ -46,10 +55,24 @@ async def bulk_import_books(
                     genre=row.get('genre', ''),
                     description=row.get('description', '')
                 )
+                names[book] = normalize_book(book)
                 db.add(book)
+                new_books.append(book)
                 books_added += 1
         
+        # Flush first so ids are assigned while the rows are still loaded
+        db.flush()
+        link_books(db, {book.id: names[book] for book in new_books})
+        new_books = [catalog_book(book, names[book][1]) for book in new_books]
         db.commit()
+        
+        # Fold imported books into the content model, the catalog and the search index
+        model_store.upsert_books(new_books)
+        catalog.upsert_books(new_books)
+        search_index.upsert_books(db, new_books)
+        if new_books:
+            recommendation_cache.clear()
+        
         return {
             "message": f"Successfully imported {books_added} books",
             "total_processed": len(df),
@@ -58,4 +81,44 @@ async def bulk_import_books(
         
     except Exception as e:
         db.rollback()
-        return {"error": f"Import failed: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Import failed: {str(e)}"}
+
+@router.post("/recommender/refit")
+def refit_recommender(db: Session = Depends(get_db)):
+    """Refit the content recommender's TF-IDF model over the whole catalog"""
+    books_fitted = model_store.refit_from_db(db)
+    recommendation_cache.clear()
+    return {"message": "Recommender model refitted", "books_fitted": books_fitted}
+
+
+@router.post("/recommender/train-mf")
+def train_collaborative_model(factors: int = 32, iterations: int = 10, reg: float = 0.1):
+    """Retrain the matrix factorization model in a separate process; the current model keeps serving"""
+    pid = mf_training.start(["--factors", str(factors), "--iterations", str(iterations), "--reg", str(reg)])
+    if pid is None:
+        raise HTTPException(status_code=409, detail="Matrix factorization training is already running")
+    return {"message": "Training started", "pid": pid}
+
+
+@router.get("/recommender/train-mf")
+def collaborative_training_status():
+    """State of the latest matrix factorization training run"""
+    return mf_training.status()
+
+
+@router.get("/events")
+def event_log_status(db: Session = Depends(get_db)):
+    """Progress of the interaction event consumer"""
+    return {
+        "stored_offset": stored_offset(db),
+        "memory_offset": event_consumer.memory_offset,
+        "lag": event_consumer.lag(db),
+        "processed": event_consumer.processed
+    }
+
+
+@router.post("/events/replay")
+def replay_events(offset: int = Query(0, ge=0), db: Session = Depends(get_db)):
+    """Reprocess interaction events after `offset` (0: the whole history) to rebuild the state derived from them"""
+    event_consumer.replay(db, offset)
+    return {"message": "Replay started", "offset": offset}
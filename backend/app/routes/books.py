@@ -1,165 +1,330 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Header
+from fastapi.responses import FileResponse, RedirectResponse
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+import numpy as np
 from app.database import get_db
-from app.models import Book, UserBook
+from app.models import Book
+from app.catalog import catalog, catalog_book, average_ratings, books_with_ratings, seek, rows_for as catalog_rows
+from app.search import search_index
+from app.normalize import normalize_book, link_books, unlink_books
+from app.covers import cover_resolver, placeholder_cover, placeholder_svg
+from app.thumbnails import thumbnail_store, COVER_IMAGE_MAX_AGE
+from app.trending import trending
+from app.response_cache import response_cache, etag_matches
+from app.fast_json import FastJSONResponse
+from app.recommender.model_store import model_store
+from app.recommender.cache import recommendation_cache
 from datetime import datetime, timedelta
-import requests
-import urllib.parse
-
-def get_book_cover_from_openlibrary(title, author):
-    """Fetch book cover URL from Open Library API, with Amazon fallback"""
-    try:
-        # Try Open Library first
-        search_url = f"https://openlibrary.org/search.json?title={urllib.parse.quote(title)}&author={urllib.parse.quote(author)}&limit=1"
-        response = requests.get(search_url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if 'docs' in data and len(data['docs']) > 0:
-                book = data['docs'][0]
-                if 'cover_i' in book:
-                    return f"https://covers.openlibrary.org/b/id/{book['cover_i']}-L.jpg"
-                elif 'isbn' in book and len(book['isbn']) > 0:
-                    return f"https://covers.openlibrary.org/b/isbn/{book['isbn'][0]}-L.jpg"
-        
-        # Fallback to Amazon search
-        return get_book_cover_from_amazon(title, author)
-    except:
-        return get_book_cover_from_amazon(title, author)
-
-def get_book_cover_from_amazon(title, author):
-    """Fallback: Try to get book cover from Amazon via Google Books API or generate URL"""
-    try:
-        # Method 1: Try Google Books API for ISBN, then use Amazon
-        query = f"{title} {author}".strip()
-        encoded_query = urllib.parse.quote(query)
-        url = f"https://www.googleapis.com/books/v1/volumes?q={encoded_query}&maxResults=1"
-        
-        response = requests.get(url, timeout=3)
-        if response.status_code == 200:
-            data = response.json()
-            if 'items' in data and len(data['items']) > 0:
-                book = data['items'][0]
-                if 'volumeInfo' in book:
-                    # Try to get ISBN for Amazon lookup
-                    if 'industryIdentifiers' in book['volumeInfo']:
-                        for identifier in book['volumeInfo']['industryIdentifiers']:
-                            if identifier['type'] in ['ISBN_13', 'ISBN_10']:
-                                isbn = identifier['identifier']
-                                return f"https://images-na.ssl-images-amazon.com/images/P/{isbn}.01.L.jpg"
-        
-        # Fallback: Generate a placeholder based on title
-        return f"https://via.placeholder.com/300x450/374151/9CA3AF?text={urllib.parse.quote(title[:20])}"
-    except:
-        return f"https://via.placeholder.com/300x450/374151/9CA3AF?text=Book+Cover"
-
-def clean_brackets(text):
-    """Remove square brackets from text"""
-    if text:
-        return text.replace('[', '').replace(']', '').replace("'", "")
-    return text
+import base64
+import json
+import math
 
 router = APIRouter(prefix="/books", tags=["books"])
 
+BOOK_FIELDS = ["id", "title", "author", "genre", "description", "cover_image", "rating"]
+MAX_PAGE_SIZE = 500
+MAX_SEARCH_RESULTS = 100
+MAX_COVER_BATCH = 500
+
+class CoverBatchRequest(BaseModel):
+    book_ids: list[int]
+    resolve: bool = True
+
+def cover_entry(snapshot, row, resolve=True):
+    """Cover URL and status of one catalog row, queueing a background lookup when it has none"""
+    if snapshot.covers[row]:
+        return {"cover_url": snapshot.covers[row], "status": "ready"}
+    
+    # The cover is saved when the lookup resolves
+    book_id = int(snapshot.ids[row])
+    if resolve:
+        status = cover_resolver.request(book_id, snapshot.titles[row], snapshot.authors[row])
+    else:
+        status = cover_resolver.status(book_id) or "unresolved"
+    return {"cover_url": placeholder_cover(snapshot.titles[row]), "status": status}
+
 @router.get("/cover/{book_id}")
 def get_book_cover(book_id: int, db: Session = Depends(get_db)):
-    """Get book cover for a specific book"""
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
-        return {"cover_url": None}
+    """
+    Cover for a specific book. Never waits on the upstream services: a book without
+    a cover gets a placeholder and a background lookup ("pending", or "not_found"
+    while a recent lookup found nothing).
+    """
+    snapshot = catalog.snapshot(db)
+    rows = catalog_rows(snapshot, [book_id])
+    if not len(rows):
+        return {"cover_url": None, "status": "missing"}
+    return cover_entry(snapshot, rows[0])
+
+@router.get("/cover/{book_id}/image")
+def get_book_cover_image(
+    book_id: int,
+    size: Literal["small", "medium", "large", "original"] = "medium",
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Cover image from the local thumbnail store, with a strong ETag and long Cache-Control.
+    Covers not stored yet redirect to their source while they download in the background;
+    books without a cover get an SVG placeholder.
+    """
+    snapshot = catalog.snapshot(db)
+    rows = catalog_rows(snapshot, [book_id])
+    if not len(rows):
+        raise HTTPException(status_code=404, detail="Book not found")
+    row = rows[0]
     
-    # If book already has a cover, return it
-    if book.cover_image:
-        return {"cover_url": book.cover_image}
+    url = snapshot.covers[row]
+    stored = thumbnail_store.get(url, size)
+    if stored is None:
+        if url:
+            cover_resolver.request_image(url)
+            return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-cache"})
+        cover_resolver.request(book_id, snapshot.titles[row], snapshot.authors[row])
+        return Response(placeholder_svg(snapshot.titles[row]), media_type="image/svg+xml",
+                        headers={"Cache-Control": "no-cache"})
     
-    # Otherwise, fetch and save it
-    cover_url = get_book_cover_from_openlibrary(book.title, book.author)
-    book.cover_image = cover_url
-    db.commit()
+    path, etag, content_type = stored
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={COVER_IMAGE_MAX_AGE}"}
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=content_type, headers=headers)
+
+@router.post("/covers")
+def get_book_covers(request: CoverBatchRequest, db: Session = Depends(get_db)):
+    """
+    Covers for many books in one call, keyed by book id, served from the catalog.
+    Books without a cover get a placeholder and (unless resolve=false) a background lookup.
+    """
+    if len(request.book_ids) > MAX_COVER_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_COVER_BATCH} books per request")
     
-    return {"cover_url": cover_url}
+    snapshot = catalog.snapshot(db)
+    covers = {str(book_id): {"cover_url": None, "status": "missing"} for book_id in request.book_ids}
+    for row in catalog_rows(snapshot, dict.fromkeys(request.book_ids)).tolist():
+        covers[str(int(snapshot.ids[row]))] = cover_entry(snapshot, row, request.resolve)
+    return FastJSONResponse(covers)
 
 @router.post("/add")
 def add_book(book_data: dict, db: Session = Depends(get_db)):
     """Add a new book to the database"""
-    # Get cover image
-    cover_url = get_book_cover_from_openlibrary(book_data['title'], book_data['author'])
-    
     new_book = Book(
         title=book_data['title'],
         author=book_data['author'],
         genre=book_data.get('genre', ''),
         description=book_data.get('description', ''),
-        cover_image=cover_url
+        cover_image=book_data.get('cover_image') or None
     )
+    names = normalize_book(new_book)
     
     db.add(new_book)
+    db.flush()
+    link_books(db, {new_book.id: names})
     db.commit()
     db.refresh(new_book)
     
+    # Fold the new book into the content model so it can be recommended right away
+    model_store.upsert_books([new_book])
+    catalog.upsert_books([catalog_book(new_book, names[1])])
+    search_index.upsert_books(db, [new_book])
+    recommendation_cache.clear()
+    
+    # Cover is resolved in the background instead of blocking the request
+    if not new_book.cover_image:
+        cover_resolver.request(new_book.id, new_book.title, new_book.author)
+    else:
+        cover_resolver.request_image(new_book.cover_image)
+    
     return {"message": "Book added successfully", "book_id": new_book.id}
 
+def encode_cursor(sort, key, book_id):
+    return base64.urlsafe_b64encode(json.dumps([sort, key, book_id]).encode()).decode()
+
+# Sort key types a cursor may carry per sort order (an id cursor's key is the id, or null)
+CURSOR_KEY_TYPES = {"id": (int, type(None)), "title": (str,), "rating": (int, float)}
+
+def decode_cursor(cursor, sort):
+    """(key, book_id) from a cursor returned by a previous page of the same sort"""
+    try:
+        cursor_sort, key, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor belongs to a different sort order")
+    # bool is an int subclass, but never a valid key or id
+    if (isinstance(key, bool) or not isinstance(key, CURSOR_KEY_TYPES[sort])
+            or (isinstance(key, float) and not math.isfinite(key))
+            or isinstance(book_id, bool) or not isinstance(book_id, int)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return (book_id if key is None else key), book_id
+
+def selected_fields(fields):
+    """Response fields from a comma-separated `fields` parameter; id is always included"""
+    if not fields:
+        return BOOK_FIELDS
+    selected = ["id"] + [field.strip() for field in fields.split(",") if field.strip() and field.strip() != "id"]
+    unknown = set(selected) - set(BOOK_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return selected
+
+def book_column(snapshot, rows, field):
+    """One response field for the given catalog rows"""
+    if field == "id":
+        return snapshot.ids[rows].tolist()
+    if field == "rating":
+        return [round(avg_rating, 1) for avg_rating in average_ratings(snapshot, rows).tolist()]
+    if field == "cover_image":
+        return snapshot.covers[rows]
+    return getattr(snapshot, field + "s")[rows]
+
 @router.get("/")
-def get_books(db: Session = Depends(get_db)):
-    """Get all books with their average ratings using a single efficient query"""
-    # Optimized query: Fetch books and their average rating in one go using LEFT JOIN
-    books_query = db.query(
-        Book,
-        func.coalesce(func.avg(UserBook.rating), 0).label('avg_rating')
-    ).outerjoin(
-        UserBook, (Book.id == UserBook.book_id) & (UserBook.rating.isnot(None))
-    ).group_by(Book.id).all()
+def get_books(
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    sort: Literal["id", "title", "rating"] = "id",
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Books with their average ratings, served from the in-memory catalog.
+
+    Without `limit` the whole catalog is returned. With it, results are paged with a
+    keyset cursor: pass the X-Next-Cursor header of one page as `cursor` to get the
+    next (or `after_id` to start after a given book). `fields` is a comma-separated
+    subset of the book fields; `id` is always included. Responses are cached per
+    catalog version and carry an ETag for conditional requests.
+    """
+    selected = selected_fields(fields)
+    snapshot = catalog.snapshot(db)
+    cache_key = f"books?after_id={after_id}&cursor={cursor}&limit={limit}&fields={','.join(selected)}&sort={sort}"
+    cached = response_cache.lookup(cache_key, snapshot.version, if_none_match)
+    if cached is not None:
+        return cached
+    
+    rows, sorted_keys, sorted_ids = catalog.sort_index(snapshot, sort)
+
+    # Keyset pagination: seek to the first entry after the cursor's (sort key, id)
+    start = 0
+    if cursor:
+        key, book_id = decode_cursor(cursor, sort)
+        start = seek(sorted_keys, sorted_ids, key, book_id)
+    elif after_id is not None:
+        if sort == "id":
+            start = seek(sorted_keys, sorted_ids, after_id, after_id)
+        else:
+            position = np.flatnonzero(sorted_ids == after_id)
+            start = int(position[0]) + 1 if len(position) else 0
+
+    end = len(rows) if limit is None else min(start + limit, len(rows))
+    page = rows[start:end]
+    headers = {}
+    if end < len(rows) and len(page):
+        last_key = sorted_keys[end - 1]
+        headers["X-Next-Cursor"] = encode_cursor(
+            sort, last_key.item() if hasattr(last_key, "item") else last_key, int(sorted_ids[end - 1])
+        )
+
+    columns = [book_column(snapshot, page, field) for field in selected]
+    books = [dict(zip(selected, values)) for values in zip(*columns)]
+    return response_cache.store(cache_key, snapshot.version, books, headers)
+
+@router.get("/search")
+def search_books(
+    q: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Full-text search over title, author, genre and description, BM25-ranked; the last word matches as a prefix"""
+    selected = selected_fields(fields)
+    total, hits = search_index.search(db, q, offset, limit)
+
+    snapshot = catalog.snapshot(db)
+    rows = catalog_rows(snapshot, [book_id for book_id, _ in hits])
+    scores = dict(hits)
+    columns = [book_column(snapshot, rows, field) for field in selected]
+    results = [dict(zip(selected, values)) for values in zip(*columns)]
+    for result in results:
+        result["score"] = round(scores[result["id"]], 4)
+
+    return FastJSONResponse({"query": q, "total": total, "offset": offset, "limit": limit, "results": results})
+
+@router.get("/autocomplete")
+def autocomplete_books(q: str, limit: int = Query(8, ge=1, le=20), db: Session = Depends(get_db)):
+    """Title suggestions for a partially typed query"""
+    _, hits = search_index.search(db, q, 0, limit)
+    snapshot = catalog.snapshot(db)
+    rows = catalog_rows(snapshot, [book_id for book_id, _ in hits])
+    return [
+        {"id": book_id, "title": title, "author": author}
+        for book_id, title, author in zip(snapshot.ids[rows].tolist(), snapshot.titles[rows], snapshot.authors[rows])
+    ]
+
+def trending_rows(snapshot, window, limit):
+    """Catalog rows of a window's trending books, topped up with the all-time most read"""
+    rows = catalog_rows(snapshot, [book_id for book_id, _, _ in trending.top(window, limit)])
+    if len(rows) < limit:
+        read_rows = np.flatnonzero(snapshot.read_count > 0)
+        read_rows = read_rows[np.argsort(-snapshot.read_count[read_rows], kind="stable")]
+        rows = np.concatenate([rows, read_rows[~np.isin(read_rows, rows)][:limit - len(rows)]])
+    return rows
+
+@router.get("/trending")
+def get_trending_books(
+    window: Literal["daily", "weekly", "monthly"] = "weekly",
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Most active books over the last day, week or month, recent activity weighted higher"""
+    snapshot = catalog.snapshot(db)
+    stats = {book_id: (score, events) for book_id, score, events in trending.top(window, limit)}
+    rows = catalog_rows(snapshot, stats)
     
     result = []
-    for book, avg_rating in books_query:
+    for book, avg_rating in books_with_ratings(snapshot, rows):
+        score, events = stats[book.id]
         result.append({
             "id": book.id,
             "title": book.title,
-            "author": clean_brackets(book.author),
-            "genre": clean_brackets(book.genre),
-            "description": book.description,
+            "author": book.author,
+            "genre": book.genre,
             "cover_image": book.cover_image,
-            "rating": round(float(avg_rating), 1)
+            "rating": round(avg_rating, 1),
+            "events": events,
+            "score": round(score, 3)
         })
-    
-    return result
+    return FastJSONResponse({"window": window, "results": result})
 
 @router.get("/weekly-top")
-def get_weekly_top_books(db: Session = Depends(get_db)):
-    """Get top 10 books read/rated (using overall top as proxy for weekly due to schema limitation)"""
-    # Note: UserBook doesn't have timestamps, so we return overall top books
+def get_weekly_top_books(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Top 10 books by activity over the last week; the all-time most read fill any remaining places"""
+    snapshot = catalog.snapshot(db)
+    version = (snapshot.version, trending.version)
+    cached = response_cache.lookup("weekly-top", version, if_none_match)
+    if cached is not None:
+        return cached
     
-    # Get books with most reads/ratings
-    top_books = db.query(
-        Book.id,
-        Book.title,
-        Book.author,
-        Book.genre,
-        Book.description,
-        Book.cover_image,
-        func.count(UserBook.id).label('read_count'),
-        func.avg(UserBook.rating).label('avg_rating')
-    ).join(
-        UserBook, Book.id == UserBook.book_id
-    ).group_by(
-        Book.id
-    ).order_by(
-        func.count(UserBook.id).desc()
-    ).limit(10).all()
+    top_rows = trending_rows(snapshot, "weekly", 10)
     
     result = []
-    for book in top_books:
+    for row, avg_rating in zip(top_rows.tolist(), average_ratings(snapshot, top_rows).tolist()):
         result.append({
-            "id": book.id,
-            "title": book.title,
-            "author": clean_brackets(book.author),
-            "genre": clean_brackets(book.genre),
-            "description": book.description,
-            "cover_image": book.cover_image,
-            "rating": round(float(book.avg_rating), 1) if book.avg_rating else 0.0
+            "id": int(snapshot.ids[row]),
+            "title": snapshot.titles[row],
+            "author": snapshot.authors[row],
+            "genre": snapshot.genres[row],
+            "description": snapshot.descriptions[row],
+            "cover_image": snapshot.covers[row],
+            "rating": round(avg_rating, 1)
         })
     
-    return result
+    return response_cache.store("weekly-top", version, result)
 
 @router.delete("/{book_id}")
 def delete_book(book_id: int, db: Session = Depends(get_db)):
@@ -169,7 +334,13 @@ def delete_book(book_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Book not found")
     
     # Delete the book
+    unlink_books(db, [book_id])
     db.delete(book)
     db.commit()
+    model_store.remove_books([book_id])
+    catalog.remove_books([book_id])
+    search_index.remove_books(db, [book_id])
+    trending.remove_books([book_id])
+    recommendation_cache.clear()
     
     return {"message": "Book deleted successfully"}
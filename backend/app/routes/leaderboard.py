@@ -0,0 +1,69 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import LeaderboardEntry, User
+from app.leaderboards import LEADERBOARD_SIZE, month_key
+from app.timeutil import utc_now
+
+router = APIRouter(prefix="/leaderboard", tags=["Leaderboard"])
+
+MAX_LEADERBOARD_PAGE = 100
+
+@router.get("/")
+def list_leaderboards(db: Session = Depends(get_db)):
+    """Available boards and their keys (genres, months), with when they were last refreshed"""
+    boards = {}
+    for board, key, readers, refreshed_at in db.query(
+        LeaderboardEntry.board, LeaderboardEntry.key,
+        func.count(LeaderboardEntry.position), func.max(LeaderboardEntry.refreshed_at)
+    ).group_by(LeaderboardEntry.board, LeaderboardEntry.key).order_by(LeaderboardEntry.board, LeaderboardEntry.key):
+        boards.setdefault(board, []).append({"key": key, "readers": readers, "refreshed_at": refreshed_at})
+    return boards
+
+@router.get("/{board}")
+def get_leaderboard(
+    board: Literal["overall", "genre", "month"],
+    key: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_LEADERBOARD_PAGE),
+    db: Session = Depends(get_db)
+):
+    """One page of a materialized leaderboard. `key` is the genre name or "YYYY-MM" (default: this month)."""
+    if board == "overall":
+        key = ""
+    elif board == "month" and key is None:
+        now = utc_now()
+        key = month_key(now.year, now.month)
+    elif key is None:
+        raise HTTPException(status_code=400, detail="key (genre name) is required for the genre board")
+
+    # Positions are contiguous from 1, so a page is a primary key range
+    entries = db.query(LeaderboardEntry, User.name).outerjoin(
+        User, User.id == LeaderboardEntry.user_id
+    ).filter(
+        LeaderboardEntry.board == board,
+        LeaderboardEntry.key == key,
+        LeaderboardEntry.position > offset,
+        LeaderboardEntry.position <= offset + limit
+    ).order_by(LeaderboardEntry.position).all()
+    total, refreshed_at = db.query(
+        func.count(LeaderboardEntry.position), func.max(LeaderboardEntry.refreshed_at)
+    ).filter(LeaderboardEntry.board == board, LeaderboardEntry.key == key).one()
+
+    return {
+        "board": board,
+        "key": key,
+        "refreshed_at": refreshed_at,
+        "total": total,
+        "max_size": LEADERBOARD_SIZE,
+        "offset": offset,
+        "limit": limit,
+        "entries": [{
+            "rank": entry.rank,
+            "user_id": entry.user_id,
+            "name": name,
+            "books_read": entry.books_read
+        } for entry, name in entries]
+    }
@@ -5,17 +5,6 @@ from app.models import BookIssue, Book, User, Notification, BookRequest
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 
-def clean_brackets(text):
-    """Remove square brackets and quotes from text fields"""
-    if not text:
-        return text
-    # Remove square brackets and quotes
-    cleaned = text.strip("[]'\"")
-    # If it contains comma-separated values, take the first one
-    if ',' in cleaned:
-        cleaned = cleaned.split(',')[0].strip("'\"")
-    return cleaned
-
 class IssueBook(BaseModel):
     user_id: int
     book_id: int
@@ -111,7 +100,7 @@ def get_pending_requests(db: Session = Depends(get_db)):
         result.append({
             "issue_id": issue.id,
             "book_title": book.title,
-            "book_author": clean_brackets(book.author),
+            "book_author": book.author,
             "user_name": user.name or user.email,
             "requested_date": issue.issue_date
         })
@@ -245,7 +234,7 @@ def get_issued_books(user_id: int, db: Session = Depends(get_db)):
         result.append({
             "issue_id": issue.id,
             "book_title": book.title,
-            "book_author": clean_brackets(book.author),
+            "book_author": book.author,
             "issue_date": issue.issue_date,
             "due_date": issue.due_date,
             "is_overdue": is_overdue,
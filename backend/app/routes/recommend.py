@@ -1,107 +1,362 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-import pandas as pd
+import numpy as np
 from ..database import get_db
-from ..models import Book, User, UserBook, UserPreferences
-from ..recommender.engine import hybrid_recommendation
+from ..models import User, UserBook
+from ..catalog import (catalog, average_ratings, books_with_ratings, rows_with_genres, genres_of_rows,
+                       rows_for as catalog_rows)
+from ..recommender.engine import user_profile, score_candidates, batch_content_recommendations
+from ..recommender.neighbors import neighbor_tables
+from ..recommender.mf import mf_models
+from ..recommender.blend import blend, popularity_score
+from ..recommender.cache import recommendation_cache
+from ..response_cache import response_cache
+from ..fast_json import FastJSONResponse
+from ..recommender.model_store import model_store
+from ..recommender.vector_index import top_k
+from ..recommender.timing import StageTimer, LatencyRecorder
 import traceback
+import time
 import json
 
-def clean_brackets(text):
-    """Remove square brackets and quotes from text fields"""
-    if not text:
-        return text
-    # Remove square brackets and quotes
-    cleaned = text.strip("[]'\"")
-    # If it contains comma-separated values, take the first one
-    if ',' in cleaned:
-        cleaned = cleaned.split(',')[0].strip("'\"")
-    return cleaned
+RECOMMENDATION_LIMIT = 10
+
+class BatchRecommendRequest(BaseModel):
+    user_ids: list[int]
+    limit: int = RECOMMENDATION_LIMIT
 
 router = APIRouter(prefix="/recommend", tags=["Recommendations"])
 
+# Candidates each component contributes to the hybrid blend
+BLEND_CANDIDATES = 100
+MAX_BATCH_USERS = 5000
+
+# Rolling per-engine latencies, so engines can be compared under load
+latency = LatencyRecorder()
+
+
+def serialize_book(book, avg_rating):
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "rating": round(float(avg_rating), 1),
+        "genre": book.genre,
+        "description": book.description,
+        "cover_image": book.cover_image
+    }
+
+
+# Unrated books rank as if they averaged 4.0
+UNRATED_SCORE = 4.0
+
+
+def ranked_by_rating(snapshot, rows, exclude_ids=(), limit=RECOMMENDATION_LIMIT):
+    """(book, avg rating) for the best rated of the given catalog rows, skipping exclude_ids"""
+    scores = average_ratings(snapshot, rows, UNRATED_SCORE)
+    if exclude_ids:
+        scores[np.isin(snapshot.ids[rows], list(exclude_ids))] = -np.inf
+    best = rows[top_k(scores, limit, in_place=True)]
+    return books_with_ratings(snapshot, best, UNRATED_SCORE)
+
+
+def popular_books(db, exclude_ids=(), limit=RECOMMENDATION_LIMIT):
+    """Top rated books overall"""
+    snapshot = catalog.snapshot(db)
+    return ranked_by_rating(snapshot, np.arange(len(snapshot.ids)), exclude_ids, limit)
+
+
+def genre_recommendations(db, user_books, timer):
+    """Legacy path: top rated unread books sharing a genre with a book the user liked"""
+    snapshot = catalog.snapshot(db)
+    with timer.stage("profile"):
+        liked_ids = [ub.book_id for ub in user_books if ub.rating and ub.rating >= 4.0]
+        preferred_genres = genres_of_rows(snapshot, catalog_rows(snapshot, liked_ids))
+
+    read_book_ids = {ub.book_id for ub in user_books}
+
+    with timer.stage("score"):
+        books_with_ratings = []
+        if len(preferred_genres):
+            books_with_ratings = ranked_by_rating(snapshot, rows_with_genres(snapshot, preferred_genres), read_book_ids)
+
+        # If no books found with preferred genres, fall back to all books
+        if not books_with_ratings:
+            books_with_ratings = ranked_by_rating(snapshot, np.arange(len(snapshot.ids)), read_book_ids)
+
+    return books_with_ratings
+
+
+def fetch_ranked(db, ranked_ids):
+    """The given books with their average ratings, keeping the ranking order"""
+    snapshot = catalog.snapshot(db)
+    return books_with_ratings(snapshot, catalog_rows(snapshot, ranked_ids), UNRATED_SCORE)
+
+
+def content_candidates(snapshot, profile, read_book_ids, k, timer):
+    """
+    (ids, scores) of the k books closest to the profile. Candidates come from the
+    precomputed neighbour tables when available, otherwise from the vector index.
+    """
+    table = neighbor_tables.get()
+    if table is not None:
+        with timer.stage("candidates"):
+            candidates = table.candidates(read_book_ids).tolist()
+        with timer.stage("score"):
+            ranked_ids, scores = score_candidates(snapshot, profile, candidates, k, read_book_ids)
+        if len(ranked_ids) >= k:
+            return ranked_ids, scores
+
+    with timer.stage("search"):
+        return model_store.index.search(profile, k, exclude_ids=read_book_ids)
+
+
+def content_recommendations(db, user_books, timer):
+    """
+    Find the books closest to the user's TF-IDF profile, then load only those
+    books from the database. Returns None when the model can't score this user.
+    """
+    snapshot = model_store.snapshot()
+    if snapshot is None:
+        return None
+
+    with timer.stage("profile"):
+        profile, _ = user_profile(
+            snapshot,
+            [ub.book_id for ub in user_books],
+            [ub.rating for ub in user_books]
+        )
+    if profile is None:
+        return None
+
+    ranked_ids, _ = content_candidates(
+        snapshot, profile, {ub.book_id for ub in user_books}, RECOMMENDATION_LIMIT, timer
+    )
+
+    with timer.stage("fetch"):
+        return fetch_ranked(db, ranked_ids.tolist())
+
+
+def collaborative_recommendations(db, user_id, user_books, timer):
+    """
+    Top-k from the matrix factorization model: one matrix-vector product over
+    the item factors. Returns None when no model is trained or the user is unknown to it.
+    """
+    model = mf_models.get()
+    if model is None:
+        return None
+
+    with timer.stage("score"):
+        ranked_ids, _ = model.recommend(user_id, RECOMMENDATION_LIMIT, {ub.book_id for ub in user_books})
+    if not len(ranked_ids):
+        return None
+
+    with timer.stage("fetch"):
+        return fetch_ranked(db, ranked_ids.tolist())
+
+
+def hybrid_recommendations(db, user_id, user_books, timer):
+    """
+    Blend content, collaborative and popularity scores over the union of the
+    content and collaborative candidates. Returns None when neither model can score this user.
+    """
+    read_book_ids = {ub.book_id for ub in user_books}
+    components = {}
+
+    snapshot = model_store.snapshot()
+    if snapshot is not None:
+        with timer.stage("profile"):
+            profile, _ = user_profile(
+                snapshot,
+                [ub.book_id for ub in user_books],
+                [ub.rating for ub in user_books]
+            )
+        if profile is not None:
+            components["content"] = content_candidates(snapshot, profile, read_book_ids, BLEND_CANDIDATES, timer)
+
+    model = mf_models.get()
+    if model is not None:
+        with timer.stage("collaborative"):
+            ranked_ids, scores = model.recommend(user_id, BLEND_CANDIDATES, read_book_ids)
+        if len(ranked_ids):
+            components["collaborative"] = (ranked_ids, scores)
+
+    if not components:
+        return None
+
+    with timer.stage("popularity"):
+        candidate_ids = set()
+        for ranked_ids, _ in components.values():
+            candidate_ids.update(ranked_ids.tolist())
+        snapshot = catalog.snapshot(db)
+        rows = catalog_rows(snapshot, candidate_ids)
+        rows = rows[snapshot.rating_count[rows] > 0]
+        if len(rows):
+            components["popularity"] = (
+                snapshot.ids[rows],
+                popularity_score(average_ratings(snapshot, rows), snapshot.rating_count[rows])
+            )
+
+    with timer.stage("blend"):
+        ranked_ids, _ = blend(components, RECOMMENDATION_LIMIT)
+
+    with timer.stage("fetch"):
+        return fetch_ranked(db, ranked_ids.tolist())
+
+
+@router.get("/similar/{book_id}")
+def similar_books(book_id: int, limit: int = 10, db: Session = Depends(get_db)):
+    """More like this: books whose content is closest to the given book"""
+    snapshot = model_store.snapshot()
+    if snapshot is None or book_id not in snapshot.row_of:
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    query = snapshot.matrix[snapshot.row_of[book_id]].toarray().ravel()
+    ranked_ids, _ = model_store.index.search(query, min(limit, 50), exclude_ids=[book_id])
+
+    return FastJSONResponse([serialize_book(book, avg_rating) for book, avg_rating in fetch_ranked(db, ranked_ids.tolist())])
+
+
+@router.post("/batch")
+def recommend_batch(request: BatchRecommendRequest, db: Session = Depends(get_db)):
+    """
+    Content recommendations for many users in one call (email digests, admin dashboard).
+
+    Unlike GET /recommend/{user_id}, which blends content, collaborative and popularity
+    scores, digests are content-only: users are scored together with matrix-matrix
+    products on the TF-IDF profile alone. Users without history, or with fewer content
+    matches than `limit`, are topped up with popular books.
+    """
+    if len(request.user_ids) > MAX_BATCH_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_USERS} users per batch")
+    limit = max(1, min(request.limit, 50))
+    timer = StageTimer()
+
+    with timer.stage("load"):
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.id.in_(set(request.user_ids))).all()]
+        ratings_by_user = {user_id: [] for user_id in user_ids}
+        for user_id, book_id, rating in db.query(UserBook.user_id, UserBook.book_id, UserBook.rating).filter(
+            UserBook.user_id.in_(user_ids)
+        ).all():
+            ratings_by_user[user_id].append((book_id, rating))
+
+    ranked = {}
+    snapshot = model_store.snapshot()
+    if snapshot is not None:
+        with timer.stage("score"):
+            for user_id, book_ids, _ in batch_content_recommendations(snapshot, list(ratings_by_user.items()), limit):
+                ranked[user_id] = book_ids.tolist()
+
+    cold_users = [user_id for user_id in user_ids if len(ranked.get(user_id, ())) < limit]
+    if cold_users:
+        with timer.stage("popular"):
+            max_read = max(len(ratings_by_user[user_id]) for user_id in cold_users)
+            popular_ids = [book.id for book, _ in popular_books(db, limit=limit + max_read)]
+            for user_id in cold_users:
+                seen = {book_id for book_id, _ in ratings_by_user[user_id]} | set(ranked.get(user_id, ()))
+                ranked[user_id] = ranked.get(user_id, []) + [
+                    book_id for book_id in popular_ids if book_id not in seen
+                ][:limit - len(ranked.get(user_id, ()))]
+
+    with timer.stage("fetch"):
+        all_ids = {book_id for book_ids in ranked.values() for book_id in book_ids}
+        serialized = {book.id: serialize_book(book, avg_rating) for book, avg_rating in fetch_ranked(db, all_ids)}
+
+    latency.record("batch", timer.total_ms)
+    return FastJSONResponse({
+        str(user_id): [serialized[book_id] for book_id in ranked.get(user_id, []) if book_id in serialized]
+        for user_id in user_ids
+    }, headers={"Server-Timing": timer.server_timing()})
+
+
+@router.get("/timings")
+def recommendation_timings():
+    """p50/p99 latency per engine over the recent request window, plus cache counters"""
+    return {**latency.summary(), "cache_stats": recommendation_cache.stats(), "response_cache": response_cache.stats()}
+
+
 @router.get("/{user_id}")
-def recommend_books(user_id: int, db: Session = Depends(get_db)):
+def recommend_books(
+    user_id: int,
+    engine: Literal["hybrid", "content", "collaborative", "genre", "popular"] = "hybrid",
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    timer = StageTimer()
+    requested_engine = engine
+    # Pick up newly published MF / neighbour versions before the cache is consulted; loading one clears it
+    mf_models.get()
+    neighbor_tables.get()
+    cache_token = recommendation_cache.token(user_id)
+    # Popularity and other readers' ratings move without bumping the token, so responses
+    # also turn over once per cache TTL, like the recommendation cache's entries
+    response_version = (*cache_token, int(time.time() // recommendation_cache.ttl))
+    response_key = f"recommend/{user_id}?engine={requested_engine}"
+
+    # Repeat loads are served from memory until the user's activity or the catalog changes:
+    # as a 304 when the client still has them, else as the already encoded response
+    with timer.stage("cache"):
+        response = response_cache.lookup(response_key, response_version, if_none_match)
+        cached = None if response is not None else recommendation_cache.get(user_id, requested_engine)
+    if response is not None or cached is not None:
+        latency.record("cache", timer.total_ms)
+        if response is None:
+            result, engine = cached
+            response = response_cache.store(response_key, response_version, result, {"X-Recommendation-Engine": engine})
+            response.headers["X-Cache"] = "hit"
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
     try:
-        # Check if user exists
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Get user's reading history
-        user_books = db.query(UserBook).filter(UserBook.user_id == user_id).all()
-        
-        if not user_books:
-            # Return popular books for new users with optimized rating query
-            books_with_ratings = db.query(
-                Book,
-                func.coalesce(func.avg(UserBook.rating), 4.0).label('avg_rating')
-            ).outerjoin(
-                UserBook, Book.id == UserBook.book_id
-            ).group_by(Book.id).order_by(
-                func.coalesce(func.avg(UserBook.rating), 4.0).desc()
-            ).limit(10).all()
-        else:
-            # Get user's preferred genres from highly rated books
-            preferred_genres = []
-            for ub in user_books:
-                if ub.rating and ub.rating >= 4.0:
-                    book = db.query(Book).filter(Book.id == ub.book_id).first()
-                    if book and book.genre:
-                        preferred_genres.append(clean_brackets(book.genre))
-            
-            # Get books from preferred genres that user hasn't read
-            read_book_ids = {ub.book_id for ub in user_books}
-            
-            # Optimized query with ratings
-            query = db.query(
-                Book,
-                func.coalesce(func.avg(UserBook.rating), 4.0).label('avg_rating')
-            ).outerjoin(
-                UserBook, Book.id == UserBook.book_id
-            ).filter(
-                ~Book.id.in_(read_book_ids)
-            ).group_by(Book.id)
-            
-            # Try with preferred genres first, but don't make it too restrictive
-            if preferred_genres and len(preferred_genres) > 0:
-                # Use LIKE for more flexible genre matching
-                genre_filters = []
-                for genre in set(preferred_genres):  # Use set to avoid duplicates
-                    genre_filters.append(Book.genre.like(f'%{genre}%'))
-                
-                # Try to get books from preferred genres
-                from sqlalchemy import or_
-                genre_query = query.filter(or_(*genre_filters))
-                books_with_ratings = genre_query.order_by(
-                    func.coalesce(func.avg(UserBook.rating), 4.0).desc()
-                ).limit(10).all()
-                
-                # If no books found with preferred genres, fall back to all books
-                if not books_with_ratings:
-                    books_with_ratings = query.order_by(
-                        func.coalesce(func.avg(UserBook.rating), 4.0).desc()
-                    ).limit(10).all()
+        with timer.stage("load"):
+            # Check if user exists
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+
+            # Get user's reading history
+            user_books = db.query(UserBook).filter(UserBook.user_id == user_id).all()
+
+        books_with_ratings = None
+        if user_books and engine == "hybrid":
+            books_with_ratings = hybrid_recommendations(db, user_id, user_books, timer)
+            if books_with_ratings is None:
+                engine = "genre"
+
+        if user_books and engine == "collaborative":
+            books_with_ratings = collaborative_recommendations(db, user_id, user_books, timer)
+            if books_with_ratings is None:
+                # No trained model yet, or the user rated books after the last training run
+                engine = "content"
+
+        if user_books and engine == "content":
+            books_with_ratings = content_recommendations(db, user_books, timer)
+            if books_with_ratings is None:
+                # Model not fitted yet or none of the user's books are in it
+                engine = "genre"
+
+        if books_with_ratings is None:
+            if not user_books or engine == "popular":
+                # Return popular books for new users
+                engine = "popular"
+                with timer.stage("score"):
+                    books_with_ratings = popular_books(db, {ub.book_id for ub in user_books})
             else:
-                # No preferred genres, return top rated books
-                books_with_ratings = query.order_by(
-                    func.coalesce(func.avg(UserBook.rating), 4.0).desc()
-                ).limit(10).all()
-        
-        result = []
-        for book, avg_rating in books_with_ratings:
-            result.append({
-                "id": book.id,
-                "title": book.title,
-                "author": clean_brackets(book.author),
-                "rating": round(float(avg_rating), 1),
-                "genre": clean_brackets(book.genre),
-                "description": book.description,
-                "cover_image": book.cover_image
-            })
-        return result
-        
+                books_with_ratings = genre_recommendations(db, user_books, timer)
+
+        with timer.stage("serialize"):
+            result = [serialize_book(book, avg_rating) for book, avg_rating in books_with_ratings]
+
+        recommendation_cache.put(user_id, requested_engine, (result, engine), cache_token)
+        response = response_cache.store(response_key, response_version, result, {"X-Recommendation-Engine": engine})
+        latency.record(engine, timer.total_ms)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Recommendation error: {str(e)}")
         traceback.print_exc()
@@ -1,22 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from app.database import get_db
-from app.models import UserBook, User, Book, UserPreferences
+from sqlalchemy import func
+from app.database import get_db, SessionLocal
+from app.models import UserBook, User, Book, UserPreferences, BookGenre, Genre
+from app.catalog import catalog, average_ratings, rows_for as catalog_rows
+from app.fast_json import encode_json
+from app.timeutil import utc_now
+from app.user_stats import user_status_counts, read_leaderboard
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 import json
 
-def clean_brackets(text):
-    """Remove square brackets and quotes from text fields"""
-    if not text:
-        return text
-    # Remove square brackets and quotes
-    cleaned = text.strip("[]'\"")
-    # If it contains comma-separated values, take the first one
-    if ',' in cleaned:
-        cleaned = cleaned.split(',')[0].strip("'\"")
-    return cleaned
+# user_books rows read and encoded per chunk of the /ratings stream
+RATINGS_PAGE_SIZE = 1000
 
 class NameUpdate(BaseModel):
     name: str
@@ -26,31 +24,69 @@ class PreferencesUpdate(BaseModel):
 
 router = APIRouter(prefix="/user", tags=["User"])
 
+def rating_chunks(user_id, since, snapshot):
+    """The ratings object as JSON, encoded and sent one keyset page of user_books at a time"""
+    db = SessionLocal()
+    try:
+        yield b"{"
+        separator = b""
+        last_book_id = 0
+        while True:
+            query = db.query(UserBook.book_id, UserBook.rating, UserBook.status).filter(
+                UserBook.user_id == user_id,
+                UserBook.book_id > last_book_id
+            )
+            if since is not None:
+                # updated_at >= since, written so SQLite's text timestamps compare right: func.now()
+                # stores "...:34" without a fraction, which sorts before a bound "...:34.000000"
+                query = query.filter(UserBook.updated_at > since - timedelta(microseconds=1))
+            page = query.order_by(UserBook.book_id).limit(RATINGS_PAGE_SIZE).all()
+            if not page:
+                break
+            last_book_id = page[-1].book_id
+
+            # Titles and average ratings from all users come from the in-memory catalog
+            rows = catalog_rows(snapshot, [user_book.book_id for user_book in page])
+            row_of = dict(zip(snapshot.ids[rows].tolist(), rows.tolist()))
+            avg_ratings = dict(zip(rows.tolist(), average_ratings(snapshot, rows).tolist()))
+
+            entries = {}
+            for user_book in page:
+                row = row_of.get(user_book.book_id)
+                if row is None:
+                    continue
+                entries[user_book.book_id] = {
+                    "rating": user_book.rating,  # User's personal rating
+                    "avg_rating": round(avg_ratings[row], 1),     # Average rating from all users
+                    "status": user_book.status,
+                    "title": snapshot.titles[row]
+                }
+            if entries:
+                yield separator + encode_json(entries)[1:-1]
+                separator = b","
+            if len(page) < RATINGS_PAGE_SIZE:
+                break
+        yield b"}"
+    finally:
+        db.close()
+
 @router.get("/{user_id}/ratings")
-def get_user_ratings(user_id: int, db: Session = Depends(get_db)):
-    """Get all ratings for a specific user with book titles and average ratings"""
-    ratings = db.query(UserBook, Book).join(Book, UserBook.book_id == Book.id).filter(
-        UserBook.user_id == user_id
-    ).all()
-    
-    result = {}
-    for user_book, book in ratings:
-        # Calculate average rating for this book from all users
-        avg_rating_query = db.query(func.avg(UserBook.rating)).filter(
-            UserBook.book_id == book.id,
-            UserBook.rating.isnot(None)
-        ).scalar()
-        
-        avg_rating = round(float(avg_rating_query), 1) if avg_rating_query else 0.0
-        
-        result[user_book.book_id] = {
-            "rating": user_book.rating,  # User's personal rating
-            "avg_rating": avg_rating,     # Average rating from all users
-            "status": user_book.status,
-            "title": book.title
-        }
-    
-    return result
+def get_user_ratings(user_id: int, since: Optional[datetime] = None, db: Session = Depends(get_db)):
+    """Get all ratings for a specific user with book titles and average ratings.
+
+    With `since` (the X-Sync-Time of an earlier response) only ratings changed
+    from then on are returned, to be merged into the client's copy.
+    """
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    # Whole seconds (SQLite's CURRENT_TIMESTAMP resolution), a second early:
+    # rows written while this response streams are sent again next time rather than missed
+    sync_time = utc_now().replace(microsecond=0) - timedelta(seconds=1)
+    return StreamingResponse(
+        rating_chunks(user_id, since, catalog.snapshot(db)),
+        media_type="application/json",
+        headers={"X-Sync-Time": sync_time.isoformat() + "Z"}
+    )
 
 @router.put("/{user_id}/name")
 def update_user_name(user_id: int, name_data: NameUpdate, db: Session = Depends(get_db)):
@@ -67,65 +103,29 @@ def update_user_name(user_id: int, name_data: NameUpdate, db: Session = Depends(
 @router.get("/{user_id}/stats")
 def get_user_stats(user_id: int, db: Session = Depends(get_db)):
     """Get user reading statistics"""
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    
-    # Count books read this month (status = 'read')
-    books_this_month = db.query(UserBook).filter(
-        UserBook.user_id == user_id,
-        UserBook.status == 'read'
-    ).count()
-    
-    # Total books read
-    total_books_read = db.query(UserBook).filter(
-        UserBook.user_id == user_id,
-        UserBook.status == 'read'
-    ).count()
-    
-    # Currently reading
-    currently_reading = db.query(UserBook).filter(
-        UserBook.user_id == user_id,
-        UserBook.status == 'reading'
-    ).count()
-    
-    # Wishlist count
-    wishlist_count = db.query(UserBook).filter(
-        UserBook.user_id == user_id,
-        UserBook.status == 'wishlist'
-    ).count()
+    counts = user_status_counts(db, user_id)
     
     # Get favorite genre
-    favorite_genre_query = db.query(Book.genre, func.count(Book.genre).label('count')).join(
-        UserBook, Book.id == UserBook.book_id
+    favorite_genre_query = db.query(Genre.name, func.count(BookGenre.book_id).label('count')).join(
+        BookGenre, BookGenre.genre_id == Genre.id
+    ).join(
+        UserBook, UserBook.book_id == BookGenre.book_id
     ).filter(
         UserBook.user_id == user_id,
         UserBook.status == 'read'
-    ).group_by(Book.genre).order_by(func.count(Book.genre).desc()).first()
-    
-    favorite_genre = clean_brackets(favorite_genre_query[0]) if favorite_genre_query else "Unknown"
-    
-    # Calculate user rank based on books read
-    user_rank_query = db.query(
-        UserBook.user_id,
-        func.count(UserBook.book_id).label('books_count')
-    ).filter(
-        UserBook.status == 'read'
-    ).group_by(UserBook.user_id).order_by(func.count(UserBook.book_id).desc()).all()
+    ).group_by(Genre.id, Genre.name).order_by(func.count(BookGenre.book_id).desc()).first()
     
-    user_rank = 1
-    for i, (uid, count) in enumerate(user_rank_query, 1):
-        if uid == user_id:
-            user_rank = i
-            break
+    favorite_genre = favorite_genre_query[0] if favorite_genre_query else "Unknown"
     
     return {
-        "books_this_month": books_this_month,
-        "total_books_read": total_books_read,
-        "currently_reading": currently_reading,
-        "wishlist_count": wishlist_count,
+        "books_this_month": counts["read_this_month"],
+        "total_books_read": counts["read"],
+        "currently_reading": counts["reading"],
+        "wishlist_count": counts["wishlist"],
         "favorite_genre": favorite_genre,
-        "user_rank": user_rank,
-        "total_users": len(user_rank_query)
+        # Ranked by books read among users who have read any
+        "user_rank": read_leaderboard.rank(user_id),
+        "total_users": read_leaderboard.total_users()
     }
 
 @router.get("/{user_id}/wishlist")
@@ -139,8 +139,8 @@ def get_user_wishlist(user_id: int, db: Session = Depends(get_db)):
     return [{
         "id": book.id,
         "title": book.title,
-        "author": clean_brackets(book.author),
-        "genre": clean_brackets(book.genre)
+        "author": book.author,
+        "genre": book.genre
     } for _, book in wishlist]
 
 @router.get("/{user_id}/preferences")
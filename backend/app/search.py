@@ -0,0 +1,290 @@
+"""
+Full-text book search over title, author, genre and description.
+
+Two interchangeable backends behind make_search_index():
+
+  * Fts5SearchIndex - an SQLite FTS5 table (books_fts, rowid = book id) ranked
+    with FTS5's built-in bm25(), title and author weighted above the description.
+  * InvertedIndex - in-process posting lists (sparse doc x term segments) with
+    BM25 ranking; used on other databases or when SQLite lacks FTS5.
+
+Queries are tokenised into words that must all match; the last word also matches
+as a prefix, so the same search serves autocomplete. Both indexes are updated
+incrementally through upsert_books()/remove_books() on book add, delete and import,
+and rebuilt from the books table at startup. Ties rank by book id in both.
+"""
+import re
+import math
+import threading
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.database import engine
+from app.catalog import catalog
+
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Relative weight of each field in the ranking
+FIELD_WEIGHTS = {"title": 10.0, "author": 5.0, "genre": 2.0, "description": 1.0}
+
+# A prefix expands to at most this many terms (the most common ones)
+MAX_PREFIX_TERMS = 50
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Merge the small segments written by incremental updates into one past this share of the index
+MERGE_RATIO = 0.1
+
+
+def tokenize(value):
+    return TOKEN.findall((value or "").lower())
+
+
+class Fts5SearchIndex:
+    """Search backed by an SQLite FTS5 virtual table kept next to the books table"""
+
+    kind = "fts5"
+
+    def build(self, db):
+        """
+        Create the FTS table and refill it from books. Always a full refill: scripts
+        and migrations edit books outside the app without touching books_fts, and
+        an edit can leave every cheap aggregate (count, max id) unchanged.
+        """
+        db.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts "
+            "USING fts5(title, author, genre, description, tokenize='unicode61')"
+        ))
+        db.execute(text("DELETE FROM books_fts"))
+        db.execute(text(
+            "INSERT INTO books_fts(rowid, title, author, genre, description) "
+            "SELECT id, title, author, genre, description FROM books"
+        ))
+        db.commit()
+        return db.execute(text("SELECT count(*) FROM books_fts")).scalar()
+
+    def upsert_books(self, db, books):
+        books = list(books)
+        if not books:
+            return
+        self.remove_books(db, [book.id for book in books], commit=False)
+        db.execute(
+            text("INSERT INTO books_fts(rowid, title, author, genre, description) "
+                 "VALUES (:id, :title, :author, :genre, :description)"),
+            [{"id": book.id, "title": book.title, "author": book.author,
+              "genre": book.genre, "description": book.description} for book in books]
+        )
+        db.commit()
+
+    def remove_books(self, db, book_ids, commit=True):
+        db.execute(text("DELETE FROM books_fts WHERE rowid = :id"), [{"id": book_id} for book_id in book_ids])
+        if commit:
+            db.commit()
+
+    def search(self, db, query, offset=0, limit=20):
+        """(total matches, [(book id, score), ...]) for one page, best first"""
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        # Quoting every token keeps FTS5 query syntax out of user input
+        match = " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+        weights = ", ".join(str(weight) for weight in FIELD_WEIGHTS.values())
+
+        total = db.execute(text("SELECT count(*) FROM books_fts WHERE books_fts MATCH :match"),
+                           {"match": match}).scalar()
+        rows = db.execute(text(
+            f"SELECT rowid, bm25(books_fts, {weights}) AS rank FROM books_fts "
+            f"WHERE books_fts MATCH :match ORDER BY rank, rowid LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit, "offset": offset}).all()
+        # bm25() is lower-is-better; flip it so higher scores are better like the other backend
+        return total, [(book_id, -rank) for book_id, rank in rows]
+
+
+class InvertedIndex:
+    """
+    In-process BM25 index. Each segment is a sparse doc x term matrix of
+    field-weighted term frequencies (its columns are the posting lists).
+    Updates append a small segment and tombstone replaced or deleted rows;
+    segments are merged once the small ones grow past MERGE_RATIO of the index.
+    """
+
+    kind = "memory"
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.sorted_terms = np.empty(0, dtype=object)
+        self.segments = []  # [ids, matrix (csc), lengths, alive]
+        self.location = {}  # book id -> (segment, row)
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self):
+        return bool(self.segments)
+
+    def build(self, db):
+        snapshot = catalog.snapshot(db)
+        books = [
+            (int(book_id), title, author, genre, description) for book_id, title, author, genre, description
+            in zip(snapshot.ids, snapshot.titles, snapshot.authors, snapshot.genres, snapshot.descriptions)
+        ]
+        with self._lock:
+            self.vocabulary = {}
+            self.segments = []
+            self.location = {}
+            self.sorted_terms = np.empty(0, dtype=object)
+            self._append(books)
+        return len(books)
+
+    def upsert_books(self, db, books):
+        books = [(book.id, book.title, book.author, book.genre, book.description) for book in books]
+        if not books or not self.is_ready:
+            return
+        with self._lock:
+            self._tombstone([book[0] for book in books])
+            self._append(books)
+            self._maybe_merge()
+
+    def remove_books(self, db, book_ids):
+        if not self.is_ready:
+            return
+        with self._lock:
+            self._tombstone(book_ids)
+
+    def search(self, db, query, offset=0, limit=20):
+        if not self.is_ready:
+            self.build(db)
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+
+        with self._lock:
+            # One slot per query word; the last word expands to every term it prefixes
+            slots = [[self.vocabulary[term]] if term in self.vocabulary else [] for term in terms[:-1]]
+            slots.append(self._prefix_terms(terms[-1]))
+            if not all(slots):
+                return 0, []
+
+            live = sum(int(segment[3].sum()) for segment in self.segments)
+            total_length = sum(float(segment[2][segment[3]].sum()) for segment in self.segments)
+            avg_length = total_length / live if live else 0.0
+
+            # Document frequency of each term over live documents
+            df = {}
+            for term_ids in slots:
+                for term_id in term_ids:
+                    df[term_id] = sum(
+                        int(alive[matrix.indices[matrix.indptr[term_id]:matrix.indptr[term_id + 1]]].sum())
+                        for _, matrix, _, alive in self.segments if term_id < matrix.shape[1]
+                    )
+
+            results = []
+            for ids, matrix, lengths, alive in self.segments:
+                scores = np.zeros(len(ids))
+                matched = np.zeros(len(ids), dtype=np.int32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_length, 1e-9))
+                for term_ids in slots:
+                    hit = np.zeros(len(ids), dtype=bool)
+                    for term_id in term_ids:
+                        if term_id >= matrix.shape[1] or not df[term_id]:
+                            continue
+                        rows = matrix.indices[matrix.indptr[term_id]:matrix.indptr[term_id + 1]]
+                        tf = matrix.data[matrix.indptr[term_id]:matrix.indptr[term_id + 1]]
+                        idf = math.log(1 + (live - df[term_id] + 0.5) / (df[term_id] + 0.5))
+                        scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm[rows])
+                        hit[rows] = True
+                    matched += hit
+                keep = np.flatnonzero(alive & (matched == len(slots)))
+                results.append((ids[keep], scores[keep]))
+
+        ids = np.concatenate([ids for ids, _ in results])
+        scores = np.concatenate([scores for _, scores in results])
+        # Best first, ties by id so pages are stable
+        order = np.lexsort((ids, -scores))[offset:offset + limit]
+        return len(ids), list(zip(ids[order].tolist(), scores[order].tolist()))
+
+    def _prefix_terms(self, prefix):
+        start = np.searchsorted(self.sorted_terms, prefix, "left")
+        end = np.searchsorted(self.sorted_terms, prefix + "\uffff", "left")
+        term_ids = [self.vocabulary[term] for term in self.sorted_terms[start:end]]
+        if len(term_ids) > MAX_PREFIX_TERMS:
+            frequency = {term_id: sum(
+                int(matrix.indptr[term_id + 1] - matrix.indptr[term_id])
+                for _, matrix, _, _ in self.segments if term_id < matrix.shape[1]
+            ) for term_id in term_ids}
+            term_ids = sorted(term_ids, key=frequency.get, reverse=True)[:MAX_PREFIX_TERMS]
+        return term_ids
+
+    def _append(self, books):
+        vocabulary_size = len(self.vocabulary)
+        rows, cols, data, lengths = [], [], [], []
+        for row, (_, *fields) in enumerate(books):
+            counts = {}
+            length = 0
+            for value, weight in zip(fields, FIELD_WEIGHTS.values()):
+                for term in tokenize(value):
+                    term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+                    counts[term_id] = counts.get(term_id, 0.0) + weight
+                    length += 1
+            rows.extend([row] * len(counts))
+            cols.extend(counts)
+            data.extend(counts.values())
+            lengths.append(length)
+
+        ids = np.array([book[0] for book in books], dtype=np.int64)
+        matrix = sp.csc_matrix((data, (rows, cols)), shape=(len(books), len(self.vocabulary)))
+        segment = len(self.segments)
+        self.segments.append([ids, matrix, np.array(lengths, dtype=np.float64), np.ones(len(books), dtype=bool)])
+        for row, book_id in enumerate(ids.tolist()):
+            self.location[book_id] = (segment, row)
+
+        # Keep the sorted term list (for prefix lookups) in step with the vocabulary
+        new_terms = sorted(term for term, term_id in self.vocabulary.items() if term_id >= vocabulary_size)
+        if new_terms:
+            terms = np.empty(len(new_terms), dtype=object)
+            terms[:] = new_terms
+            self.sorted_terms = np.insert(self.sorted_terms, np.searchsorted(self.sorted_terms, terms), terms)
+
+    def _tombstone(self, book_ids):
+        for book_id in book_ids:
+            location = self.location.pop(book_id, None)
+            if location is not None:
+                segment, row = location
+                self.segments[segment][3][row] = False
+
+    def _maybe_merge(self):
+        if len(self.segments) < 2:
+            return
+        small = sum(len(segment[0]) for segment in self.segments[1:])
+        if small <= MERGE_RATIO * len(self.segments[0][0]):
+            return
+
+        width = len(self.vocabulary)
+        parts = []
+        for ids, matrix, lengths, alive in self.segments:
+            matrix = matrix.tocsr()[alive]
+            matrix.resize((matrix.shape[0], width))
+            parts.append((ids[alive], matrix, lengths[alive]))
+        ids = np.concatenate([part[0] for part in parts])
+        self.segments = [[
+            ids, sp.vstack([part[1] for part in parts], format="csc"),
+            np.concatenate([part[2] for part in parts]), np.ones(len(ids), dtype=bool)
+        ]]
+        self.location = {book_id: (0, row) for row, book_id in enumerate(ids.tolist())}
+
+
+def make_search_index(engine):
+    """FTS5 on SQLite builds that support it, otherwise the in-process index"""
+    if engine.dialect.name == "sqlite":
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)"))
+                connection.execute(text("DROP TABLE temp.fts5_probe"))
+            return Fts5SearchIndex()
+        except OperationalError:
+            pass
+    return InvertedIndex()
+
+
+search_index = make_search_index(engine)
@@ -0,0 +1,140 @@
+"""
+Optional local store for cover images, enabled by setting COVER_STORE_DIR.
+
+Each cover URL is downloaded once and kept as a few thumbnail sizes in a
+content-addressed directory:
+
+    objects/<aa>/<sha256>    image bytes, named by the hash of their content
+    sources/<aa>/<sha256>    JSON manifest for a cover URL (named by the URL's hash):
+                             {size: {"object": sha256, "content_type": ...}}
+
+Identical images are stored once, and the object hash doubles as a strong ETag.
+Resizing needs Pillow; without it every size is served as the original image.
+"""
+import os
+import io
+import json
+import hashlib
+import threading
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+COVER_STORE_DIR = os.getenv("COVER_STORE_DIR", "")
+# Browser cache lifetime of served images; a changed cover gets a new ETag
+COVER_IMAGE_MAX_AGE = int(os.getenv("COVER_IMAGE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Longest side in pixels of each thumbnail size ("original" is kept as downloaded)
+THUMBNAIL_SIZES = {"small": 150, "medium": 300, "large": 600}
+THUMBNAIL_QUALITY = 85
+
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def image_content_type(data):
+    """MIME type of an image from its leading bytes, None if it isn't a known image format"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def resize(data, longest_side):
+    """JPEG thumbnail no larger than longest_side, or None if the image is already that small"""
+    image = Image.open(io.BytesIO(data))
+    if max(image.size) <= longest_side:
+        return None
+    image.thumbnail((longest_side, longest_side), Image.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+class ThumbnailStore:
+    """Content-addressed cover image files plus a manifest per source URL"""
+
+    def __init__(self, root=COVER_STORE_DIR, sizes=THUMBNAIL_SIZES):
+        self.root = root
+        self.sizes = sizes
+        self._manifests = {}  # url hash -> manifest
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.root)
+
+    def _path(self, kind, digest):
+        return os.path.join(self.root, kind, digest[:2], digest)
+
+    def _write(self, path, data, replace=False):
+        if not replace and os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def manifest(self, url):
+        """The stored sizes of a cover URL, or None if it hasn't been downloaded"""
+        if not self.enabled or not url:
+            return None
+        key = hashlib.sha256(url.encode()).hexdigest()
+        with self._lock:
+            manifest = self._manifests.get(key)
+        if manifest is None:
+            path = self._path("sources", key)
+            if not os.path.exists(path):
+                return None
+            with open(path) as f:
+                manifest = json.load(f)
+            with self._lock:
+                self._manifests[key] = manifest
+        return manifest
+
+    def get(self, url, size):
+        """(path, etag, content type) of one size of a stored cover, or None"""
+        manifest = self.manifest(url)
+        if manifest is None:
+            return None
+        entry = manifest.get(size) or manifest["original"]
+        return self._path("objects", entry["object"]), f'"{entry["object"]}"', entry["content_type"]
+
+    def put(self, url, data):
+        """Store a downloaded cover and its thumbnails; raises ValueError if data isn't an image"""
+        content_type = image_content_type(data)
+        if content_type is None:
+            raise ValueError(f"{url} did not return an image")
+
+        variants = {"original": (data, content_type)}
+        if Image is not None:
+            for size, longest_side in self.sizes.items():
+                thumbnail = resize(data, longest_side)
+                if thumbnail is not None:
+                    variants[size] = (thumbnail, "image/jpeg")
+
+        manifest = {}
+        for size, (content, content_type) in variants.items():
+            digest = hashlib.sha256(content).hexdigest()
+            self._write(self._path("objects", digest), content)
+            manifest[size] = {"object": digest, "content_type": content_type}
+
+        key = hashlib.sha256(url.encode()).hexdigest()
+        self._write(self._path("sources", key), json.dumps(manifest).encode(), replace=True)
+        with self._lock:
+            self._manifests[key] = manifest
+        return manifest
+
+
+thumbnail_store = ThumbnailStore()
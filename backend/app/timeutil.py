@@ -0,0 +1,20 @@
+"""
+Timestamps as the database stores them: naive datetimes in UTC.
+"""
+import time
+import calendar
+from datetime import datetime, timezone
+
+
+def epoch_seconds(when):
+    """Seconds since the epoch of a naive UTC datetime (as stored in the database)"""
+    return calendar.timegm(when.utctimetuple()) + when.microsecond / 1e6
+
+
+def utc_datetime(seconds):
+    """Naive UTC datetime, the form timestamps are stored in"""
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+def utc_now():
+    return utc_datetime(time.time())
@@ -0,0 +1,168 @@
+"""
+Trending books over rolling daily, weekly and monthly windows.
+
+Every interaction event is counted per book in an hour bucket (kept for
+HOUR_BUCKETS hours) and a day bucket (kept for DAY_BUCKETS days). A window's
+score for a book is the sum of its bucket counts in the window, each weighted
+by exp decay on the bucket's age, so recent activity outranks older activity
+within the same window. The daily window is read from hour buckets, the others
+from day buckets.
+
+Scores and each window's top-N (a heap selection) are recomputed at most every
+TRENDING_REFRESH seconds and served from memory in between. rebuild() reloads
+the buckets from the interaction_events table, e.g. at startup.
+"""
+import os
+import math
+import time
+import heapq
+import threading
+from sqlalchemy import inspect, text
+from app.models import InteractionEvent
+from app.timeutil import epoch_seconds, utc_datetime
+
+TRENDING_REFRESH = float(os.getenv("TRENDING_REFRESH", "5"))
+TRENDING_TOP_N = 100
+
+HOUR = 3600
+DAY = 24 * HOUR
+HOUR_BUCKETS = 48
+DAY_BUCKETS = 31
+
+# window -> (length, bucket size, decay half-life), all in seconds. A half-life of half
+# the window favours recent activity without letting it drown out volume.
+WINDOWS = {
+    "daily": (DAY, HOUR, 12 * HOUR),
+    "weekly": (7 * DAY, DAY, 7 * DAY // 2),
+    "monthly": (30 * DAY, DAY, 15 * DAY),
+}
+
+TIMESTAMP_COLUMNS = {
+    "created_at": "TIMESTAMP",
+    "updated_at": "TIMESTAMP",
+    "changed_at": "TIMESTAMP",
+    "read_at": "TIMESTAMP",
+}
+
+
+
+def add_event(hours, days, book_id, seconds, count=1):
+    for buckets, size in ((hours, HOUR), (days, DAY)):
+        bucket = buckets.setdefault(int(seconds // size), {})
+        bucket[book_id] = bucket.get(book_id, 0) + count
+
+
+class TrendingEngine:
+    """Bucketed per-book event counters with a cached top-N per window"""
+
+    def __init__(self, refresh=TRENDING_REFRESH, top_n=TRENDING_TOP_N, clock=time.time):
+        self.refresh = refresh
+        self.top_n = top_n
+        self.clock = clock
+        self._hours = {}  # epoch hour -> {book id: events}
+        self._days = {}   # epoch day -> {book id: events}
+        self._top = {}    # window -> [(book id, score, events), ...] best first
+        self._computed_at = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def record(self, book_id, when=None, count=1):
+        """Count one event (or `count` events) for a book at `when` (naive UTC datetime, default now)"""
+        seconds = self.clock() if when is None else epoch_seconds(when)
+        # Picked up by the next recompute, at most `refresh` seconds later
+        with self._lock:
+            add_event(self._hours, self._days, book_id, seconds, count)
+
+    def remove_books(self, book_ids):
+        with self._lock:
+            for buckets in (self._hours, self._days):
+                for bucket in buckets.values():
+                    for book_id in book_ids:
+                        bucket.pop(book_id, None)
+            self._computed_at = None
+
+    def rebuild(self, db, batch_size=10000):
+        """Reload the buckets from interaction_events. Returns the number of events counted."""
+        since = utc_datetime(self.clock() - DAY_BUCKETS * DAY)
+        query = db.query(InteractionEvent.book_id, InteractionEvent.created_at).filter(
+            InteractionEvent.created_at >= since
+        ).yield_per(batch_size)
+
+        hours, days = {}, {}
+        events = 0
+        for book_id, created_at in query:
+            add_event(hours, days, book_id, epoch_seconds(created_at))
+            events += 1
+        with self._lock:
+            self._hours, self._days = hours, days
+            self._computed_at = None
+        return events
+
+    def top(self, window, limit=10):
+        """[(book id, score, events in window), ...] best first"""
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown trending window {window!r}")
+        with self._lock:
+            self._refresh()
+            return self._top[window][:limit]
+
+    @property
+    def version(self):
+        """Bumped whenever a recompute changes the order of any window's top books"""
+        with self._lock:
+            self._refresh()
+            return self._version
+
+    def _refresh(self):
+        now = self.clock()
+        if self._computed_at is None or now - self._computed_at >= self.refresh:
+            self._recompute(now)
+
+    def _recompute(self, now):
+        # Buckets that fell out of every window are dropped
+        for buckets, size, keep in ((self._hours, HOUR, HOUR_BUCKETS), (self._days, DAY, DAY_BUCKETS)):
+            oldest = int(now // size) - keep + 1
+            for index in [index for index in buckets if index < oldest]:
+                del buckets[index]
+
+        for window, (length, size, half_life) in WINDOWS.items():
+            buckets = self._hours if size == HOUR else self._days
+            current = int(now // size)
+            first = current - length // size + 1
+            decay = math.log(2) / half_life
+            scores, counts = {}, {}
+            for index, bucket in buckets.items():
+                if not first <= index <= current:
+                    continue
+                # Age measured to the middle of the bucket (or its elapsed part, for the current one)
+                age = max(0.0, now - min(index * size + size / 2, (index * size + now) / 2))
+                weight = math.exp(-decay * age)
+                for book_id, count in bucket.items():
+                    scores[book_id] = scores.get(book_id, 0.0) + count * weight
+                    counts[book_id] = counts.get(book_id, 0) + count
+            best = heapq.nlargest(self.top_n, scores.items(), key=lambda item: (item[1], -item[0]))
+            previous = [book_id for book_id, _, _ in self._top.get(window, ())]
+            self._top[window] = [(book_id, score, counts[book_id]) for book_id, score in best]
+            if [book_id for book_id, _ in best] != previous:
+                self._version += 1
+        self._computed_at = now
+
+
+def add_missing_timestamp_columns(engine):
+    """
+    Add any of the TIMESTAMP_COLUMNS (created_at, updated_at, changed_at, read_at)
+    missing from an existing user_books table. Returns the names of the columns added.
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns("user_books")}
+    added = []
+    with engine.begin() as connection:
+        for name, sql_type in TIMESTAMP_COLUMNS.items():
+            if name not in existing:
+                # Rows from before the migration keep NULL: their time is unknown
+                # (startup backfills read_at from interaction_events, see backfill_read_at)
+                connection.execute(text(f"ALTER TABLE user_books ADD COLUMN {name} {sql_type}"))
+                added.append(name)
+    return added
+
+
+trending = TrendingEngine()
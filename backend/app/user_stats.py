@@ -0,0 +1,117 @@
+"""
+Per-user reading stats.
+
+user_status_counts() gets all of a user's shelf counts in one conditional
+aggregate over user_books; "read this month" goes by read_at, when the book
+went to 'read'. Ranks come from ReadLeaderboard: every reader's
+read count plus the same counts in a sorted array, so a user's rank is a
+bisect instead of a GROUP BY over all of user_books. It is loaded at startup
+and the interaction event consumer (app/event_log.py) sets the counts of the
+users whose shelves changed.
+"""
+import bisect
+import threading
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.orm import aliased
+from app.models import UserBook, InteractionEvent
+from app.timeutil import utc_now
+
+READ = "read"
+
+
+def month_start(now):
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def user_status_counts(db, user_id, now=None):
+    """{read, reading, wishlist, read_this_month} for one user. Months are UTC, like the stored timestamps."""
+    since = month_start(now or utc_now())
+
+    def count(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    row = db.query(
+        count(UserBook.status == READ),
+        count(UserBook.status == "reading"),
+        count(UserBook.status == "wishlist"),
+        # Went to 'read' this month; re-rating an older read doesn't move it
+        count((UserBook.status == READ) & (UserBook.read_at >= since)),
+    ).filter(UserBook.user_id == user_id).one()
+    return dict(zip(("read", "reading", "wishlist", "read_this_month"), (int(value) for value in row)))
+
+
+def backfill_read_at(db):
+    """
+    Set read_at of read rows that have none (from before the column existed):
+    the first 'read' event after the book's last other status in the event log,
+    else the row's own timestamps. Returns the number of rows updated (caller commits).
+    """
+    event, other = aliased(InteractionEvent), aliased(InteractionEvent)
+    last_other = select(func.max(other.created_at)).where(
+        other.user_id == UserBook.user_id, other.book_id == UserBook.book_id, other.status != READ
+    ).scalar_subquery()
+    first_read = select(func.min(event.created_at)).where(
+        event.user_id == UserBook.user_id, event.book_id == UserBook.book_id, event.status == READ,
+        or_(last_other.is_(None), event.created_at > last_other)
+    ).scalar_subquery()
+    result = db.execute(
+        update(UserBook).where(UserBook.status == READ, UserBook.read_at.is_(None)).values(
+            read_at=func.coalesce(first_read, UserBook.updated_at, UserBook.created_at)
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+class ReadLeaderboard:
+    """Books read per user, with O(log n) rank lookups"""
+
+    def __init__(self):
+        self._counts = {}   # user id -> books read, readers only
+        self._sorted = []   # the same counts, ascending
+        self._lock = threading.Lock()
+
+    def rebuild(self, db):
+        """Reload the counts from user_books. Returns the number of readers."""
+        counts = dict(
+            db.query(UserBook.user_id, func.count(UserBook.id)).filter(
+                UserBook.status == READ
+            ).group_by(UserBook.user_id).all()
+        )
+        with self._lock:
+            self._counts = counts
+            self._sorted = sorted(counts.values())
+        return len(counts)
+
+    def set_counts(self, counts):
+        """Set the read counts of {user_id: books read} (0 removes a user)"""
+        with self._lock:
+            for user_id, count in counts.items():
+                self._set(user_id, count)
+
+    def _set(self, user_id, new):
+        old = self._counts.get(user_id, 0)
+        if old == new:
+            return
+        if old:
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        if new:
+            bisect.insort(self._sorted, new)
+            self._counts[user_id] = new
+        else:
+            self._counts.pop(user_id, None)
+
+    def rank(self, user_id):
+        """1 + the number of readers with more books read (ties share a rank); None if the user has read nothing"""
+        with self._lock:
+            count = self._counts.get(user_id)
+            if not count:
+                return None
+            return len(self._sorted) - bisect.bisect_right(self._sorted, count) + 1
+
+    def total_users(self):
+        """Users with at least one book read"""
+        with self._lock:
+            return len(self._sorted)
+
+
+read_leaderboard = ReadLeaderboard()
@@ -0,0 +1,270 @@
+"""
+Speed and quality of the recommenders on a synthetic library.
+
+    python -m benchmarks.bench_recommender --users 500 --books 5000 --interactions 50000
+    python -m benchmarks.bench_recommender --baseline benchmarks/results/recommender.json
+
+Generates N users, M books and ~K interactions, holds out a share of every
+user's interactions and loads the rest into a throwaway SQLite database. Then:
+
+  * times the content engine per stage (vectorize = TF-IDF fit, then profile,
+    score and rank per user),
+  * times hybrid_recommendation() end to end on DataFrames,
+  * calls the recommend_books route for each engine with a cold cache and
+    collects its Server-Timing stages,
+  * scores every ranking with precision@k, recall@k and NDCG@k against the
+    held-out books the user rated 4 or higher.
+
+Results are written as JSON; with --baseline the run is compared to an earlier one.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+# Always run against a scratch database and model directory, never the configured ones
+WORK_DIR = tempfile.mkdtemp(prefix="recommender-bench-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(WORK_DIR, "bench.db")
+os.environ["RECOMMENDER_MODEL_DIR"] = os.path.join(WORK_DIR, "models")
+
+import numpy as np
+import pandas as pd
+from app.database import Base, engine, SessionLocal
+from app.models import Book, User, UserBook
+from app.normalize import migrate_book_names
+from app.recommender.model_store import model_store, book_content
+from app.recommender.engine import hybrid_recommendation, user_profile
+from app.recommender.vector_index import top_k
+from app.recommender.mf import ratings_matrix, train_als, publish_mf_model
+from app.recommender.cache import recommendation_cache
+from app.response_cache import response_cache
+from app.routes.recommend import recommend_books
+from benchmarks.datasets import synthetic_dataset, holdout_split
+from benchmarks.metrics import evaluate
+
+ROUTE_ENGINES = ["hybrid", "content", "collaborative", "genre", "popular"]
+RELEVANT_RATING = 4.0
+
+
+def latency_summary(samples):
+    values = np.array(samples)
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def load_database(dataset, train):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(Book, dataset.books)
+        db.bulk_insert_mappings(User, dataset.users)
+        db.bulk_insert_mappings(UserBook, [
+            {"user_id": user_id, "book_id": book_id, "rating": rating, "status": status}
+            for user_id, book_id, rating, status in train
+        ])
+        db.commit()
+        # Link genres the way ingest does; the genre engine and catalog read them from book_genres
+        migrate_book_names(db)
+    finally:
+        db.close()
+
+
+def train_mf_model(train):
+    ratings, user_ids, item_ids = ratings_matrix([(user_id, book_id, rating) for user_id, book_id, rating, _ in train])
+    start = time.perf_counter()
+    user_factors, item_factors, global_mean = train_als(ratings)
+    elapsed = time.perf_counter() - start
+    publish_mf_model(user_ids, item_ids, user_factors, item_factors, {"global_mean": global_mean})
+    return elapsed
+
+
+def bench_content_stages(history, user_ids, k):
+    """Per-stage timings of the content engine on array inputs"""
+    snapshot = model_store.snapshot()
+    stages = {"profile": [], "score": [], "rank": []}
+    totals, rankings = [], {}
+
+    for user_id in user_ids:
+        rated_ids, ratings = history[user_id]
+        start = time.perf_counter()
+        profile, rated_rows = user_profile(snapshot, rated_ids, ratings)
+        profiled = time.perf_counter()
+        if profile is None:
+            continue
+        scores = snapshot.matrix @ profile
+        scored = time.perf_counter()
+        best = top_k(scores, k, rated_rows, in_place=True)
+        ranked = time.perf_counter()
+
+        stages["profile"].append((profiled - start) * 1000)
+        stages["score"].append((scored - profiled) * 1000)
+        stages["rank"].append((ranked - scored) * 1000)
+        totals.append((ranked - start) * 1000)
+        rankings[user_id] = snapshot.book_ids[best].tolist()
+
+    return {
+        "latency": latency_summary(totals),
+        "stages": {name: latency_summary(samples) for name, samples in stages.items()},
+    }, rankings
+
+
+def bench_hybrid_recommendation(dataset, train, user_ids):
+    """End-to-end hybrid_recommendation() calls over DataFrames"""
+    users_df = pd.DataFrame(dataset.users)
+    books_df = pd.DataFrame(dataset.books)
+    interactions_df = pd.DataFrame(train, columns=["user_id", "book_id", "rating", "status"])
+
+    latencies, rankings = [], {}
+    for user_id in user_ids:
+        start = time.perf_counter()
+        recommendations = hybrid_recommendation(user_id, users_df, books_df, interactions_df)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rankings[user_id] = recommendations["id"].tolist()
+    return {"latency": latency_summary(latencies)}, rankings
+
+
+def parse_server_timing(header):
+    stages = {}
+    for part in header.split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        stages[name] = float(duration)
+    return stages
+
+
+def bench_route(engine_name, user_ids):
+    """recommend_books() for every user with a cold cache; stages come from its Server-Timing header"""
+    db = SessionLocal()
+    stages, served, rankings = {}, {}, {}
+    try:
+        for user_id in user_ids:
+            recommendation_cache.clear()
+            response_cache.clear()
+            response = recommend_books(user_id, engine_name, None, db)
+            result = json.loads(response.body)
+            for name, ms in parse_server_timing(response.headers["Server-Timing"]).items():
+                stages.setdefault(name, []).append(ms)
+            served_by = response.headers["X-Recommendation-Engine"]
+            served[served_by] = served.get(served_by, 0) + 1
+            rankings[user_id] = [book["id"] for book in result]
+    finally:
+        db.close()
+
+    return {
+        "latency": latency_summary(stages.pop("total")),
+        "stages": {name: latency_summary(samples) for name, samples in stages.items()},
+        "served_by": served,
+    }, rankings
+
+
+def run(n_users, n_books, n_interactions, k, eval_users, test_fraction, seed):
+    dataset = synthetic_dataset(n_users, n_books, n_interactions, seed=seed)
+    train, test = holdout_split(dataset.interactions, test_fraction, seed=seed)
+    load_database(dataset, train)
+
+    relevant = {
+        user_id: {book_id for _, book_id, rating, _ in held_out if rating >= RELEVANT_RATING}
+        for user_id, held_out in test.items()
+    }
+    candidates = sorted(user_id for user_id, books in relevant.items() if books)
+    user_ids = random.Random(seed).sample(candidates, min(eval_users, len(candidates)))
+    relevant = {user_id: relevant[user_id] for user_id in user_ids}
+
+    history = {}
+    for user_id, book_id, rating, _ in train:
+        history.setdefault(user_id, ([], []))
+        history[user_id][0].append(book_id)
+        history[user_id][1].append(rating)
+    history = {user_id: (np.array(ids), np.array(ratings)) for user_id, (ids, ratings) in history.items()}
+
+    start = time.perf_counter()
+    model_store.fit(
+        [book["id"] for book in dataset.books],
+        [book_content(book["author"], book["genre"], book["description"]) for book in dataset.books]
+    )
+    vectorize_s = time.perf_counter() - start
+    mf_train_s = train_mf_model(train)
+
+    report = {
+        "dataset": {
+            "users": n_users,
+            "books": n_books,
+            "interactions": len(dataset.interactions),
+            "train_interactions": len(train),
+            "eval_users": len(user_ids),
+            "test_fraction": test_fraction,
+            "k": k,
+            "seed": seed,
+        },
+        "vectorize_s": round(vectorize_s, 3),
+        "mf_train_s": round(mf_train_s, 3),
+        "engines": {},
+    }
+
+    benches = [("content_stages", lambda: bench_content_stages(history, user_ids, k)),
+               ("hybrid_recommendation", lambda: bench_hybrid_recommendation(dataset, train, user_ids))]
+    benches += [(f"recommend_books:{name}", lambda name=name: bench_route(name, user_ids)) for name in ROUTE_ENGINES]
+
+    for name, bench in benches:
+        result, rankings = bench()
+        result["quality"] = evaluate(rankings, relevant, k)
+        report["engines"][name] = result
+        print(f"{name}: p50 {result['latency']['p50_ms']}ms, quality {result['quality']}")
+    return report
+
+
+def compare(baseline, report):
+    """Print p50 latency and NDCG changes against an earlier report"""
+    k = report["dataset"]["k"]
+    if baseline.get("dataset") != report["dataset"]:
+        print("Baseline was run on a different dataset; differences may not be meaningful")
+    for name, current in report["engines"].items():
+        previous = baseline.get("engines", {}).get(name)
+        if previous is None:
+            continue
+        p50_before, p50_now = previous["latency"]["p50_ms"], current["latency"]["p50_ms"]
+        change = (p50_now - p50_before) / p50_before * 100 if p50_before else 0.0
+        ndcg_before = previous["quality"].get(f"ndcg@{k}", 0.0)
+        ndcg_now = current["quality"].get(f"ndcg@{k}", 0.0)
+        print(f"{name}: p50 {p50_before}ms -> {p50_now}ms ({change:+.1f}%), "
+              f"ndcg@{k} {ndcg_before} -> {ndcg_now} ({ndcg_now - ndcg_before:+.4f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--interactions", type=int, default=50000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--eval-users", type=int, default=200)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "recommender.json"))
+    args = parser.parse_args()
+
+    try:
+        report = run(args.users, args.books, args.interactions, args.k,
+                     args.eval_users, args.test_fraction, args.seed)
+    finally:
+        engine.dispose()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Serialization cost of a full /books/ response.
+
+    python -m benchmarks.bench_serialization --books 10000 --repeat 20
+
+Loads N synthetic books into a throwaway SQLite database and the catalog, then
+times producing the response body in several ways:
+
+  * loop + jsonable_encoder: the old path - a dict per row built in a Python
+    loop that strips list syntax from the raw author/genre values, then
+    FastAPI's default jsonable_encoder + JSONResponse,
+  * columnar + json / orjson: the catalog columns /books/ builds its rows from,
+    encoded once by app.fast_json with each available encoder,
+  * route (miss / hit / 304): the get_books route itself with an empty response
+    cache, with the body already cached, and with a matching If-None-Match.
+
+ORM loading is left out of the first case, so it only measures serialization.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# Always run against a scratch database and model directory, never the configured ones
+WORK_DIR = tempfile.mkdtemp(prefix="serialization-bench-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(WORK_DIR, "bench.db")
+os.environ["RECOMMENDER_MODEL_DIR"] = os.path.join(WORK_DIR, "models")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.database import Base, engine, SessionLocal
+from app.models import Book
+from app.catalog import catalog, books_with_ratings
+from app.fast_json import encode_json, orjson
+from app.response_cache import response_cache
+from app.normalize import normalize_book, link_books
+from app.routes.books import get_books, book_column, BOOK_FIELDS
+from benchmarks.datasets import synthetic_books
+
+
+def legacy_clean_brackets(text):
+    """What /books/ applied to every author and genre before they were normalized at ingest"""
+    if text:
+        return text.replace('[', '').replace(']', '').replace("'", "")
+    return text
+
+
+def load_catalog(n_books, seed):
+    """Catalog snapshot plus the raw {id: (author, genre)} values, written as list literals like imported data"""
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    raw = {}
+    db = SessionLocal()
+    try:
+        books = []
+        for book in synthetic_books(n_books, rng):
+            book["author"] = f"['{book['author']}']"
+            book["genre"] = f"['{book['genre']}']"
+            book["rating_sum"] = float(rng.randint(0, 50))
+            book["rating_count"] = rng.randint(0, 10) if book["rating_sum"] else 0
+            raw[book["id"]] = (book["author"], book["genre"])
+            books.append(Book(**book))
+        names = [normalize_book(book) for book in books]
+        db.add_all(books)
+        db.flush()
+        link_books(db, {book.id: book_names for book, book_names in zip(books, names)})
+        db.commit()
+        return catalog.reload(db), raw
+    finally:
+        db.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3), result
+
+
+def run(n_books, repeat, seed):
+    snapshot, raw = load_catalog(n_books, seed)
+    rows = snapshot.ids.argsort()
+
+    def loop_jsonable_encoder():
+        result = []
+        for book, avg_rating in books_with_ratings(snapshot, rows):
+            result.append({
+                "id": book.id,
+                "title": book.title,
+                "author": legacy_clean_brackets(raw[book.id][0]),
+                "genre": legacy_clean_brackets(raw[book.id][1]),
+                "description": book.description,
+                "cover_image": book.cover_image,
+                "rating": round(float(avg_rating), 1)
+            })
+        return JSONResponse(jsonable_encoder(result)).body
+
+    def columnar(encoder):
+        def encode():
+            columns = [book_column(snapshot, rows, field) for field in BOOK_FIELDS]
+            return encode_json([dict(zip(BOOK_FIELDS, values)) for values in zip(*columns)], encoder)
+        return encode
+
+    db = SessionLocal()
+    try:
+        def route_miss():
+            response_cache.clear()
+            return get_books(None, None, None, None, "id", None, db).body
+
+        def route_hit():
+            return get_books(None, None, None, None, "id", None, db).body
+
+        def route_not_modified():
+            return get_books(None, None, None, None, "id", etag, db).status_code
+
+        cases = {"loop + jsonable_encoder": loop_jsonable_encoder, "columnar + json": columnar("json")}
+        if orjson is not None:
+            cases["columnar + orjson"] = columnar("orjson")
+        cases["route miss"] = route_miss
+
+        report = {"books": n_books, "repeat": repeat, "orjson": orjson is not None, "median_ms": {}}
+        bodies = {}
+        for name, fn in cases.items():
+            report["median_ms"][name], bodies[name] = timed(fn, repeat)
+
+        etag = get_books(None, None, None, None, "id", None, db).headers["ETag"]
+        report["median_ms"]["route hit"], _ = timed(route_hit, repeat)
+        report["median_ms"]["route 304"], status = timed(route_not_modified, repeat)
+        assert status == 304
+    finally:
+        db.close()
+
+    # Every path has to produce the same document
+    expected = json.loads(bodies["loop + jsonable_encoder"])
+    for name, body in bodies.items():
+        assert json.loads(body) == expected, f"{name} produced a different response"
+    report["bytes"] = len(bodies["loop + jsonable_encoder"])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "serialization.json"))
+    args = parser.parse_args()
+
+    report = run(args.books, args.repeat, args.seed)
+    baseline = report["median_ms"]["loop + jsonable_encoder"]
+    for name, ms in report["median_ms"].items():
+        print(f"{name}: {ms}ms ({baseline / ms:.1f}x)" if ms else f"{name}: {ms}ms")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
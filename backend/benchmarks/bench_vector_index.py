@@ -0,0 +1,118 @@
+"""
+Exact vs IVF top-k search on synthetic TF-IDF-like book vectors.
+
+    python -m benchmarks.bench_vector_index --sizes 10000 100000 1000000
+
+Reports build time, per-query latency (p50/p99) and recall@k of the IVF index
+against the exact index for several nprobe values.
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+from app.recommender.vector_index import ExactIndex, IVFIndex
+
+
+def synthetic_vectors(n, dim=1000, topics=50, terms_per_doc=30, seed=0):
+    """Sparse unit vectors where each book mostly draws terms from one topic"""
+    rng = np.random.default_rng(seed)
+    topic_terms = np.stack([rng.choice(dim, 60, replace=False) for _ in range(topics)])
+    doc_topic = rng.integers(topics, size=n)
+
+    n_topic_terms = int(terms_per_doc * 0.8)
+    cols = np.hstack([
+        topic_terms[doc_topic[:, None], rng.integers(60, size=(n, n_topic_terms))],
+        rng.integers(dim, size=(n, terms_per_doc - n_topic_terms)),
+    ])
+    rows = np.repeat(np.arange(n), terms_per_doc)
+    data = rng.random(n * terms_per_doc).astype(np.float32)
+
+    matrix = sp.csr_matrix((data, (rows, cols.ravel())), shape=(n, dim))
+    matrix.sum_duplicates()
+    return normalize(matrix)
+
+
+def synthetic_profiles(vectors, n_queries, books_per_user=10, seed=1):
+    """User-like queries: normalised averages of a few random books"""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(vectors.shape[0], size=(n_queries, books_per_user))
+    profiles = np.vstack([np.asarray(vectors[p].mean(axis=0)).ravel() for p in picks])
+    return normalize(profiles), picks
+
+
+def time_queries(index, profiles, picks, k, **search_args):
+    latencies = []
+    results = []
+    for profile, exclude in zip(profiles, picks):
+        start = time.perf_counter()
+        ids, _ = index.search(profile, k, exclude_ids=exclude.tolist(), **search_args)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids)
+    return np.array(latencies), results
+
+
+def run(size, n_queries, k, nprobes):
+    vectors = synthetic_vectors(size)
+    ids = np.arange(size)
+    profiles, picks = synthetic_profiles(vectors, n_queries)
+
+    exact = ExactIndex()
+    start = time.perf_counter()
+    exact.build(ids, vectors)
+    exact_build_s = time.perf_counter() - start
+    exact_ms, truth = time_queries(exact, profiles, picks, k)
+
+    ivf = IVFIndex()
+    start = time.perf_counter()
+    ivf.build(ids, vectors)
+    ivf_build_s = time.perf_counter() - start
+
+    report = {
+        "size": size,
+        "queries": n_queries,
+        "k": k,
+        "exact": {
+            "build_s": round(exact_build_s, 3),
+            "p50_ms": round(float(np.percentile(exact_ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(exact_ms, 99)), 3),
+        },
+        "ivf": {"build_s": round(ivf_build_s, 3), "nlist": int(len(ivf.centroids)), "runs": []},
+    }
+    for nprobe in nprobes:
+        ivf_ms, found = time_queries(ivf, profiles, picks, k, nprobe=nprobe)
+        recall = np.mean([len(set(a.tolist()) & set(b.tolist())) / max(len(b), 1) for a, b in zip(found, truth)])
+        report["ivf"]["runs"].append({
+            "nprobe": nprobe,
+            "p50_ms": round(float(np.percentile(ivf_ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(ivf_ms, 99)), 3),
+            f"recall@{k}": round(float(recall), 4),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "vector_index.json"))
+    args = parser.parse_args()
+
+    reports = []
+    for size in args.sizes:
+        report = run(size, args.queries, args.k, args.nprobe)
+        print(json.dumps(report))
+        reports.append(report)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(reports, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
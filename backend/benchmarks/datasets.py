@@ -0,0 +1,85 @@
+"""
+Synthetic library datasets for the recommender benchmarks.
+
+Interactions come from scripts.generate_comprehensive_data.generate_ratings, the
+same generator that seeds the demo database, scaled to N users, M books and
+about K interactions. Books belong to one genre and their descriptions draw most
+words from that genre's vocabulary; every user likes a couple of genres and rates
+those books higher, so content and collaborative signals are both learnable.
+"""
+import random
+from collections import namedtuple
+from scripts.generate_comprehensive_data import generate_ratings
+
+GENRES = [
+    "Fantasy", "Science Fiction", "Mystery", "Romance", "Horror", "History",
+    "Biography", "Philosophy", "Poetry", "Thriller", "Adventure", "Science",
+]
+WORDS_PER_GENRE = 80
+WORDS_PER_DESCRIPTION = 40
+
+Dataset = namedtuple("Dataset", ["books", "users", "interactions"])
+
+
+def synthetic_books(n_books, rng):
+    """Book dicts with ids 1..n_books; descriptions are ~80% words from the book's genre"""
+    vocab = {genre: [f"{genre.split()[0].lower()}{i}" for i in range(WORDS_PER_GENRE)] for genre in GENRES}
+    shared = [f"common{i}" for i in range(WORDS_PER_GENRE)]
+    n_authors = max(1, n_books // 8)
+
+    books = []
+    for book_id in range(1, n_books + 1):
+        genre = rng.choice(GENRES)
+        n_genre_words = int(WORDS_PER_DESCRIPTION * 0.8)
+        words = rng.choices(vocab[genre], k=n_genre_words) + rng.choices(shared, k=WORDS_PER_DESCRIPTION - n_genre_words)
+        books.append({
+            "id": book_id,
+            "title": f"Book {book_id}",
+            "author": f"Author {rng.randrange(n_authors)}",
+            "genre": genre,
+            "description": " ".join(words),
+            "cover_image": "",
+        })
+    return books
+
+
+def synthetic_dataset(n_users, n_books, n_interactions, seed=0):
+    """Books, users and ~n_interactions (user_id, book_id, rating, status) tuples"""
+    rng = random.Random(seed)
+    books = synthetic_books(n_books, rng)
+    users = [{"id": user_id, "name": f"User {user_id}", "email": f"user{user_id}@example.com"}
+             for user_id in range(1, n_users + 1)]
+
+    liked_genres = {user["id"]: set(rng.sample(GENRES, 2)) for user in users}
+    genre_of = {book["id"]: book["genre"] for book in books}
+
+    def rate(user_id, book_id, rng):
+        base = 4.0 if genre_of[book_id] in liked_genres[user_id] else 2.0
+        return round(min(5.0, max(1.0, rng.gauss(base, 0.8))), 1)
+
+    per_user = max(1, n_interactions // max(n_users, 1))
+    interactions = list(generate_ratings(
+        [user["id"] for user in users], [book["id"] for book in books],
+        min_ratings=max(1, per_user // 2), max_ratings=per_user * 3 // 2 or 1,
+        rate=rate, rng=rng
+    ))
+    return Dataset(books, users, interactions)
+
+
+def holdout_split(interactions, test_fraction=0.2, seed=0):
+    """Per-user random split: (train interactions, {user_id: held-out interactions})"""
+    rng = random.Random(seed)
+    by_user = {}
+    for interaction in interactions:
+        by_user.setdefault(interaction[0], []).append(interaction)
+
+    train, test = [], {}
+    for user_id, items in by_user.items():
+        rng.shuffle(items)
+        n_test = int(len(items) * test_fraction)
+        if n_test == 0 or n_test == len(items):
+            train.extend(items)
+            continue
+        test[user_id] = items[:n_test]
+        train.extend(items[n_test:])
+    return train, test
@@ -0,0 +1,41 @@
+"""Ranking metrics for offline evaluation against held-out interactions."""
+import math
+
+
+def precision_at_k(recommended, relevant, k):
+    if k <= 0:
+        return 0.0
+    return len(set(recommended[:k]) & relevant) / k
+
+
+def recall_at_k(recommended, relevant, k):
+    if not relevant:
+        return 0.0
+    return len(set(recommended[:k]) & relevant) / len(relevant)
+
+
+def ndcg_at_k(recommended, relevant, k):
+    """Binary-relevance NDCG: hits discounted by log2 of their rank"""
+    dcg = sum(1.0 / math.log2(rank + 2) for rank, book_id in enumerate(recommended[:k]) if book_id in relevant)
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def evaluate(recommendations, relevant_by_user, k):
+    """Mean precision/recall/NDCG@k over the users that have relevant held-out books"""
+    users = [user_id for user_id, relevant in relevant_by_user.items() if relevant]
+    if not users:
+        return {"users": 0}
+
+    totals = {"precision": 0.0, "recall": 0.0, "ndcg": 0.0}
+    for user_id in users:
+        recommended = list(recommendations.get(user_id, []))
+        relevant = relevant_by_user[user_id]
+        totals["precision"] += precision_at_k(recommended, relevant, k)
+        totals["recall"] += recall_at_k(recommended, relevant, k)
+        totals["ndcg"] += ndcg_at_k(recommended, relevant, k)
+
+    report = {"users": len(users)}
+    for name, total in totals.items():
+        report[f"{name}@{k}"] = round(total / len(users), 4)
+    return report
@@ -2,6 +2,7 @@ import pandas as pd
 from sqlalchemy.orm import sessionmaker
 from app.database import engine
 from app.models import Book
+from app.normalize import parse_names, display_names, normalize_book, link_books
 
 def import_books_from_csv(csv_file_path):
     """Import books from CSV dataset"""
@@ -27,11 +28,12 @@ def import_books_from_csv(csv_file_path):
         df = df.fillna('')  # Fill NaN values
         
         books_added = 0
+        names = {}
         for _, row in df.iterrows():
             # Check if book already exists
             existing = db.query(Book).filter(
                 Book.title == row['title'],
-                Book.author == row['author']
+                Book.author == display_names(parse_names(row['author']))
             ).first()
             
             if not existing:
@@ -41,9 +43,13 @@ def import_books_from_csv(csv_file_path):
                     genre=row.get('genre', ''),
                     description=row.get('description', '')
                 )
+                names[book] = normalize_book(book)
                 db.add(book)
                 books_added += 1
         
+        # Flush first so ids are assigned, then link authors and genres
+        db.flush()
+        link_books(db, {book.id: book_names for book, book_names in names.items()})
         db.commit()
         print(f"Successfully imported {books_added} books!")
         
@@ -63,10 +69,11 @@ def import_books_from_json(json_file_path):
         df = pd.read_json(json_file_path)
         
         books_added = 0
+        names = {}
         for _, row in df.iterrows():
             existing = db.query(Book).filter(
                 Book.title == row['title'],
-                Book.author == row['author']
+                Book.author == display_names(parse_names(row['author']))
             ).first()
             
             if not existing:
@@ -76,9 +83,13 @@ def import_books_from_json(json_file_path):
                     genre=row.get('genre', ''),
                     description=row.get('description', '')
                 )
+                names[book] = normalize_book(book)
                 db.add(book)
                 books_added += 1
         
+        # Flush first so ids are assigned, then link authors and genres
+        db.flush()
+        link_books(db, {book.id: book_names for book, book_names in names.items()})
         db.commit()
         print(f"Successfully imported {books_added} books!")
         
@@ -1,6 +1,7 @@
 from app.database import Base, engine, SessionLocal
 from app.models import User, Book, UserBook
 from app.utils.security import hash_password
+from app.normalize import migrate_book_names
 from import_books import import_books_from_csv
 import random
 
@@ -19,6 +20,9 @@ def restore_complete_database():
     print("Creating sample users...")
     db = SessionLocal()
     
+    # Books already in the database from before get their authors and genres linked too
+    migrate_book_names(db)
+    
     # Create your main user
     main_user = User(
         name="Shlok",
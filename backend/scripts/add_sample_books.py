@@ -1,5 +1,6 @@
 from app.database import SessionLocal
 from app.models import Book
+from app.normalize import normalize_book, link_books
 
 def add_sample_books():
     db = SessionLocal()
@@ -69,6 +70,7 @@ def add_sample_books():
     
     try:
         books_added = 0
+        names = {}
         for book_data in sample_books:
             # Check if book already exists
             existing = db.query(Book).filter(
@@ -78,9 +80,12 @@ def add_sample_books():
             
             if not existing:
                 book = Book(**book_data)
+                names[book] = normalize_book(book)
                 db.add(book)
                 books_added += 1
         
+        db.flush()
+        link_books(db, {book.id: book_names for book, book_names in names.items()})
         db.commit()
         print(f"Successfully added {books_added} sample books!")
         
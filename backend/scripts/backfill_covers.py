@@ -0,0 +1,145 @@
+"""
+Resolve cover images for every book that has none (cover_image NULL or empty).
+
+Books are taken in id order, one batch at a time. A batch is looked up in
+parallel (--concurrency), lookups are started at most --rate times per second,
+and the covers found are written with one bulk UPDATE per batch. The last
+finished id is checkpointed, so an interrupted run continues with --resume.
+Books nothing was found for are left empty and retried by the next full run.
+With --images (and COVER_STORE_DIR set), every cover image not yet in the local
+thumbnail store is then downloaded into it, so covers are served without network.
+
+    python -m scripts.backfill_covers --batch-size 200 --concurrency 8 --rate 5 [--resume] [--images]
+
+Set OPENLIBRARY_URL / OPENLIBRARY_COVERS_URL / GOOGLE_BOOKS_URL to the address of
+tests/fake_openlibrary.py to run it against a local fake.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import httpx
+from sqlalchemy import or_
+from app.database import SessionLocal
+from app.models import Book
+from app.covers import lookup_cover, store_covers, COVER_TIMEOUT
+from app.thumbnails import thumbnail_store
+from app.recommender.model_store import MODEL_DIR
+
+CHECKPOINT_PATH = os.path.join(MODEL_DIR, "cover_backfill_checkpoint.json")
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+def load_checkpoint(resume):
+    if resume and os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f)
+    return {"last_id": 0, "resolved": 0, "missed": 0}
+
+def save_checkpoint(checkpoint):
+    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+    with open(CHECKPOINT_PATH + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(CHECKPOINT_PATH + ".tmp", CHECKPOINT_PATH)
+
+def next_batch(after_id, batch_size):
+    db = SessionLocal()
+    try:
+        return db.query(Book.id, Book.title, Book.author).filter(
+            or_(Book.cover_image.is_(None), Book.cover_image == ""),
+            Book.id > after_id
+        ).order_by(Book.id).limit(batch_size).all()
+    finally:
+        db.close()
+
+def cover_urls():
+    db = SessionLocal()
+    try:
+        return [url for url, in db.query(Book.cover_image).filter(Book.cover_image.isnot(None), Book.cover_image != "")]
+    finally:
+        db.close()
+
+async def fetch_images(client, semaphore, limiter):
+    """Download every cover image the thumbnail store doesn't have yet"""
+    urls = [url for url in dict.fromkeys(cover_urls()) if thumbnail_store.manifest(url) is None]
+    print(f"Downloading {len(urls)} cover images into {thumbnail_store.root}")
+
+    async def fetch(url):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+                await asyncio.get_running_loop().run_in_executor(None, thumbnail_store.put, url, response.content)
+                return True
+            except Exception as e:
+                print(f"Download of {url} failed:", e)
+                return False
+
+    stored = sum(await asyncio.gather(*(fetch(url) for url in urls)))
+    print(f"Stored {stored} cover images, {len(urls) - stored} failed")
+
+async def backfill(batch_size, concurrency, rate, resume, images=False):
+    checkpoint = load_checkpoint(resume)
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    start = time.perf_counter()
+
+    async def resolve(client, book):
+        async with semaphore:
+            await limiter.wait()
+            try:
+                return book.id, await lookup_cover(client, book.title, book.author)
+            except Exception as e:
+                print(f"Lookup for book {book.id} failed:", e)
+                return book.id, None
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=COVER_TIMEOUT, limits=limits, follow_redirects=True) as client:
+        while True:
+            batch = next_batch(checkpoint["last_id"], batch_size)
+            if not batch:
+                break
+            results = await asyncio.gather(*(resolve(client, book) for book in batch))
+            covers = {book_id: url for book_id, url in results if url}
+            store_covers(covers)
+
+            checkpoint["last_id"] = batch[-1].id
+            checkpoint["resolved"] += len(covers)
+            checkpoint["missed"] += len(batch) - len(covers)
+            save_checkpoint(checkpoint)
+            print(f"Up to book {checkpoint['last_id']}: {checkpoint['resolved']} covers found, "
+                  f"{checkpoint['missed']} without ({time.perf_counter() - start:.1f}s)")
+
+        if images:
+            await fetch_images(client, semaphore, limiter)
+
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    print(f"Cover backfill finished: {checkpoint['resolved']} covers found, {checkpoint['missed']} without")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve covers for all books that have none")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=5.0, help="max lookups started per second (0 = unlimited)")
+    parser.add_argument("--resume", action="store_true", help="continue after the last id an interrupted run finished")
+    parser.add_argument("--images", action="store_true", help="also download cover images into COVER_STORE_DIR")
+    args = parser.parse_args()
+    if args.images and not thumbnail_store.enabled:
+        parser.error("--images needs COVER_STORE_DIR to be set")
+    asyncio.run(backfill(args.batch_size, args.concurrency, args.rate, args.resume, args.images))
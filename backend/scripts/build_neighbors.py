@@ -0,0 +1,52 @@
+"""
+Nightly batch job: precompute each book's top-N neighbours.
+
+Content neighbours come from the TF-IDF matrix, collaborative neighbours from
+co-ratings in user_books. Results are published as memory-mapped .npy files
+under models/neighbors/ and picked up by the running API without a restart.
+
+    python -m scripts.build_neighbors --top-n 50 --processes 8
+
+Schedule with cron, e.g. `0 3 * * * cd /app && python -m scripts.build_neighbors`.
+"""
+import argparse
+import time
+from app.database import SessionLocal
+from app.models import UserBook
+from app.recommender.model_store import model_store
+from app.recommender.neighbors import compute_neighbors, rating_matrix, publish_neighbor_tables
+
+def build_neighbors(top_n, chunk_size, processes):
+    db = SessionLocal()
+    try:
+        model_store.load_or_fit(db)
+        snapshot = model_store.snapshot()
+        if snapshot is None:
+            print("No books to build neighbours for")
+            return
+
+        interactions = db.query(UserBook.user_id, UserBook.book_id, UserBook.rating).filter(
+            UserBook.rating.isnot(None)
+        ).all()
+    finally:
+        db.close()
+
+    tables = {}
+    for kind, matrix in (
+        ("content", snapshot.matrix),
+        ("collaborative", rating_matrix(snapshot.book_ids, interactions)),
+    ):
+        start = time.perf_counter()
+        tables[kind] = compute_neighbors(matrix, top_n=top_n, chunk_size=chunk_size, processes=processes)
+        print(f"{kind}: {matrix.shape[0]} books in {time.perf_counter() - start:.1f}s")
+
+    version = publish_neighbor_tables(snapshot.book_ids, tables)
+    print(f"Published neighbour tables version {version}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute item-item neighbour tables")
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=128)
+    parser.add_argument("--processes", type=int, default=None, help="defaults to the CPU count")
+    args = parser.parse_args()
+    build_neighbors(args.top_n, args.chunk_size, args.processes)
@@ -0,0 +1,11 @@
+from app.database import engine
+from app.models import UserBook
+
+def create_indexes():
+    """Add indexes declared on the models to an existing database (create_all skips existing tables)"""
+    for index in UserBook.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+        print(f"Index ready: {index.name}")
+
+if __name__ == "__main__":
+    create_indexes()
@@ -1,14 +1,35 @@
 import random
+from datetime import timedelta
 from app.database import SessionLocal
-from app.models import User, Book, UserBook
+from app.models import User, Book, UserBook, InteractionEvent
+from app.timeutil import utc_now
+from app.event_log import set_offset
+
+STATUSES = ["read", "reading", "wishlist"]
+
+# Interactions are spread over this many days back from now
+HISTORY_DAYS = 60
+
+def uniform_rating(user_id, book_id, rng):
+    return round(rng.uniform(1.0, 5.0), 1)
+
+def generate_ratings(user_ids, book_ids, min_ratings=50, max_ratings=150, rate=uniform_rating, rng=random):
+    """Yield (user_id, book_id, rating, status): each user rates min..max random books"""
+    for user_id in user_ids:
+        num_ratings = rng.randint(min_ratings, max_ratings)
+        for book_id in rng.sample(book_ids, min(num_ratings, len(book_ids))):
+            yield user_id, book_id, rate(user_id, book_id, rng), rng.choice(STATUSES)
 
 def generate_users_and_ratings():
     db = SessionLocal()
     
     # Clear existing data
     print("Clearing existing data...")
+    db.query(InteractionEvent).delete()
     db.query(UserBook).delete()
     db.query(User).delete()
+    # Event ids start over, and the API's log consumer works through the new history
+    set_offset(db, 0)
     db.commit()
     
     # Create 200 fake users
@@ -34,19 +55,21 @@ def generate_users_and_ratings():
     
     # Each user rates 50-150 random books
     print("Generating ratings...")
-    for user in users:
-        num_ratings = random.randint(50, 150)
-        user_books = random.sample(books, min(num_ratings, len(books)))
-        
-        for book in user_books:
-            rating = round(random.uniform(1.0, 5.0), 1)
-            interaction = UserBook(
-                user_id=user.id,
-                book_id=book.id,
-                rating=rating,
-                status=random.choice(["read", "reading", "wishlist"])
-            )
-            db.add(interaction)
+    now = utc_now()
+    for user_id, book_id, rating, status in generate_ratings(
+        [user.id for user in users], [book.id for book in books]
+    ):
+        created_at = now - timedelta(days=random.uniform(0, HISTORY_DAYS))
+        interaction = UserBook(
+            user_id=user_id,
+            book_id=book_id,
+            rating=rating,
+            status=status,
+            created_at=created_at,
+            updated_at=created_at
+        )
+        db.add(interaction)
+        db.add(InteractionEvent(user_id=user_id, book_id=book_id, rating=rating, status=status, created_at=created_at))
     
     db.commit()
     
@@ -0,0 +1,114 @@
+"""
+Precompute every user's top-k content recommendations into recommendation_results.
+
+Users are taken in id order, split into chunks and scored across a process
+pool. Chunks are written in order (replacing those users' old rows) and the
+last user id written is recorded in a checkpoint file, so an interrupted run
+picks up after it with --resume, even if users were added or removed since.
+
+    python -m scripts.precompute_recommendations --top-k 20 --chunk-size 500 --processes 4 [--resume]
+"""
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+from app.database import SessionLocal
+from app.models import User, UserBook, RecommendationResult
+from app.recommender.model_store import model_store, MODEL_DIR
+from app.recommender.engine import batch_content_recommendations
+
+CHECKPOINT_PATH = os.path.join(MODEL_DIR, "precompute_checkpoint.json")
+
+_worker_snapshot = None
+
+def _init_worker(snapshot):
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+def _score_chunk(args):
+    user_ratings, top_k = args
+    results = [
+        (user_id, book_ids.tolist(), scores.tolist())
+        for user_id, book_ids, scores in batch_content_recommendations(_worker_snapshot, user_ratings, top_k)
+    ]
+    return [user_id for user_id, _ in user_ratings], results
+
+def load_checkpoint(resume):
+    if resume and os.path.exists(CHECKPOINT_PATH):
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f)
+    return None
+
+def save_checkpoint(checkpoint):
+    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+    with open(CHECKPOINT_PATH + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(CHECKPOINT_PATH + ".tmp", CHECKPOINT_PATH)
+
+def write_chunk(user_ids, results):
+    db = SessionLocal()
+    try:
+        db.query(RecommendationResult).filter(
+            RecommendationResult.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+        db.bulk_insert_mappings(RecommendationResult, [
+            {"user_id": user_id, "rank": rank, "book_id": book_id, "score": score}
+            for user_id, book_ids, scores in results
+            for rank, (book_id, score) in enumerate(zip(book_ids, scores), 1)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+def precompute(top_k, chunk_size, processes, resume):
+    db = SessionLocal()
+    try:
+        model_store.load_or_fit(db)
+        user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id).all()]
+        ratings_by_user = {user_id: [] for user_id in user_ids}
+        for user_id, book_id, rating in db.query(UserBook.user_id, UserBook.book_id, UserBook.rating).all():
+            if user_id in ratings_by_user:
+                ratings_by_user[user_id].append((book_id, rating))
+    finally:
+        db.close()
+
+    snapshot = model_store.snapshot()
+    if snapshot is None:
+        print("No recommender model; nothing to precompute")
+        return
+
+    checkpoint = load_checkpoint(resume)
+    if checkpoint is None or checkpoint.get("top_k") != top_k or "last_user_id" not in checkpoint:
+        checkpoint = {"top_k": top_k, "last_user_id": None}
+    if checkpoint["last_user_id"] is not None:
+        user_ids = [user_id for user_id in user_ids if user_id > checkpoint["last_user_id"]]
+
+    pending = [
+        ([(user_id, ratings_by_user[user_id]) for user_id in user_ids[start:start + chunk_size]], top_k)
+        for start in range(0, len(user_ids), chunk_size)
+    ]
+    print(f"{len(user_ids)} users to do in {len(pending)} chunks")
+
+    start = time.perf_counter()
+    with Pool(processes, initializer=_init_worker, initargs=(snapshot,)) as pool:
+        # imap yields in submission order, so every user up to the checkpoint is written
+        for done, (chunk_user_ids, results) in enumerate(pool.imap(_score_chunk, pending), 1):
+            write_chunk(chunk_user_ids, results)
+            checkpoint["last_user_id"] = chunk_user_ids[-1]
+            save_checkpoint(checkpoint)
+            print(f"Chunk {done}/{len(pending)} done, through user {chunk_user_ids[-1]} ({len(results)} users with results)")
+
+    # Nothing was checkpointed when there were no users to do
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    print(f"Precomputed recommendations in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute top-k recommendations for every user")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=None, help="defaults to the CPU count")
+    parser.add_argument("--resume", action="store_true", help="skip users finished by an interrupted run")
+    args = parser.parse_args()
+    precompute(args.top_k, args.chunk_size, args.processes, args.resume)
@@ -0,0 +1,27 @@
+"""
+Backfill / repair the books rating aggregates (rating_sum, rating_count, read_count).
+
+Adds the columns to an existing database if they are missing, then recomputes
+every book's aggregates from user_books in id-range batches.
+
+    python -m scripts.rebuild_rating_aggregates --batch-size 10000
+"""
+import argparse
+from app.database import engine, SessionLocal
+from app.aggregates import add_missing_aggregate_columns, rebuild_rating_aggregates
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-book rating aggregates from user_books")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    added = add_missing_aggregate_columns(engine)
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+
+    db = SessionLocal()
+    try:
+        rebuild_rating_aggregates(db, args.batch_size)
+    finally:
+        db.close()
+    print("Rating aggregates rebuilt")
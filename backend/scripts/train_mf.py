@@ -0,0 +1,51 @@
+"""
+Train the collaborative-filtering matrix factorization model (ALS over user_books ratings).
+
+Runs as its own process; the API keeps serving the previous model until the new
+factors are published under models/mf/.
+
+    python -m scripts.train_mf --factors 32 --iterations 10 --reg 0.1
+"""
+import argparse
+import time
+from app.database import SessionLocal
+from app.models import UserBook
+from app.recommender.mf import ratings_matrix, train_als, rmse, publish_mf_model
+
+def train_mf(factors, iterations, reg):
+    db = SessionLocal()
+    try:
+        interactions = db.query(UserBook.user_id, UserBook.book_id, UserBook.rating).filter(
+            UserBook.rating.isnot(None)
+        ).all()
+    finally:
+        db.close()
+
+    ratings, user_ids, item_ids = ratings_matrix(interactions)
+    if ratings.nnz == 0:
+        print("No ratings to train on")
+        return
+
+    start = time.perf_counter()
+    user_factors, item_factors, global_mean = train_als(ratings, factors=factors, iterations=iterations, reg=reg)
+    elapsed = time.perf_counter() - start
+    train_rmse = rmse(ratings, user_factors, item_factors, global_mean)
+    print(f"Trained on {ratings.nnz} ratings ({len(user_ids)} users, {len(item_ids)} books) "
+          f"in {elapsed:.1f}s, train RMSE {train_rmse:.3f}")
+
+    version = publish_mf_model(user_ids, item_ids, user_factors, item_factors, {
+        "factors": factors,
+        "iterations": iterations,
+        "reg": reg,
+        "global_mean": global_mean,
+        "train_rmse": train_rmse,
+    })
+    print(f"Published MF model version {version}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the ALS collaborative filtering model")
+    parser.add_argument("--factors", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--reg", type=float, default=0.1)
+    args = parser.parse_args()
+    train_mf(args.factors, args.iterations, args.reg)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Open Library, Open Library Covers and Google Books APIs.
+
+    python tests/fake_openlibrary.py --port 8089 --delay 0.05
+    OPENLIBRARY_URL=http://127.0.0.1:8089 OPENLIBRARY_COVERS_URL=http://127.0.0.1:8089 \\
+        GOOGLE_BOOKS_URL=http://127.0.0.1:8089 uvicorn app.main:app
+
+Every title has a cover except titles containing "nocover"; titles containing
+"isbnonly" are only known to Google Books. Cover images are small generated PNGs.
+"""
+import argparse
+import json
+import struct
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+def png_bytes(width=60, height=90, color=(55, 65, 81)):
+    """A solid-colour PNG"""
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(color) * width
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height))
+            + chunk(b"IEND", b""))
+
+
+class FakeOpenLibrary:
+    """Threaded stub server; counts requests per path and tracks peak concurrency"""
+
+    def __init__(self, port=0, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    fake.requests.append(self.path)
+                try:
+                    time.sleep(fake.delay)
+                    fake.respond(self)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+        return Handler
+
+    def respond(self, handler):
+        url = urlparse(handler.path)
+        params = parse_qs(url.query)
+        title = params.get("title", params.get("q", [""]))[0].lower()
+
+        if url.path == "/search.json":
+            docs = [] if "nocover" in title or "isbnonly" in title else [{"cover_i": abs(hash(title)) % 10 ** 6}]
+            return self._send(handler, 200, "application/json", json.dumps({"docs": docs}).encode())
+        if url.path == "/books/v1/volumes":
+            items = [{"volumeInfo": {"industryIdentifiers": [{"type": "ISBN_13", "identifier": "9780000000001"}]}}] \
+                if "isbnonly" in title else []
+            return self._send(handler, 200, "application/json", json.dumps({"items": items}).encode())
+        if url.path.startswith("/b/"):
+            return self._send(handler, 200, "image/png", png_bytes())
+        return self._send(handler, 404, "text/plain", b"not found")
+
+    def _send(self, handler, status, content_type, body):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def count(self, path_prefix):
+        with self._lock:
+            return sum(1 for path in self.requests if path.startswith(path_prefix))
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Open Library / Google Books server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOpenLibrary(args.port, args.delay)
+    print(f"Fake Open Library listening on {fake.url}")
+    fake.server.serve_forever()
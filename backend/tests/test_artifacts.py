@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.recommender.artifacts import publish, ArtifactWatcher
+from app.recommender.cache import RecommendationCache
+
+
+def write_value(value):
+    def write(directory):
+        with open(os.path.join(directory, "value.txt"), "w") as f:
+            f.write(value)
+    return write
+
+
+def read_value(directory):
+    with open(os.path.join(directory, "value.txt")) as f:
+        return f.read()
+
+
+def test_new_artifact_version_clears_cache():
+    cache = RecommendationCache()
+    with tempfile.TemporaryDirectory() as base_dir:
+        watcher = ArtifactWatcher(base_dir, read_value, check_interval=0, on_change=cache.on_artifact_change)
+        publish(base_dir, write_value("v1"))
+        assert watcher.get() == "v1"
+
+        token = cache.token(7)
+        cache.put(7, "hybrid", "ranked with v1", token)
+        assert watcher.get() == "v1" and cache.get(7, "hybrid") == "ranked with v1"
+
+        # A new version drops what was cached and results computed under the old token
+        publish(base_dir, write_value("v2"))
+        assert watcher.get() == "v2"
+        assert cache.get(7, "hybrid") is None and cache.token(7) != token
+        cache.put(7, "hybrid", "ranked with v1", token)
+        assert cache.get(7, "hybrid") is None
+    print("✅ Artifact versions clear the recommendation cache")
+
+
+if __name__ == "__main__":
+    test_new_artifact_version_clears_cache()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book, User, UserBook, RecommendationResult
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOKS = [
+    (1, "Ann", "Fantasy", "dragons and wizards in a dark tower"),
+    (2, "Ann", "Fantasy", "wizards on a quest for a lost crown"),
+    (3, "Bob", "History", "wars of kings and empires"),
+    (4, "Cy", "Fantasy", "dragons over the winter sea"),
+    (5, "Bob", "History", "the fall of an empire of kings"),
+    (6, "Dee", "Romance", "a wedding in a quiet village"),
+    (7, "Dee", "Romance", "letters between two lovers in a village"),
+    (8, "Cy", "Fantasy", "a tower of dark wizards and dragons"),
+]
+
+# user -> [(book, rating)]; user 1 has an unrated book (weight 0), user 2 rated nothing (equal weights)
+RATINGS = {
+    1: [(1, 5.0), (3, 2.0), (6, None)],
+    2: [(3, None), (7, None)],
+    3: [],
+    4: [(6, 4.0)],
+    5: [(2, 1.0), (5, 5.0)],
+}
+
+# POST /recommend/batch and the single-user content path, in a process using the test database
+BATCH_ENDPOINT = """
+import json, sys
+from fastapi.testclient import TestClient
+import app.main
+from app.recommender.model_store import model_store
+from app.recommender.engine import recommend_for_user
+ratings = {int(user_id): pairs for user_id, pairs in json.loads(sys.argv[1]).items()}
+client = TestClient(app.main.app)
+with client:
+    batch = client.post("/recommend/batch", json={"user_ids": [*ratings, 99], "limit": 3}).json()
+single = {}
+for user_id, pairs in ratings.items():
+    book_ids, scores = recommend_for_user(
+        model_store.snapshot(), [book_id for book_id, _ in pairs],
+        [float("nan") if rating is None else rating for _, rating in pairs], 3
+    )
+    single[user_id] = [book_id for book_id, score in zip(book_ids.tolist(), scores.tolist()) if score > 0]
+print(json.dumps({"batch": batch, "single": single}))
+"""
+
+
+def make_library(path):
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Book(id=book_id, title=f"Book {book_id}", author=author, genre=genre, description=description)
+                for book_id, author, genre, description in BOOKS])
+    db.add_all([User(id=user_id, email=f"user{user_id}@example.com") for user_id in RATINGS])
+    db.add_all([UserBook(user_id=user_id, book_id=book_id, rating=rating, status="read")
+                for user_id, pairs in RATINGS.items() for book_id, rating in pairs])
+    db.commit()
+    db.close()
+    return engine
+
+
+def results_in(engine):
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            "SELECT user_id, book_id FROM recommendation_results ORDER BY user_id, rank"
+        ).fetchall()
+    results = {}
+    for user_id, book_id in rows:
+        results.setdefault(user_id, []).append(book_id)
+    return results
+
+
+def test_batch_and_precompute():
+    with tempfile.TemporaryDirectory() as root:
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": "sqlite:///" + os.path.join(root, "library.db"),
+            "RECOMMENDER_MODEL_DIR": os.path.join(root, "models"),
+            "LEADERBOARD_REFRESH": "0", "PYTHONPATH": BACKEND_DIR,
+        })
+        engine = make_library(os.path.join(root, "library.db"))
+
+        def run(*args):
+            result = subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, env=env,
+                                    capture_output=True, text=True, timeout=120)
+            assert result.returncode == 0, result.stderr
+            return result.stdout
+
+        output = json.loads(run("-c", BATCH_ENDPOINT, json.dumps(RATINGS)).strip().splitlines()[-1])
+        batch, single = output["batch"], output["single"]
+        # Unknown users are left out; everyone else gets `limit` books they haven't rated
+        assert set(batch) == {"1", "2", "3", "4", "5"}
+        for user_id, pairs in RATINGS.items():
+            ids = [book["id"] for book in batch[str(user_id)]]
+            assert len(ids) == 3 and not set(ids) & {book_id for book_id, _ in pairs}, (user_id, ids)
+            # Content matches come first, ranked as the single-user path ranks them
+            content = single[str(user_id)]
+            assert ids[:len(content)] == content, (user_id, ids, content)
+        assert single["1"][0] in (4, 8) and single["2"] and not single["3"]
+
+        # A run interrupted after user 2 resumes with user 3 and leaves earlier rows alone
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO recommendation_results (user_id, rank, book_id, score) VALUES (1, 1, 6, 0.5)"
+            )
+        checkpoint = os.path.join(env["RECOMMENDER_MODEL_DIR"], "precompute_checkpoint.json")
+        with open(checkpoint, "w") as f:
+            json.dump({"top_k": 3, "last_user_id": 2}, f)
+        precompute = ["-m", "scripts.precompute_recommendations", "--top-k", "3", "--chunk-size", "2", "--processes", "1"]
+        output = run(*precompute, "--resume")
+        assert "3 users to do in 2 chunks" in output and not os.path.exists(checkpoint)
+        results = results_in(engine)
+        assert results[1] == [6] and 2 not in results and 3 not in results
+        assert results[4] == single["4"] and results[5] == single["5"]
+
+        # A checkpoint for another --top-k is ignored: the whole run is redone
+        with open(checkpoint, "w") as f:
+            json.dump({"top_k": 5, "last_user_id": 4}, f)
+        assert "5 users to do in 3 chunks" in run(*precompute, "--resume")
+        results = results_in(engine)
+        assert results == {user_id: ids for user_id, ids in ((int(u), i) for u, i in single.items()) if ids}
+    print("✅ Batch recommendations and precompute resume")
+
+
+if __name__ == "__main__":
+    test_batch_and_precompute()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+from app.recommender.blend import blend, popularity_score
+
+WEIGHTS = {"content": 0.5, "collaborative": 0.3, "popularity": 0.2}
+
+
+def test_blend_weighting():
+    components = {
+        # Min-max normalised per component: 1.0, 0.5, 0.0
+        "content": ([1, 2, 3], [0.9, 0.6, 0.3]),
+        # Scale doesn't matter: 1.0, 0.0
+        "collaborative": ([2, 4], [40.0, 10.0]),
+        # All equal: each counts fully
+        "popularity": ([3, 4], [7.0, 7.0]),
+    }
+    book_ids, scores = blend(components, 10, WEIGHTS)
+    expected = {1: 0.5, 2: 0.25 + 0.3, 3: 0.0 + 0.2, 4: 0.0 + 0.2}
+    # 3 and 4 tie; the stable sort keeps the order they were first seen in
+    assert book_ids.tolist() == [2, 1, 3, 4]
+    assert np.allclose(scores, [expected[book_id] for book_id in book_ids.tolist()])
+
+    # Top k only
+    assert blend(components, 2, WEIGHTS)[0].tolist() == [2, 1]
+
+    # A zero or missing weight drops the component, and so do unknown components
+    book_ids, scores = blend(components, 10, {"content": 1.0, "collaborative": 0.0})
+    assert book_ids.tolist() == [1, 2, 3] and np.allclose(scores, [1.0, 0.5, 0.0])
+    assert blend({"other": ([5], [1.0])}, 10, WEIGHTS)[0].tolist() == []
+    assert blend({"content": ([], [])}, 10, WEIGHTS)[0].tolist() == []
+    print("✅ Blend weighting")
+
+
+def test_popularity_score():
+    # Damped by the number of ratings: many 4.0s beat a single 5.0
+    scores = popularity_score(np.array([5.0, 4.0, 4.0, 0.0]), np.array([1, 1, 50, 0]))
+    assert np.allclose(scores, [5 * np.log(2), 4 * np.log(2), 4 * np.log(51), 0.0])
+    assert scores[2] > scores[0] > scores[1] > scores[3]
+    print("✅ Popularity score")
+
+
+if __name__ == "__main__":
+    test_blend_weighting()
+    test_popularity_score()
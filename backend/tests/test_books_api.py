@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import base64
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base, get_db
+from app.models import Book
+from app.catalog import catalog
+from app.routes import books
+
+# Tied titles (case-insensitively) and tied average ratings, so paging has to break ties by id
+BOOKS = [
+    (1, "Emma", 8.0, 2), (2, "dune", 9.0, 2), (3, "Dune", 4.0, 1), (4, "Beloved", 0.0, 0),
+    (5, "emma", 12.0, 3), (6, "Atlas", 9.0, 2), (7, "DUNE", 5.0, 1),
+]
+
+
+def make_client():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all([
+        Book(id=book_id, title=title, author="Someone", rating_sum=rating_sum, rating_count=rating_count)
+        for book_id, title, rating_sum, rating_count in BOOKS
+    ])
+    db.commit()
+    catalog.reload(db)
+    db.close()
+
+    def session():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(books.router)
+    app.dependency_overrides[get_db] = session
+    return TestClient(app)
+
+
+def cursor(*parts):
+    return base64.urlsafe_b64encode(json.dumps(list(parts)).encode()).decode()
+
+
+def all_pages(client, sort, limit):
+    ids, params = [], {"sort": sort, "limit": limit, "fields": "id"}
+    while True:
+        response = client.get("/books/", params=params)
+        assert response.status_code == 200
+        page = [book["id"] for book in response.json()]
+        assert len(page) <= limit
+        ids += page
+        if "X-Next-Cursor" not in response.headers:
+            return ids
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+
+def test_keyset_paging():
+    client = make_client()
+    expected = {
+        "id": [1, 2, 3, 4, 5, 6, 7],
+        "title": [6, 4, 2, 3, 7, 1, 5],
+        # Averages: 4.0, 4.5, 4.0, 0.0, 4.0, 4.5, 5.0; best first, ties by id
+        "rating": [7, 2, 6, 1, 3, 5, 4],
+    }
+    for sort, order in expected.items():
+        for limit in (1, 2, 3, 7):
+            assert all_pages(client, sort, limit) == order, (sort, limit)
+    print("✅ Keyset paging")
+
+
+def test_fields():
+    client = make_client()
+    books_page = client.get("/books/", params={"limit": 2, "fields": "title,rating"}).json()
+    assert books_page == [{"id": 1, "title": "Emma", "rating": 4.0}, {"id": 2, "title": "dune", "rating": 4.5}]
+    assert set(client.get("/books/", params={"limit": 1}).json()[0]) == set(books.BOOK_FIELDS)
+
+    response = client.get("/books/", params={"fields": "title,isbn"})
+    assert response.status_code == 400 and "isbn" in response.json()["detail"]
+
+
+def test_bad_cursors():
+    client = make_client()
+    bad = [
+        ("title", "not base64 json"),
+        ("title", cursor("title", 5, 2)),
+        ("title", cursor("title", "dune", "2")),
+        ("rating", cursor("rating", "abc", 2)),
+        ("rating", cursor("rating", True, 2)),
+        ("rating", base64.urlsafe_b64encode(b'["rating", NaN, 2]').decode()),
+        ("id", cursor("id", "3", 3)),
+        ("id", cursor("id", 3, None)),
+        ("id", cursor("id", 3)),
+        # A cursor from another sort order
+        ("rating", cursor("title", "dune", 2)),
+    ]
+    for sort, value in bad:
+        response = client.get("/books/", params={"sort": sort, "limit": 2, "cursor": value})
+        assert response.status_code == 400, (sort, value, response.status_code)
+
+    # An id cursor without a key starts after its id
+    response = client.get("/books/", params={"limit": 2, "fields": "id", "cursor": cursor("id", None, 2)})
+    assert [book["id"] for book in response.json()] == [3, 4]
+
+
+if __name__ == "__main__":
+    test_keyset_paging()
+    test_fields()
+    test_bad_cursors()
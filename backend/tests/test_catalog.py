@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book
+from app.catalog import Catalog, CatalogSnapshot, catalog_book
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        Book(id=2, title="Emma", author="Austen", genre="Romance", rating_sum=9.0, rating_count=2, read_count=3),
+        Book(id=5, title="Dune", author="Herbert", genre="Science Fiction", rating_sum=5.0, rating_count=1),
+        Book(id=9, title="Beloved", author="Morrison", genre="Fiction"),
+    ])
+    db.commit()
+    return db
+
+
+def assert_matches_db(live, db):
+    """Every column of the live snapshot equals a fresh load from the database"""
+    fresh = Catalog().reload(db)
+    for name in CatalogSnapshot._fields[1:]:
+        assert np.array_equal(getattr(live, name), getattr(fresh, name)), name
+
+
+def test_updates_match_reload():
+    db = make_db()
+    live = Catalog()
+    live.reload(db)
+    versions = [live.version]
+
+    def check():
+        assert live.version > versions[-1]
+        versions.append(live.version)
+        assert_matches_db(live.snapshot(), db)
+
+    # Added between existing ids, and appended after them
+    for book in (Book(id=3, title="Atlas", author="Rand", genre="Fiction"), Book(id=12, title="Ulysses", author="Joyce")):
+        db.add(book)
+        db.commit()
+        live.upsert_books([catalog_book(book)])
+        check()
+
+    # Edited in place: text changes, aggregates kept
+    book = db.get(Book, 2)
+    book.title, book.description = "Emma (annotated)", "A matchmaker"
+    db.commit()
+    live.upsert_books([catalog_book(book)])
+    check()
+
+    db.delete(db.get(Book, 5))
+    db.commit()
+    live.remove_books([5])
+    check()
+
+    for book_id, aggregates in {9: (4.0, 1, 1), 12: (12.0, 3, 4)}.items():
+        book = db.get(Book, book_id)
+        book.rating_sum, book.rating_count, book.read_count = aggregates
+    db.commit()
+    live.set_aggregates({9: (4.0, 1, 1), 12: (12.0, 3, 4)})
+    check()
+
+    db.get(Book, 3).cover_image = "http://example.com/3.jpg"
+    db.commit()
+    live.update_covers({3: "http://example.com/3.jpg"})
+    check()
+
+    # Unknown ids change nothing, not even the version
+    live.remove_books([404])
+    live.set_aggregates({404: (1.0, 1, 1)})
+    live.update_covers({404: "http://example.com/404.jpg"})
+    assert live.version == versions[-1]
+    assert live.snapshot().ids.tolist() == [2, 3, 9, 12]
+    db.close()
+    print(f"✅ Catalog updates match a reload across {len(versions)} versions")
+
+
+def test_sort_index_invalidation():
+    db = make_db()
+    live = Catalog()
+    snapshot = live.reload(db)
+
+    def order(snapshot, sort):
+        _, _, ids = live.sort_index(snapshot, sort)
+        return ids.tolist()
+
+    by_title, by_rating = live.sort_index(snapshot, "title"), live.sort_index(snapshot, "rating")
+    assert order(snapshot, "title") == [9, 5, 2] and order(snapshot, "rating") == [5, 2, 9]
+
+    # A cover change replaces neither column: both orders are reused
+    live.update_covers({9: "http://example.com/9.jpg"})
+    snapshot = live.snapshot()
+    assert live.sort_index(snapshot, "title") is by_title and live.sort_index(snapshot, "rating") is by_rating
+
+    # New ratings replace the rating column only (a tie at 5.0 goes by id)
+    live.set_aggregates({9: (10.0, 2, 2)})
+    snapshot = live.snapshot()
+    assert live.sort_index(snapshot, "title") is by_title
+    assert order(snapshot, "rating") == [5, 9, 2]
+
+    # A retitled book replaces the title column
+    live.upsert_books([catalog_book(Book(id=2, title="Anna Karenina", author="Tolstoy"))])
+    snapshot = live.snapshot()
+    assert order(snapshot, "title") == [2, 9, 5]
+    assert order(snapshot, "rating") == [5, 9, 2]
+    db.close()
+    print("✅ Sort indexes rebuilt when their column changes")
+
+
+if __name__ == "__main__":
+    test_updates_match_reload()
+    test_sort_index_invalidation()
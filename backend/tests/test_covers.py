@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import time
+import asyncio
+import tempfile
+import subprocess
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book
+from app.covers import CoverResolver, RetryTimes
+from app.thumbnails import ThumbnailStore
+from scripts.backfill_covers import RateLimiter
+from fake_openlibrary import FakeOpenLibrary, png_bytes
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# POST /books/covers in a process configured like the backfill, polled until every cover is ready
+COVERS_ENDPOINT = """
+import json, sys, time
+from fastapi.testclient import TestClient
+import app.main
+client = TestClient(app.main.app)
+book_ids = json.loads(sys.argv[1])
+deadline = time.time() + 10
+while True:
+    covers = client.post("/books/covers", json={"book_ids": book_ids}).json()
+    if all(cover["status"] in ("ready", "not_found") for cover in covers.values()) or time.time() > deadline:
+        break
+    time.sleep(0.05)
+print(json.dumps(covers))
+"""
+
+
+def make_resolver(fake, stored, **kwargs):
+    return CoverResolver(
+        store=stored.update,
+        openlibrary_url=fake.url, covers_url=fake.url, google_books_url=fake.url,
+        **kwargs
+    )
+
+
+def test_cover_resolver():
+    fake = FakeOpenLibrary(delay=0.05).start()
+    stored = {}
+    try:
+        resolver = make_resolver(fake, stored, concurrency=3)
+
+        # Repeated requests for the same book share one lookup
+        statuses = [resolver.request(1, "Dune", "Frank Herbert") for _ in range(5)]
+        assert statuses == ["pending"] * 5
+        url = resolver.wait(1, timeout=5)
+        assert url.startswith(fake.url + "/b/id/")
+        assert stored == {1: url}
+        assert fake.count("/search.json") == 1
+        assert resolver.status(1) is None
+
+        # Google Books fallback
+        resolver.request(2, "isbnonly book", "Someone")
+        assert "9780000000001" in resolver.wait(2, timeout=5)
+
+        # Misses are cached for the negative TTL and not looked up again
+        resolver.request(3, "nocover book", "Nobody")
+        assert resolver.wait(3, timeout=5) is None
+        before = len(fake.requests)
+        assert resolver.request(3, "nocover book", "Nobody") == "not_found"
+        assert len(fake.requests) == before
+
+        # Lookups run with bounded concurrency
+        for book_id in range(10, 22):
+            resolver.request(book_id, f"title {book_id}", "author")
+        deadline = time.time() + 10
+        while any(resolver.status(book_id) == "pending" for book_id in range(10, 22)) and time.time() < deadline:
+            time.sleep(0.02)
+        assert all(book_id in stored for book_id in range(10, 22))
+        assert fake.max_in_flight <= 3
+        print(f"✅ Cover resolver: {len(fake.requests)} upstream requests, peak concurrency {fake.max_in_flight}")
+    finally:
+        fake.stop()
+
+
+def test_negative_ttl_expires():
+    fake = FakeOpenLibrary().start()
+    try:
+        resolver = make_resolver(fake, {}, negative_ttl=0.1)
+        resolver.request(1, "nocover", "x")
+        resolver.wait(1, timeout=5)
+        assert resolver.request(1, "nocover", "x") == "not_found"
+        time.sleep(0.15)
+        assert resolver.request(1, "nocover", "x") == "pending"
+        resolver.wait(1, timeout=5)
+
+        # Expired entries are dropped when another book goes into the cache
+        time.sleep(0.15)
+        resolver.request(2, "nocover two", "x")
+        resolver.wait(2, timeout=5)
+        assert len(resolver._negative) == 1 and resolver.status(2) == "not_found"
+    finally:
+        fake.stop()
+
+
+def test_retry_times_bounded():
+    retry = RetryTimes(max_entries=3)
+    for book_id in range(10):
+        retry.block(book_id, 100.0, now=0.0)
+    # Over the cap the oldest go first
+    assert len(retry) == 3 and [retry.blocked(book_id, 0.0) for book_id in (6, 7, 8, 9)] == [False, True, True, True]
+
+    # Blocking again moves a key to the newest end
+    retry.block(7, 100.0, now=0.0)
+    retry.block(10, 100.0, now=0.0)
+    assert [retry.blocked(book_id, 0.0) for book_id in (7, 8, 9, 10)] == [True, False, True, True]
+
+    # Once expired they're pruned by the next insert, and don't block in the meantime
+    assert not retry.blocked(9, 150.0)
+    retry.block(11, 200.0, now=150.0)
+    assert len(retry) == 1 and retry.blocked(11, 150.0)
+    retry.discard(11)
+    assert len(retry) == 0
+
+
+def test_thumbnail_store():
+    fake = FakeOpenLibrary().start()
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            store = ThumbnailStore(root)
+            stored = {}
+            resolver = make_resolver(fake, stored, thumbnails=store)
+
+            # A found cover is downloaded into the store in the background
+            resolver.request(1, "Dune", "Frank Herbert")
+            url = resolver.wait(1, timeout=5)
+            resolver.wait_image(url, timeout=5)
+            path, etag, content_type = store.get(url, "small")
+            with open(path, "rb") as f:
+                assert f.read()[:8] == png_bytes()[:8]
+            assert content_type in ("image/png", "image/jpeg")
+            assert resolver.request_image(url) is False
+
+            # Objects are content-addressed: the same image under another URL isn't stored twice
+            objects = sum(len(files) for _, _, files in os.walk(os.path.join(root, "objects")))
+            store.put(fake.url + "/b/id/other-L.jpg", png_bytes())
+            assert sum(len(files) for _, _, files in os.walk(os.path.join(root, "objects"))) == objects
+            assert store.get(fake.url + "/b/id/other-L.jpg", "original")[1] == store.get(url, "original")[1]
+
+            # Non-images are rejected
+            try:
+                store.put("http://example.com/error", b"<html>rate limited</html>")
+                assert False, "expected ValueError"
+            except ValueError:
+                pass
+            print(f"✅ Thumbnail store: {objects} objects for {url}")
+    finally:
+        fake.stop()
+
+
+def test_rate_limiter():
+    async def run():
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.wait() for _ in range(6)))
+        return time.monotonic() - start
+
+    # Six calls at 50/s: the last starts 5 intervals after the first
+    assert asyncio.run(run()) >= 0.09
+
+
+def make_catalog(path, titles):
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Book(id=book_id, title=title, author="Someone") for book_id, title in titles.items()])
+    db.add(Book(id=99, title="Has a cover", author="Someone", cover_image="http://example.com/99.jpg"))
+    db.commit()
+    db.close()
+    return engine
+
+
+def covers_in(engine):
+    with engine.connect() as connection:
+        return dict(connection.exec_driver_sql("SELECT id, cover_image FROM books").fetchall())
+
+
+def test_backfill_covers():
+    fake = FakeOpenLibrary().start()
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            env = {key: value for key, value in os.environ.items() if key != "COVER_STORE_DIR"}
+            env.update({
+                "DATABASE_URL": "sqlite:///" + os.path.join(root, "library.db"),
+                "RECOMMENDER_MODEL_DIR": os.path.join(root, "models"),
+                "OPENLIBRARY_URL": fake.url, "OPENLIBRARY_COVERS_URL": fake.url, "GOOGLE_BOOKS_URL": fake.url,
+                "LEADERBOARD_REFRESH": "0", "PYTHONPATH": BACKEND_DIR,
+            })
+            engine = make_catalog(os.path.join(root, "library.db"), {
+                1: "Dune", 2: "nocover book", 3: "isbnonly book", 4: "Emma", 5: "Persuasion", 6: "Ulysses"
+            })
+
+            def backfill(*args):
+                result = subprocess.run(
+                    [sys.executable, "-m", "scripts.backfill_covers", "--batch-size", "2", "--rate", "50", *args],
+                    cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60
+                )
+                assert result.returncode == 0, result.stderr
+                return result.stdout
+
+            # An interrupted run that finished books up to id 3 resumes after it
+            os.makedirs(env["RECOMMENDER_MODEL_DIR"])
+            checkpoint = os.path.join(env["RECOMMENDER_MODEL_DIR"], "cover_backfill_checkpoint.json")
+            with open(checkpoint, "w") as f:
+                json.dump({"last_id": 3, "resolved": 2, "missed": 1}, f)
+            output = backfill("--resume")
+            assert fake.count("/search.json") == 3
+            # One bulk UPDATE per batch of two
+            assert output.count("Up to book") == 2 and "5 covers found, 1 without" in output
+            covers = covers_in(engine)
+            assert [book_id for book_id, url in covers.items() if url] == [4, 5, 6, 99]
+            assert covers[99] == "http://example.com/99.jpg" and not os.path.exists(checkpoint)
+
+            # A full run looks up what's still missing, including the books the checkpoint skipped
+            backfill()
+            covers = covers_in(engine)
+            assert covers[1].startswith(fake.url + "/b/id/") and "9780000000001" in covers[3]
+            assert not covers[2]
+
+            # POST /books/covers serves the backfilled covers and resolves new books through the fake
+            with engine.begin() as connection:
+                connection.exec_driver_sql("INSERT INTO books (id, title, author) VALUES (7, 'Middlemarch', 'Eliot')")
+            result = subprocess.run(
+                [sys.executable, "-c", COVERS_ENDPOINT, json.dumps([1, 2, 7])],
+                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60
+            )
+            assert result.returncode == 0, result.stderr
+            endpoint = json.loads(result.stdout.strip().splitlines()[-1])
+            assert endpoint["1"] == {"cover_url": covers[1], "status": "ready"}
+            assert endpoint["2"]["status"] == "not_found"
+            assert endpoint["7"]["status"] == "ready" and endpoint["7"]["cover_url"].startswith(fake.url)
+            print(f"✅ Cover backfill: {fake.count('/search.json')} Open Library searches")
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    test_cover_resolver()
+    test_negative_ttl_expires()
+    test_retry_times_bounded()
+    test_thumbnail_store()
+    test_rate_limiter()
+    test_backfill_covers()
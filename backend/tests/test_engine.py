@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pandas as pd
+from app.recommender.model_store import TfidfModelStore
+from app.recommender.engine import hybrid_recommendation, recommend_for_user, batch_content_recommendations
+
+
+def test_hybrid_recommendation_without_model():
+    books_df = pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "author": ["Ann", "Ann", "Bob", "Cy"],
+        "genre": ["Fantasy", "Fantasy", "History", "Fantasy"],
+        "description": ["dragons and wizards", "wizards and a quest", "wars of kings", "dragons over the sea"],
+    })
+    interactions_df = pd.DataFrame({"user_id": [7], "book_id": [1], "rating": [5.0]})
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        shared = TfidfModelStore(model_dir=model_dir)
+        recommendations = hybrid_recommendation(7, None, books_df, interactions_df, model=shared)
+        assert 1 not in recommendations["id"].tolist()
+        assert recommendations["id"].tolist()[0] in (2, 4)
+
+        # Scored with a throwaway model; the shared one isn't fitted or persisted from a request's frames
+        assert not shared.is_ready and os.listdir(model_dir) == []
+    print("✅ Hybrid recommendation without a fitted model")
+
+
+def test_batch_matches_single_user():
+    model = TfidfModelStore(model_dir=None)
+    model.fit([1, 2, 3, 4, 5, 6], [
+        "dragons and wizards", "wizards and a quest", "wars of kings",
+        "dragons over the sea", "kings and a quest", "a quiet village",
+    ])
+    snapshot = model.snapshot()
+    # Unrated books weigh nothing next to rated ones, and equally when nothing is rated
+    user_ratings = [(1, [(1, 5.0), (3, None)]), (2, [(3, None), (6, None)]), (3, [(2, 0.0), (4, 2.0)]), (4, [])]
+
+    batch = {user_id: (ids, scores) for user_id, ids, scores in batch_content_recommendations(snapshot, user_ratings, 3)}
+    assert set(batch) == {1, 2, 3}
+    for user_id, pairs in user_ratings[:3]:
+        ids, scores = recommend_for_user(
+            snapshot, [book_id for book_id, _ in pairs], [np.nan if r is None else r for _, r in pairs], 3
+        )
+        positive = scores > 0
+        assert batch[user_id][0].tolist() == ids[positive].tolist()
+        assert np.allclose(batch[user_id][1], scores[positive], rtol=0, atol=1e-12)
+        assert not set(batch[user_id][0].tolist()) & {book_id for book_id, _ in pairs}
+    print("✅ Batch and single-user content scores agree")
+
+
+if __name__ == "__main__":
+    test_hybrid_recommendation_without_model()
+    test_batch_matches_single_user()
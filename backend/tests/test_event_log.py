@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book, UserBook, InteractionEvent
+from app.event_log import EventConsumer, stored_offset
+from app.user_stats import read_leaderboard
+
+
+def rate(db, event_id, user_id, book_id, rating, status="read"):
+    """What /activity writes: the shelf row and its event, in one transaction"""
+    row = db.query(UserBook).filter(UserBook.user_id == user_id, UserBook.book_id == book_id).first()
+    if row is None:
+        db.add(UserBook(user_id=user_id, book_id=book_id, rating=rating, status=status))
+    else:
+        row.rating, row.status = rating, status
+    db.add(InteractionEvent(id=event_id, user_id=user_id, book_id=book_id, rating=rating, status=status,
+                            created_at=datetime(2026, 3, 1)))
+    db.commit()
+
+
+def aggregates(db):
+    db.expire_all()
+    return {book.id: (book.rating_sum, book.rating_count, book.read_count) for book in db.query(Book)}
+
+
+def test_event_consumer():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all([Book(id=1, title="A", author="X"), Book(id=2, title="B", author="Y")])
+    db.commit()
+
+    now = [0.0]
+    consumer = EventConsumer(batch_size=2, gap_timeout=5, session_factory=Session, clock=lambda: now[0])
+    assert consumer.load(db) == 0
+
+    rate(db, 1, 1, 1, 4.0)
+    rate(db, 2, 2, 1, 2.0)
+    rate(db, 3, 1, 2, 5.0)
+    assert consumer.catch_up() == 3
+    assert aggregates(db) == {1: (6.0, 2, 2), 2: (5.0, 1, 1)}
+    assert stored_offset(db) == 3 and read_leaderboard.rank(1) == 1
+
+    # Event 4 isn't visible yet: 5 waits behind the gap until it times out
+    rate(db, 5, 2, 1, 3.0)
+    assert consumer.catch_up() == 0
+    now[0] = 6.0
+    assert consumer.catch_up() == 1
+    assert aggregates(db)[1] == (7.0, 2, 2) and stored_offset(db) == 5
+
+    # A restarted consumer resumes from the stored offset
+    rate(db, 6, 3, 2, 1.0)
+    restarted = EventConsumer(gap_timeout=0, session_factory=Session)
+    assert restarted.load(db) == 5
+    assert restarted.catch_up() == 1
+    assert aggregates(db)[2] == (6.0, 2, 2)
+
+    # Replaying from the start recomputes the same state
+    db.query(Book).update({"rating_sum": 0.0, "rating_count": 0, "read_count": 0})
+    db.commit()
+    restarted.replay(db, 0)
+    assert restarted.catch_up() == 5
+    assert aggregates(db) == {1: (7.0, 2, 2), 2: (6.0, 2, 2)}
+    assert stored_offset(db) == 6
+    db.close()
+    print("✅ Interaction event consumer")
+
+
+if __name__ == "__main__":
+    test_event_consumer()
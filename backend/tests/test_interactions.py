@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book, UserBook, InteractionEvent
+from app.interactions import apply_interactions, deduplicate_user_books, UNIQUE_INDEX
+from app.event_log import EventConsumer
+
+
+def item(book_id, status, rating=None, ts=None):
+    return SimpleNamespace(book_id=book_id, status=status, rating=rating, ts=ts)
+
+
+def test_apply_interactions():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all([
+        Book(id=1, title="A", author="X", rating_sum=4.0, rating_count=1, read_count=1),
+        Book(id=2, title="B", author="Y", rating_sum=0.0, rating_count=0, read_count=0),
+        Book(id=3, title="C", author="Z", rating_sum=3.0, rating_count=1, read_count=1),
+        UserBook(user_id=1, book_id=1, rating=4.0, status="read", changed_at=datetime(2026, 3, 1)),
+        UserBook(user_id=1, book_id=3, rating=3.0, status="read", changed_at=datetime(2026, 3, 10)),
+    ])
+    db.commit()
+    consumer = EventConsumer(session_factory=Session)
+    consumer.load(db)
+
+    results, changes = apply_interactions(db, 1, [
+        item(2, "reading", ts=datetime(2026, 3, 5)),
+        item(2, "read", 5.0, ts=datetime(2026, 3, 6)),
+        item(1, "read", 2.0, ts=datetime(2026, 3, 2)),
+        item(3, "read", 1.0, ts=datetime(2026, 3, 2)),
+        item(4, "read", 1.0),
+        item(1, "read", 2.0, ts=datetime(2026, 3, 1, 12)),
+    ])
+    db.commit()
+    assert [result["result"] for result in results] == [
+        "superseded", "created", "updated", "stale", "unknown_book", "superseded"
+    ]
+    assert [(change.book_id, change.rating) for change in changes] == [(2, 5.0), (1, 2.0)]
+
+    shelf = {user_book.book_id: (user_book.rating, user_book.status) for user_book in db.query(UserBook)}
+    assert shelf == {1: (2.0, "read"), 2: (5.0, "read"), 3: (3.0, "read")}
+    assert db.query(InteractionEvent).count() == 2
+
+    # Aggregates follow from the event log
+    consumer.catch_up()
+    db.expire_all()
+    books = {book.id: (book.rating_sum, book.rating_count, book.read_count) for book in db.query(Book)}
+    assert books == {1: (2.0, 1, 1), 2: (5.0, 1, 1), 3: (3.0, 1, 1)}
+
+    # Re-sending the same state changes nothing
+    results, changes = apply_interactions(db, 1, [item(2, "read", 5.0)])
+    assert results == [{"book_id": 2, "result": "unchanged"}] and changes == []
+    db.close()
+    print("✅ Bulk interactions")
+
+
+def test_offline_edits_across_requests():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add(Book(id=1, title="A", author="X"))
+    db.commit()
+
+    # Two syncs of one offline session; the server applies both now, after the client's times
+    started = datetime(2026, 3, 5, 12)
+    results, _ = apply_interactions(db, 1, [item(1, "reading", ts=started)])
+    db.commit()
+    assert results == [{"book_id": 1, "result": "created"}]
+    results, _ = apply_interactions(db, 1, [item(1, "read", 5.0, ts=started + timedelta(minutes=30))])
+    db.commit()
+    assert results == [{"book_id": 1, "result": "updated"}]
+
+    user_book = db.query(UserBook).one()
+    assert (user_book.rating, user_book.status) == (5.0, "read")
+    assert user_book.changed_at == started + timedelta(minutes=30) and user_book.updated_at > user_book.changed_at
+
+    # A change from before the last one is still stale
+    results, _ = apply_interactions(db, 1, [item(1, "reading", ts=started + timedelta(minutes=10))])
+    assert results == [{"book_id": 1, "result": "stale"}]
+    db.close()
+
+
+def test_deduplicate_user_books():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE user_books (id INTEGER PRIMARY KEY, user_id INTEGER, book_id INTEGER)"))
+        connection.execute(text("INSERT INTO user_books (user_id, book_id) VALUES (1, 1), (1, 1), (1, 2), (2, 1), (1, 1)"))
+    assert deduplicate_user_books(engine) == 2
+    with engine.begin() as connection:
+        assert [row[0] for row in connection.execute(text("SELECT id FROM user_books ORDER BY id"))] == [3, 4, 5]
+        connection.execute(text(f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON user_books (user_id, book_id)"))
+    assert deduplicate_user_books(engine) == 0
+
+
+if __name__ == "__main__":
+    test_apply_interactions()
+    test_offline_edits_across_requests()
+    test_deduplicate_user_books()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+from datetime import datetime
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import UserBook, Book, LeaderboardEntry
+from app.normalize import link_books
+from app.leaderboards import ranked, first_month, refresh_leaderboards, compute_leaderboards
+from app.interactions import apply_interactions
+
+
+def test_ranked():
+    rows = ranked([(3, 5), (1, 7), (2, 5), (4, 1)], size=3)
+    assert rows == [(1, 1, 1, 7), (2, 2, 2, 5), (3, 2, 3, 5)]
+    assert first_month(datetime(2026, 3, 15), 12) == datetime(2025, 4, 1)
+    assert first_month(datetime(2026, 1, 31, 9), 1) == datetime(2026, 1, 1)
+
+
+def test_refresh_leaderboards():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Book(id=1, title="A", author="X"), Book(id=2, title="B", author="Y")])
+    link_books(db, {1: (["X"], ["Fiction"]), 2: (["Y"], ["History"])})
+    db.add_all([
+        UserBook(user_id=1, book_id=1, status="read", updated_at=datetime(2026, 3, 2)),
+        UserBook(user_id=1, book_id=2, status="read", updated_at=datetime(2026, 2, 10)),
+        UserBook(user_id=2, book_id=2, status="read", updated_at=datetime(2026, 3, 5)),
+        UserBook(user_id=3, book_id=1, status="wishlist", updated_at=datetime(2026, 3, 5)),
+        UserBook(user_id=3, book_id=2, status="read", updated_at=datetime(2024, 1, 5)),
+    ])
+    db.commit()
+
+    assert refresh_leaderboards(db, now=datetime(2026, 3, 20)) == 5
+    boards = {}
+    for entry in db.query(LeaderboardEntry).order_by(LeaderboardEntry.position):
+        boards.setdefault((entry.board, entry.key), []).append((entry.rank, entry.user_id, entry.books_read))
+    assert boards[("overall", "")] == [(1, 1, 2), (2, 2, 1), (2, 3, 1)]
+    assert boards[("genre", "Fiction")] == [(1, 1, 1)]
+    assert boards[("genre", "History")] == [(1, 1, 1), (1, 2, 1), (1, 3, 1)]
+    assert boards[("month", "2026-03")] == [(1, 1, 1), (1, 2, 1)]
+    assert boards[("month", "2026-02")] == [(1, 1, 1)]
+    assert ("month", "2024-01") not in boards
+
+    # A refresh replaces every row
+    refresh_leaderboards(db, now=datetime(2026, 3, 20))
+    assert db.query(LeaderboardEntry).count() == sum(len(rows) for rows in boards.values())
+    db.close()
+    print("✅ Leaderboards")
+
+
+def test_rerated_read_stays_in_its_month():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Book(id=1, title="A", author="X"), Book(id=2, title="B", author="Y")])
+    db.commit()
+    apply_interactions(db, 1, [SimpleNamespace(book_id=1, status="read", rating=3.0, ts=datetime(2026, 1, 20))])
+    apply_interactions(db, 2, [SimpleNamespace(book_id=2, status="read", rating=4.0, ts=datetime(2026, 3, 2))])
+    db.commit()
+    # User 1 re-rates in March the book they read in January
+    apply_interactions(db, 1, [SimpleNamespace(book_id=1, status="read", rating=5.0, ts=datetime(2026, 3, 5))])
+    db.commit()
+
+    boards = compute_leaderboards(db, now=datetime(2026, 3, 20))
+    assert boards[("month", "2026-01")] == [(1, 1, 1, 1)]
+    assert boards[("month", "2026-03")] == [(1, 1, 2, 1)]
+    db.close()
+
+
+if __name__ == "__main__":
+    test_ranked()
+    test_refresh_leaderboards()
+    test_rerated_read_stays_in_its_month()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.recommender.model_store import TfidfModelStore
+
+
+def book(book_id, description):
+    return SimpleNamespace(id=book_id, author="Ann", genre="Fantasy", description=description)
+
+
+def test_incremental_saves_are_batched():
+    with tempfile.TemporaryDirectory() as model_dir:
+        store = TfidfModelStore(model_dir=model_dir, save_delay=60)
+        store.fit_books([book(1, "dragons and wizards"), book(2, "wizards on a quest")])
+        matrix_path = os.path.join(model_dir, "tfidf_matrix.npz")
+        fitted_at = os.stat(matrix_path).st_mtime_ns
+
+        # Writes only schedule a save...
+        store.upsert_books([book(3, "dragons at sea")])
+        store.upsert_books([book(4, "a quest for dragons")])
+        store.remove_books([2])
+        assert os.stat(matrix_path).st_mtime_ns == fitted_at
+
+        # ...which writes all of them at once
+        store.flush()
+        reloaded = TfidfModelStore(model_dir=model_dir)
+        assert reloaded.load()
+        assert sorted(reloaded.snapshot().row_of) == [1, 3, 4]
+        store.flush()
+    print("✅ Batched model saves")
+
+
+if __name__ == "__main__":
+    test_incremental_saves_are_batched()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+from sklearn.preprocessing import normalize
+from app.recommender.artifacts import ArtifactWatcher
+from app.recommender.neighbors import (compute_neighbors, rating_matrix, publish_neighbor_tables,
+                                       NeighborTable)
+
+BOOK_IDS = [10, 20, 30, 40, 50, 60]
+
+# Rows 0-2 and 3-4 overlap among themselves; row 5 shares nothing with anyone
+MATRIX = normalize(np.array([
+    [3.0, 1.0, 0.0, 0.0],
+    [2.0, 2.0, 0.0, 0.0],
+    [1.0, 0.0, 0.5, 0.0],
+    [0.0, 0.0, 2.0, 1.0],
+    [0.0, 0.0, 1.0, 1.0],
+    [0.0, 0.0, 0.0, 0.0],
+]))
+
+
+def brute_force(matrix, top_n):
+    """Neighbour rows of each row by full sort of the cosine matrix: positive scores only, ties by row"""
+    sims = matrix @ matrix.T
+    expected = []
+    for row in range(len(sims)):
+        order = [other for other in np.argsort(-sims[row], kind="stable") if other != row and sims[row, other] > 0]
+        expected.append(order[:top_n])
+    return expected, sims
+
+
+def test_compute_neighbors():
+    expected, sims = brute_force(MATRIX, 3)
+    # Chunks smaller than the matrix, across a pool
+    rows, scores = compute_neighbors(MATRIX, top_n=3, chunk_size=2, processes=2)
+    assert rows.shape == scores.shape == (6, 3)
+    for row in range(6):
+        found = [other for other in rows[row].tolist() if other >= 0]
+        assert found == expected[row], (row, found, expected[row])
+        assert np.allclose(scores[row, :len(found)], sims[row, found], atol=1e-6)
+        # Empty slots are -1 with score 0
+        assert (rows[row, len(found):] == -1).all() and (scores[row, len(found):] == 0).all()
+    assert rows[5].tolist() == [-1, -1, -1]
+
+    # More neighbours asked for than there are other books
+    rows, scores = compute_neighbors(MATRIX[:3], top_n=5, chunk_size=8, processes=1)
+    assert rows.shape == (3, 5) and (rows[:, 2:] == -1).all()
+    assert rows[:, :2].tolist() == [[1, 2], [0, 2], [0, 1]]
+    print("✅ Neighbour tables match a brute-force sort")
+
+
+def test_rating_matrix():
+    interactions = [(1, 10, 5.0), (2, 10, 3.0), (1, 20, 4.0), (3, 30, None), (1, 99, 5.0), (9, 40, 2.0)]
+    matrix = rating_matrix(BOOK_IDS, interactions).toarray()
+    # Users 1, 2 and 9 are columns; unrated and unknown books are left out
+    assert matrix.shape == (6, 3)
+    assert np.allclose(matrix[0], [5 / np.sqrt(34), 3 / np.sqrt(34), 0])
+    assert np.allclose(matrix[1], [1, 0, 0]) and np.allclose(matrix[3], [0, 0, 1])
+    assert not matrix[2].any() and not matrix[5].any()
+    assert rating_matrix(BOOK_IDS, [(1, 10, None)]).shape == (6, 1)
+
+
+def test_publish_and_load():
+    content = compute_neighbors(MATRIX, top_n=2, chunk_size=4, processes=1)
+    with tempfile.TemporaryDirectory() as base_dir:
+        watcher = ArtifactWatcher(base_dir, NeighborTable, check_interval=0)
+        assert watcher.get() is None
+
+        # Only the content kind published: collaborative lookups come back empty
+        publish_neighbor_tables(BOOK_IDS, {"content": content}, base_dir=base_dir)
+        table = watcher.get()
+        assert isinstance(table.tables["content"][0], np.memmap)
+        assert table.neighbors(10)[0].tolist() == [20, 30]
+        assert np.allclose(table.neighbors(10)[1], content[1][0])
+        assert table.neighbors(40)[0].tolist() == [50, 30]
+        assert table.neighbors(60)[0].tolist() == [] and table.neighbors(404)[0].tolist() == []
+        assert table.neighbors(10, "collaborative")[0].tolist() == []
+        assert table.candidates([10, 60, 404]).tolist() == [20, 30]
+
+        # A new version with both kinds replaces it; candidates merge both
+        collaborative = compute_neighbors(rating_matrix(BOOK_IDS, [(1, 10, 5.0), (1, 60, 4.0)]), top_n=2, processes=1)
+        publish_neighbor_tables(BOOK_IDS, {"content": content, "collaborative": collaborative}, base_dir=base_dir)
+        table = watcher.get()
+        assert table.neighbors(10, "collaborative")[0].tolist() == [60]
+        assert table.candidates([10]).tolist() == [20, 30, 60]
+    print("✅ Neighbour tables published and memory-mapped")
+
+
+if __name__ == "__main__":
+    test_compute_neighbors()
+    test_rating_matrix()
+    test_publish_and_load()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book, Author, Genre, BookAuthor
+from app.normalize import parse_names, migrate_book_names, book_genre_names, add_missing_name_columns
+
+
+def test_parse_names():
+    assert parse_names("['Alex Goldfarb', 'Marina Litvinenko']") == ["Alex Goldfarb", "Marina Litvinenko"]
+    assert parse_names("[\"K'wan\"]") == ["K'wan"]
+    assert parse_names("['Fiction', 'Fiction', '']") == ["Fiction"]
+    assert parse_names("[Broken, 'list'") == ["[Broken, 'list'"]
+    assert parse_names("[Broken, list]") == ["Broken", "list"]
+    assert parse_names("Jane Austen") == ["Jane Austen"]
+    assert parse_names(None) == [] and parse_names("  ") == []
+
+
+def test_migrate_book_names():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        Book(title="A", author="['Ann One', 'Bob Two']", genre="['Fiction', 'History']"),
+        Book(title="B", author="['Ann One']", genre="['History']"),
+        Book(title="C", author="Plain Name", genre=""),
+        Book(title="D", author="", genre="['Fiction', 'Mystery']"),
+    ])
+    db.commit()
+
+    assert migrate_book_names(db, batch_size=2) == 4
+    assert [book.author for book in db.query(Book).order_by(Book.id)] == [
+        "Ann One, Bob Two", "Ann One", "Plain Name", ""
+    ]
+    assert db.query(Author).count() == 3 and db.query(Genre).count() == 3
+    assert book_genre_names(db) == {1: ["Fiction", "History"], 2: ["History"], 4: ["Fiction", "Mystery"]}
+    assert db.query(BookAuthor).filter(BookAuthor.book_id == 1).count() == 2
+
+    # Normalized books are left alone, including ones without authors
+    assert migrate_book_names(db) == 0
+    assert book_genre_names(db, [4]) == {4: ["Fiction", "Mystery"]}
+    db.close()
+    print("✅ Author/genre migration")
+
+
+def test_add_missing_name_columns():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE books DROP COLUMN names_normalized"))
+        connection.execute(text(
+            "INSERT INTO books (id, title, author, genre) VALUES "
+            "(1, 'A', '', 'Fiction, Mystery'), (2, 'B', '[''Ann One'']', NULL)"
+        ))
+        connection.execute(text("INSERT INTO genres (id, name) VALUES (1, 'Fiction'), (2, 'Mystery')"))
+        connection.execute(text("INSERT INTO book_genres (book_id, genre_id, position) VALUES (1, 1, 0), (1, 2, 1)"))
+    assert add_missing_name_columns(engine) == ["names_normalized"]
+    assert add_missing_name_columns(engine) == []
+
+    # The book linked before the flag existed keeps its display form; the raw one is migrated
+    db = sessionmaker(bind=engine)()
+    assert migrate_book_names(db) == 1
+    assert [book.genre for book in db.query(Book).order_by(Book.id)] == ["Fiction, Mystery", None]
+    assert book_genre_names(db) == {1: ["Fiction", "Mystery"]}
+    db.close()
+
+
+if __name__ == "__main__":
+    test_parse_names()
+    test_migrate_book_names()
+    test_add_missing_name_columns()
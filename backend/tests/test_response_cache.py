@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.response_cache import ResponseCache, MemoryBackend, etag_matches
+
+
+class DictBackend:
+    """Stand-in for a shared store"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def clear(self):
+        self.data.clear()
+
+
+def test_response_cache():
+    backend = DictBackend()
+    cache = ResponseCache(backend)
+
+    assert cache.lookup("books?limit=2", 1) is None
+    stored = cache.store("books?limit=2", 1, [{"id": 1, "title": "Dune"}], {"X-Next-Cursor": "abc"})
+    assert stored.body == b'[{"id":1,"title":"Dune"}]'
+    assert len(backend.data) == 1
+
+    hit = cache.lookup("books?limit=2", 1)
+    assert hit.body == stored.body
+    assert hit.headers["X-Next-Cursor"] == "abc" and hit.headers["X-Cache"] == "hit"
+    assert hit.headers["ETag"] == stored.headers["ETag"]
+
+    # The client's copy is current: 304 without a body
+    not_modified = cache.lookup("books?limit=2", 1, f'W/"other", {stored.headers["ETag"]}')
+    assert not_modified.status_code == 304 and not_modified.body == b""
+
+    # A new data version changes the ETag and misses
+    assert cache.lookup("books?limit=2", 2, stored.headers["ETag"]) is None
+    assert cache.etag("books?limit=2", 2) != stored.headers["ETag"]
+    assert etag_matches("*", stored.headers["ETag"])
+    print(f"✅ Response cache: {cache.stats()}")
+
+
+def test_memory_backend_limits():
+    backend = MemoryBackend(max_size=3, max_bytes=10)
+    for key in "abc":
+        backend.set(key, (b"xx", {}))
+    backend.get("a")
+    backend.set("d", (b"xx", {}))
+    assert backend.get("b") is None and backend.get("a") is not None
+
+    backend.set("e", (b"x" * 8, {}))
+    assert backend.stats()["bytes"] <= 10
+    backend.set("huge", (b"x" * 11, {}))
+    assert backend.get("huge") is None
+
+
+if __name__ == "__main__":
+    test_response_cache()
+    test_memory_backend_limits()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.models import Book
+from app.catalog import catalog
+from app.search import Fts5SearchIndex, InvertedIndex, make_search_index
+
+BOOKS = [
+    (1, "Dune", "Frank Herbert", "Science Fiction", "Desert planet, spice and sandworms"),
+    (2, "Dune Messiah", "Frank Herbert", "Science Fiction", "Paul rules the desert empire"),
+    (3, "The Desert Spear", "Peter Brett", "Fantasy", "Demons rise in the desert at night"),
+    (4, "Children of Dune", "Frank Herbert", "Science Fiction", "The twins inherit the spice empire"),
+    (5, "Emma", "Jane Austen", "Romance", "A matchmaker in a quiet village"),
+    (6, "Sense and Sensibility", "Jane Austen", "Romance", "Two sisters and their walks on the dune"),
+    (7, "Desert Solitaire", "Edward Abbey", "Nature", "A season in the wilderness of the desert"),
+]
+
+QUERIES = ["dune", "desert", "herbert", "spice", "aust", "des", "desert spice", "sens", "frank dune", "nothing"]
+
+
+def make_db():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Book(id=book_id, title=title, author=author, genre=genre, description=description)
+                for book_id, title, author, genre, description in BOOKS])
+    db.commit()
+    # InvertedIndex builds from the catalog
+    catalog.reload(db)
+    return engine, db
+
+
+def ids(result):
+    return [book_id for book_id, _ in result[1]]
+
+
+def check_index(index, db):
+    assert index.build(db) == len(BOOKS)
+    assert ids(index.search(db, "dune")) == [1, 2, 4, 6]
+    # Title matches outrank description matches; ties go by id
+    assert ids(index.search(db, "desert")) == [3, 7, 1, 2]
+    # Every word must match, the last as a prefix (autocomplete)
+    assert ids(index.search(db, "desert spi")) == [1]
+    assert ids(index.search(db, "aust")) == [5, 6]
+    assert index.search(db, "frank dune", offset=1, limit=1) == (3, index.search(db, "frank dune")[1][1:2])
+    assert index.search(db, "") == (0, []) and index.search(db, "zzz") == (0, [])
+
+    # Incremental updates
+    index.upsert_books(db, [SimpleNamespace(id=8, title="Dune Road", author="Someone", genre="", description="")])
+    index.upsert_books(db, [SimpleNamespace(id=5, title="Emma Dune", author="Jane Austen", genre="", description="")])
+    index.remove_books(db, [2])
+    assert set(ids(index.search(db, "dune"))) == {1, 4, 5, 6, 8}
+    assert ids(index.search(db, "matchmaker")) == []
+
+
+def test_inverted_index():
+    _, db = make_db()
+    check_index(InvertedIndex(), db)
+    db.close()
+    print("✅ In-process BM25 index")
+
+
+def test_fts5_index():
+    engine, db = make_db()
+    assert make_search_index(engine).kind == "fts5"
+    index = Fts5SearchIndex()
+    check_index(index, db)
+
+    # Edits made outside the app (same number of books) are picked up by the next build
+    db.execute(text("UPDATE books SET title = 'Arrakis' WHERE id = 1"))
+    db.commit()
+    index.build(db)
+    assert ids(index.search(db, "arrakis")) == [1]
+    assert 1 not in ids(index.search(db, "dune"))
+    db.close()
+    print("✅ FTS5 index")
+
+
+def test_backends_rank_alike():
+    _, db = make_db()
+    fts, memory = Fts5SearchIndex(), InvertedIndex()
+    fts.build(db)
+    memory.build(db)
+    for query in QUERIES:
+        fts_total, fts_hits = fts.search(db, query)
+        memory_total, memory_hits = memory.search(db, query)
+        assert fts_total == memory_total, query
+        assert [book_id for book_id, _ in fts_hits] == [book_id for book_id, _ in memory_hits], query
+    db.close()
+    print("✅ Both backends rank alike")
+
+
+if __name__ == "__main__":
+    test_inverted_index()
+    test_fts5_index()
+    test_backends_rank_alike()
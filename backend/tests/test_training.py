@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.recommender.training import TrainingJob
+
+
+def wait_until_done(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.status()["state"] == "running":
+        assert time.monotonic() < deadline, "training process didn't finish"
+        time.sleep(0.05)
+    return job.status()
+
+
+def test_training_job():
+    job = TrainingJob("timeit", cwd=None)
+    assert job.status() == {"state": "idle"}
+
+    # One run at a time
+    pid = job.start(["-n", "1", "-r", "1", "-s", "import time", "time.sleep(0.5)"])
+    assert pid is not None and job.status()["state"] == "running"
+    assert job.start(["-n", "1", "-r", "1", "pass"]) is None
+
+    status = wait_until_done(job)
+    assert status["state"] == "succeeded" and status["returncode"] == 0 and status["pid"] == pid
+    # Reaped: the exit code was collected by the waiter
+    assert job.process.poll() == 0
+
+    failing = TrainingJob("no_such_training_module", cwd=None)
+    failing.start()
+    assert wait_until_done(failing)["state"] == "failed"
+    assert job.start(["-n", "1", "-r", "1", "pass"]) is not None
+    wait_until_done(job)
+    print("✅ Training job")
+
+
+if __name__ == "__main__":
+    test_training_job()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import InteractionEvent
+from app.trending import TrendingEngine, DAY, HOUR
+from app.timeutil import utc_datetime
+
+
+def test_trending_windows():
+    now = 1_700_000_000.0
+    engine = TrendingEngine(refresh=0, clock=lambda: now)
+
+    # Book 1: busy a few weeks ago; book 2: a few events today; book 3: steady over the week
+    for _ in range(20):
+        engine.record(1, utc_datetime(now - 20 * DAY))
+    for _ in range(3):
+        engine.record(2, utc_datetime(now - 2 * HOUR))
+    for day in range(7):
+        engine.record(3, utc_datetime(now - day * DAY - HOUR))
+    engine.record(4, utc_datetime(now - 40 * DAY))
+
+    assert [book_id for book_id, _, _ in engine.top("daily")] == [2, 3]
+    assert [book_id for book_id, _, _ in engine.top("weekly")] == [3, 2]
+    monthly = engine.top("monthly")
+    assert [book_id for book_id, _, _ in monthly] == [1, 3, 2]
+    assert monthly[0][2] == 20
+
+    # Recent events outweigh the same number of older ones
+    engine.record(5, utc_datetime(now - 10 * DAY))
+    engine.record(6, utc_datetime(now - DAY))
+    scores = {book_id: score for book_id, score, _ in engine.top("monthly")}
+    assert scores[6] > scores[5]
+
+    engine.remove_books([3])
+    assert 3 not in [book_id for book_id, _, _ in engine.top("weekly")]
+    print(f"✅ Trending windows: {engine.top('monthly', 3)}")
+
+
+def test_trending_rebuild():
+    now = 1_700_000_000.0
+    database = create_engine("sqlite://")
+    Base.metadata.create_all(bind=database)
+    db = sessionmaker(bind=database)()
+    db.add_all([InteractionEvent(user_id=1, book_id=book_id, created_at=utc_datetime(now - age))
+                for book_id, age in [(1, HOUR), (1, 3 * DAY), (2, 2 * DAY), (3, 45 * DAY)]])
+    db.commit()
+
+    engine = TrendingEngine(refresh=0, clock=lambda: now)
+    assert engine.rebuild(db) == 3
+    assert [(book_id, events) for book_id, _, events in engine.top("weekly")] == [(1, 2), (2, 1)]
+    assert [book_id for book_id, _, _ in engine.top("daily")] == [1]
+    db.close()
+
+
+if __name__ == "__main__":
+    test_trending_windows()
+    test_trending_rebuild()
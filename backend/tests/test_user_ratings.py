@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+import subprocess
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book, User, UserBook
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# /user/{id}/ratings streams from its own session, so it runs in a process using the test database.
+# Between syncs, ratings change at times relative to the returned X-Sync-Time.
+RATINGS_SYNC = """
+import json
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+import app.main
+from app.database import engine
+
+client = TestClient(app.main.app)
+responses = []
+
+def sync(since=None):
+    response = client.get("/user/1/ratings", params={} if since is None else {"since": since})
+    # Keep every key, so a book sent twice in one response shows up
+    responses.append({"body": json.loads(response.text, object_pairs_hook=lambda pairs: pairs),
+                      "sync_time": response.headers["X-Sync-Time"]})
+    return datetime.fromisoformat(response.headers["X-Sync-Time"].rstrip("Z"))
+
+def rate(book_id, rating, updated_at=None):
+    with engine.begin() as connection:
+        if updated_at is None:
+            connection.execute(text("UPDATE user_books SET rating = :rating, updated_at = CURRENT_TIMESTAMP "
+                                    "WHERE user_id = 1 AND book_id = :book_id"), {"rating": rating, "book_id": book_id})
+        else:
+            connection.execute(text("UPDATE user_books SET rating = :rating, updated_at = :updated_at "
+                                    "WHERE user_id = 1 AND book_id = :book_id"),
+                               {"rating": rating, "book_id": book_id, "updated_at": updated_at})
+
+first = sync()
+# Changed in the second the first response was built, and exactly at its sync time
+rate(1, 1.0, first + timedelta(seconds=1))
+rate(2, 2.0, first)
+second = sync(first.isoformat() + "Z")
+# Changed after the second response, by the clock of the database
+rate(3, 3.0)
+sync(second.isoformat() + "Z")
+print(json.dumps(responses))
+"""
+
+
+def make_library(path):
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Book(id=book_id, title=f"Book {book_id}", author="Someone") for book_id in (1, 2, 3, 4)])
+    db.add_all([User(id=1, email="reader@example.com"), User(id=2, email="other@example.com")])
+    old = datetime(2026, 1, 1)
+    db.add_all([UserBook(user_id=1, book_id=book_id, rating=5.0, status="read", updated_at=old)
+                for book_id in (1, 2, 3, 4)])
+    db.add(UserBook(user_id=2, book_id=1, rating=4.0, status="read"))
+    db.commit()
+    db.close()
+
+
+def test_ratings_since():
+    with tempfile.TemporaryDirectory() as root:
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": "sqlite:///" + os.path.join(root, "library.db"),
+            "RECOMMENDER_MODEL_DIR": os.path.join(root, "models"),
+            "LEADERBOARD_REFRESH": "0", "PYTHONPATH": BACKEND_DIR,
+        })
+        make_library(os.path.join(root, "library.db"))
+        result = subprocess.run([sys.executable, "-c", RATINGS_SYNC], cwd=BACKEND_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr
+        first, second, third = json.loads(result.stdout.strip().splitlines()[-1])
+
+    def ratings(response):
+        return {int(book_id): dict(entry)["rating"] for book_id, entry in response["body"]}
+
+    for response in (first, second, third):
+        book_ids = [book_id for book_id, _ in response["body"]]
+        assert len(book_ids) == len(set(book_ids)), book_ids
+        assert response["sync_time"].endswith("Z")
+
+    assert ratings(first) == {1: 5.0, 2: 5.0, 3: 5.0, 4: 5.0}
+    # Changes at or after the sync time come next time; untouched books don't
+    assert ratings(second) == {1: 1.0, 2: 2.0}
+    # The sync time is a second early, so books from the previous boundary second may come again,
+    # but the change after it always does and older ones never do
+    assert ratings(third)[3] == 3.0 and 4 not in ratings(third)
+    assert {1: 1.0, 2: 2.0, 3: 3.0}.items() >= ratings(third).items()
+    print("✅ Ratings since the last sync time")
+
+
+if __name__ == "__main__":
+    test_ratings_since()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import random
+from datetime import datetime
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Book, UserBook, InteractionEvent
+from app.user_stats import ReadLeaderboard, read_leaderboard, user_status_counts, backfill_read_at
+from app.interactions import apply_interactions
+from app.event_log import EventConsumer
+
+
+def test_leaderboard_ranks():
+    leaderboard = ReadLeaderboard()
+    counts = {}
+    rng = random.Random(0)
+    for _ in range(500):
+        # What the event consumer does: set the current counts of a batch's users, 0 for non-readers
+        batch = {rng.randint(1, 50): rng.choice([0, 0, 1, 2, 3, 5, 8]) for _ in range(rng.randint(1, 6))}
+        leaderboard.set_counts(batch)
+        counts.update(batch)
+
+    readers = {user_id: count for user_id, count in counts.items() if count}
+    assert leaderboard.total_users() == len(readers)
+    for user_id in range(1, 52):
+        expected = 1 + sum(count > readers[user_id] for count in readers.values()) if user_id in readers else None
+        assert leaderboard.rank(user_id) == expected
+    print(f"✅ Leaderboard ranks for {len(readers)} readers")
+
+
+def test_consumer_updates_leaderboard():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all([Book(id=book_id, title=f"Book {book_id}", author="X") for book_id in (1, 2, 3)])
+    db.commit()
+    read_leaderboard.rebuild(db)
+    consumer = EventConsumer(gap_timeout=0, session_factory=Session)
+    consumer.load(db)
+
+    def shelve(user_id, *items):
+        apply_interactions(db, user_id, [SimpleNamespace(book_id=book_id, status=status, rating=None, ts=None)
+                                         for book_id, status in items])
+        db.commit()
+        consumer.catch_up()
+
+    shelve(1, (1, "read"), (2, "read"), (3, "reading"))
+    shelve(2, (1, "read"))
+    shelve(3, (2, "read"), (3, "read"))
+    assert [read_leaderboard.rank(user_id) for user_id in (1, 2, 3)] == [1, 3, 1]
+    assert read_leaderboard.total_users() == 3
+
+    # Re-shelving a read book lowers the count; shelving the only one drops the reader
+    shelve(1, (2, "reading"), (3, "read"))
+    shelve(3, (2, "wishlist"))
+    shelve(2, (1, "reading"))
+    assert [read_leaderboard.rank(user_id) for user_id in (1, 2, 3)] == [1, None, 2]
+    assert read_leaderboard.total_users() == 2 and read_leaderboard.rebuild(db) == 2
+    assert [read_leaderboard.rank(user_id) for user_id in (1, 2, 3)] == [1, None, 2]
+    db.close()
+    print("✅ Leaderboard follows the event consumer")
+
+
+def test_user_status_counts():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    now = datetime(2026, 3, 15, 12, 0)
+    db.add_all([
+        UserBook(user_id=1, book_id=1, status="read", updated_at=datetime(2026, 3, 2)),
+        UserBook(user_id=1, book_id=2, status="read", updated_at=datetime(2026, 2, 27)),
+        UserBook(user_id=1, book_id=3, status="reading", updated_at=datetime(2026, 3, 3)),
+        UserBook(user_id=1, book_id=4, status="wishlist"),
+        UserBook(user_id=2, book_id=1, status="read", updated_at=datetime(2026, 3, 3)),
+    ])
+    db.commit()
+
+    assert user_status_counts(db, 1, now) == {"read": 2, "reading": 1, "wishlist": 1, "read_this_month": 1}
+    assert user_status_counts(db, 3, now) == {"read": 0, "reading": 0, "wishlist": 0, "read_this_month": 0}
+
+    leaderboard = ReadLeaderboard()
+    assert leaderboard.rebuild(db) == 2
+    assert leaderboard.rank(1) == 1 and leaderboard.rank(2) == 2 and leaderboard.rank(3) is None
+    db.close()
+
+
+def test_rerated_old_read_not_this_month():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([Book(id=1, title="A", author="X"), Book(id=2, title="B", author="Y")])
+    db.commit()
+
+    # Read in October; re-rated (still read) in March, when another book goes to read
+    apply_interactions(db, 1, [SimpleNamespace(book_id=1, status="read", rating=3.0, ts=datetime(2025, 10, 4))])
+    db.commit()
+    apply_interactions(db, 1, [
+        SimpleNamespace(book_id=1, status="read", rating=5.0, ts=datetime(2026, 3, 10)),
+        SimpleNamespace(book_id=2, status="read", rating=4.0, ts=datetime(2026, 3, 11)),
+    ])
+    db.commit()
+    assert {row.book_id: row.read_at for row in db.query(UserBook)} == {
+        1: datetime(2025, 10, 4), 2: datetime(2026, 3, 11)
+    }
+    assert user_status_counts(db, 1, datetime(2026, 3, 15))["read_this_month"] == 1
+
+    # Shelved again and re-read: read_at moves to the new read
+    apply_interactions(db, 1, [SimpleNamespace(book_id=1, status="reading", rating=5.0, ts=datetime(2026, 3, 12))])
+    apply_interactions(db, 1, [SimpleNamespace(book_id=1, status="read", rating=5.0, ts=datetime(2026, 3, 13))])
+    db.commit()
+    assert user_status_counts(db, 1, datetime(2026, 3, 15))["read_this_month"] == 2
+    db.close()
+
+
+def test_backfill_read_at():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        # Read, re-shelved, read again, then re-rated: read at the second read
+        UserBook(user_id=1, book_id=1, status="read", updated_at=datetime(2026, 3, 1)),
+        InteractionEvent(user_id=1, book_id=1, status="read", created_at=datetime(2025, 1, 1)),
+        InteractionEvent(user_id=1, book_id=1, status="reading", created_at=datetime(2025, 6, 1)),
+        InteractionEvent(user_id=1, book_id=1, status="read", created_at=datetime(2025, 7, 1)),
+        InteractionEvent(user_id=1, book_id=1, status="read", created_at=datetime(2026, 3, 1)),
+        # No events: the row's own time
+        UserBook(user_id=1, book_id=2, status="read", updated_at=datetime(2025, 2, 2)),
+        UserBook(user_id=1, book_id=3, status="reading", updated_at=datetime(2025, 2, 2)),
+    ])
+    db.commit()
+    # As added by the migration (a plain UPDATE, so updated_at is kept)
+    db.execute(text("UPDATE user_books SET read_at = NULL"))
+    assert backfill_read_at(db) == 2
+    db.commit()
+    assert {row.book_id: row.read_at for row in db.query(UserBook)} == {
+        1: datetime(2025, 7, 1), 2: datetime(2025, 2, 2), 3: None
+    }
+    db.close()
+
+
+if __name__ == "__main__":
+    test_leaderboard_ranks()
+    test_consumer_updates_leaderboard()
+    test_user_status_counts()
+    test_rerated_old_read_not_this_month()
+    test_backfill_read_at()
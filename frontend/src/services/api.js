@@ -16,9 +16,26 @@ export const loginUser = async (credentials) => {
 };
 
 // Books endpoints
-export const getBooks = async () => {
-  const response = await API.get("/books/");
-  return response.data;
+const BOOKS_PAGE_SIZE = 500;
+
+export const getBooksPage = async ({ cursor, limit = BOOKS_PAGE_SIZE, fields, sort } = {}) => {
+  const response = await API.get("/books/", {
+    params: { cursor, limit, fields, sort }
+  });
+  return { books: response.data, nextCursor: response.headers["x-next-cursor"] || null };
+};
+
+export const getBooks = async (onPage) => {
+  // Stream the catalog in pages; onPage (optional) sees the books loaded so far
+  let books = [];
+  let cursor;
+  do {
+    const page = await getBooksPage({ cursor });
+    books = books.concat(page.books);
+    cursor = page.nextCursor;
+    if (onPage) onPage(books);
+  } while (cursor);
+  return books;
 };
 
 export const getWeeklyTopBooks = async () => {